@@ -0,0 +1,70 @@
+"""Данные для замеров: большой граф пользователей, постов и подписок.
+
+Размер задаётся переменными окружения, по умолчанию он небольшой,
+чтобы набор проходил за минуту::
+
+    BENCHMARK_USERS=10000 BENCHMARK_POSTS=100000 BENCHMARK_FOLLOWS=50 \\
+        python -m pytest benchmarks
+"""
+import os
+import random
+import pytest
+from django.contrib.auth import get_user_model
+from mixer.backend.django import mixer as _mixer
+
+from posts.models import Comment, Follow, Group, Post
+
+pytest_plugins = [
+    'tests.fixtures.fixture_user',
+    'tests.fixtures.fixture_data',
+]
+
+USERS = int(os.environ.get('BENCHMARK_USERS', 200))
+POSTS = int(os.environ.get('BENCHMARK_POSTS', 2000))
+FOLLOWS = int(os.environ.get('BENCHMARK_FOLLOWS', 20))
+GROUPS = 20
+COMMENTS = 50
+
+
+def seed(mixer):
+    """Заполнить базу и вернуть объекты, с которыми работают замеры."""
+    rng = random.Random(0)
+    users = mixer.cycle(USERS).blend(
+        get_user_model(), username=(f'user{i}' for i in range(USERS))
+    )
+    groups = mixer.cycle(GROUPS).blend(
+        Group, slug=(f'group{i}' for i in range(GROUPS))
+    )
+    pairs = [
+        (user, author)
+        for user in users
+        for author in rng.sample(users, min(FOLLOWS, USERS))
+        if user != author
+    ]
+    mixer.cycle(len(pairs)).blend(
+        Follow,
+        user=(user for user, author in pairs),
+        author=(author for user, author in pairs),
+    )
+    posts = mixer.cycle(POSTS).blend(
+        Post,
+        author=(users[i % USERS] for i in range(POSTS)),
+        group=(groups[i % GROUPS] if i % 4 else None for i in range(POSTS)),
+        image='',
+    )
+    post = posts[-1]
+    mixer.cycle(COMMENTS).blend(
+        Comment, post=post, author=(users[i] for i in range(COMMENTS))
+    )
+    return {
+        'reader': users[0],
+        'author': post.author,
+        'group': groups[0],
+        'post': post,
+    }
+
+
+@pytest.fixture(scope='session')
+def dataset(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        return seed(_mixer)
@@ -0,0 +1,56 @@
+"""Комментарии к горячему посту: INSERT на запрос и отложенная запись.
+
+Один и тот же поток POST на ``add_comment`` идёт сначала с обычной
+записью, потом с ``COMMENT_WRITE_BEHIND``; во втором случае пачка
+сбрасывается в базу одним вызовом ``flush``. Печатается время на
+комментарий::
+
+    python -m pytest benchmarks/test_comment_queue.py -s
+"""
+import os
+import time
+
+import pytest
+from django.test import override_settings
+from django.urls import reverse
+
+from posts import comment_queue
+from posts.models import Comment
+
+pytestmark = [pytest.mark.django_db]
+
+COMMENTS = int(os.environ.get('BENCHMARK_COMMENTS', 200))
+
+
+def post_comments(client, url, label):
+    start = time.perf_counter()
+    for number in range(COMMENTS):
+        client.post(url, {'text': f'{label} {number}'})
+    return time.perf_counter() - start
+
+
+def test_write_behind(client, dataset, tmp_path):
+    client.force_login(dataset['reader'])
+    post = dataset['post']
+    url = reverse('posts:add_comment', args=(post.pk,))
+    direct = post_comments(client, url, 'Сразу')
+    with override_settings(
+        COMMENT_WRITE_BEHIND=True,
+        COMMENT_SPOOL_DIR=str(tmp_path),
+        COMMENT_FLUSH_MS=60 * 1000,
+    ):
+        queued = post_comments(client, url, 'Очередь')
+        queue = comment_queue.get_queue()
+        start = time.perf_counter()
+        written = queue.flush()
+        flush = time.perf_counter() - start
+        queue.close()
+    print(
+        f'\nINSERT на запрос: {direct / COMMENTS * 1000:.2f} мс'
+        f'\nочередь: {queued / COMMENTS * 1000:.2f} мс, '
+        f'сброс пачки {flush * 1000:.1f} мс'
+    )
+    assert written == COMMENTS
+    assert Comment.objects.filter(text__startswith='Очередь').count() == (
+        COMMENTS
+    )
@@ -0,0 +1,79 @@
+"""Память графа подписок и цена проверки подписки.
+
+Строит синтетические массивы подписок для ``BENCHMARK_GRAPH_USERS``
+пользователей по ``BENCHMARK_FOLLOWS`` авторов, кладёт их в локальный
+LRU и печатает занятую память, пересчёт на миллион пользователей и
+время проверки подписки по графу против запроса к базе::
+
+    BENCHMARK_GRAPH_USERS=100000 \\
+        python -m pytest benchmarks/test_follow_graph.py -s
+"""
+import os
+import random
+import time
+import tracemalloc
+
+import pytest
+from django.test import override_settings
+
+from posts import follow_graph
+from posts.models import Follow
+
+pytestmark = [pytest.mark.django_db]
+
+GRAPH_USERS = int(os.environ.get('BENCHMARK_GRAPH_USERS', 20000))
+FOLLOWS = int(os.environ.get('BENCHMARK_FOLLOWS', 20))
+MILLION = 1000000
+CHECKS = 2000
+
+
+def test_memory():
+    rng = random.Random(0)
+    follow_graph.clear_local()
+    tracemalloc.start()
+    with override_settings(FOLLOW_GRAPH_LOCAL_BYTES=2 ** 40):
+        for user_id in range(GRAPH_USERS):
+            follow_graph._remember(
+                user_id,
+                (0, user_id),
+                follow_graph.pack(rng.sample(range(GRAPH_USERS), FOLLOWS)),
+            )
+    traced, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    accounted = follow_graph.memory()
+    follow_graph.clear_local()
+    scale = MILLION / GRAPH_USERS
+    print(
+        f'\n{GRAPH_USERS} пользователей по {FOLLOWS} подписок: '
+        f'учтено {accounted["bytes"] / 2 ** 20:.1f} МБ, '
+        f'tracemalloc {traced / 2 ** 20:.1f} МБ'
+        f'\nна 1M пользователей: {accounted["bytes"] * scale / 2 ** 20:.0f} МБ'
+        f' (массивы {FOLLOWS * 4 * MILLION / 2 ** 20:.0f} МБ)'
+    )
+    assert accounted['users'] == GRAPH_USERS
+    # Учёт не должен занижать реальную память больше чем на четверть.
+    assert accounted['bytes'] > traced * 0.75
+
+
+def test_is_following(dataset):
+    reader = dataset['reader']
+    authors = list(
+        Follow.objects.filter(user=reader).values_list('author_id', flat=True)
+    )
+    follow_graph.is_following(reader.pk, authors[0])
+    start = time.perf_counter()
+    for number in range(CHECKS):
+        assert follow_graph.is_following(
+            reader.pk, authors[number % len(authors)])
+    graph = time.perf_counter() - start
+    start = time.perf_counter()
+    for number in range(CHECKS):
+        assert Follow.objects.filter(
+            user=reader.pk, author=authors[number % len(authors)]
+        ).exists()
+    database = time.perf_counter() - start
+    print(
+        f'\nпроверка подписки: граф {graph / CHECKS * 10 ** 6:.1f} мкс, '
+        f'база {database / CHECKS * 10 ** 6:.1f} мкс'
+    )
+    assert graph < database
@@ -0,0 +1,95 @@
+"""Нагрузочное сравнение WSGI и ASGI на страницах с лентами.
+
+Одни и те же анонимные GET-запросы выполняются параллельно: под WSGI
+пулом из ``ASGI_THREADS`` потоков, под ASGI — в цикле событий через
+``core.asgi.ASGIHandler``. Результат (запросов в секунду) печатается::
+
+    python -m pytest benchmarks/test_load.py -s
+"""
+import asyncio
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+
+from core.asgi import ASGIHandler
+
+pytestmark = [pytest.mark.django_db]
+
+REQUESTS = int(os.environ.get('BENCHMARK_LOAD_REQUESTS', 200))
+
+PAGES = {
+    'index': lambda data: reverse('posts:index'),
+    'group_list': lambda data: reverse(
+        'posts:group_list', args=(data['group'].slug,)),
+    'profile': lambda data: reverse(
+        'posts:profile', args=(data['author'].username,)),
+    'post_detail': lambda data: reverse(
+        'posts:post_detail', args=(data['post'].pk,)),
+}
+
+
+def scope(url):
+    return {
+        'type': 'http',
+        'method': 'GET',
+        'path': url,
+        'query_string': b'',
+        'headers': [(b'host', b'localhost')],
+    }
+
+
+def run_wsgi(handler, url):
+    environ = handler.get_environ(scope(url), io.BytesIO(), None)
+    return handler.run_wsgi(environ)[0]
+
+
+def load_wsgi(handler, url):
+    with ThreadPoolExecutor(settings.ASGI_THREADS) as executor:
+        return list(executor.map(
+            lambda _: run_wsgi(handler, url), range(REQUESTS)
+        ))
+
+
+async def load_asgi(handler, url):
+    async def one():
+        messages = [{'type': 'http.request', 'body': b''}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        await handler(scope(url), receive, send)
+        return sent[0]['status']
+
+    return await asyncio.gather(*(one() for _ in range(REQUESTS)))
+
+
+@pytest.mark.parametrize('name', sorted(PAGES))
+def test_wsgi_vs_asgi(name, dataset):
+    handler = ASGIHandler()
+    url = PAGES[name](dataset)
+    results = {}
+    for server, run in (
+        ('wsgi', lambda: load_wsgi(handler, url)),
+        ('asgi', lambda: asyncio.run(load_asgi(handler, url))),
+    ):
+        cache.clear()
+        start = time.perf_counter()
+        statuses = run()
+        results[server] = REQUESTS / (time.perf_counter() - start)
+        assert set(statuses) == {200}, (
+            f'`{name}` под {server} вернул коды {set(statuses)}'
+        )
+    print(
+        f'\n{name}: WSGI {results["wsgi"]:.0f} зап/с, '
+        f'ASGI {results["asgi"]:.0f} зап/с'
+    )
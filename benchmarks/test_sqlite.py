@@ -0,0 +1,144 @@
+"""Нагрузка на SQLite: параллельные писатели и читатели.
+
+Одна и та же нагрузка идёт на временный файл через стандартный бэкенд
+``django.db.backends.sqlite3`` и через ``core.db``. Писатель в
+``atomic`` сначала читает, потом вставляет строку и обновляет счётчик,
+как ``post_create`` с сигналами; читатель выбирает последнюю страницу.
+Печатаются операции в секунду и число ошибок «database is locked»::
+
+    python -m pytest benchmarks/test_sqlite.py -s
+"""
+import os
+import threading
+import time
+
+from django.db import OperationalError, connections, transaction
+
+DURATION = float(os.environ.get('BENCHMARK_STRESS_SECONDS', 2))
+WRITERS = int(os.environ.get('BENCHMARK_STRESS_WRITERS', 4))
+READERS = int(os.environ.get('BENCHMARK_STRESS_READERS', 8))
+
+ENGINES = {
+    'sqlite3': 'django.db.backends.sqlite3',
+    'core.db': 'core.db',
+}
+
+
+def register(alias, engine, path, **options):
+    connections.databases[alias] = {
+        'ENGINE': engine, 'NAME': path, 'OPTIONS': options
+    }
+    connections.ensure_defaults(alias)
+    connections.prepare_test_settings(alias)
+
+
+def unregister(*aliases):
+    for alias in aliases:
+        connections[alias].close()
+        del connections[alias]
+        del connections.databases[alias]
+
+
+def create_schema(alias):
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            'CREATE TABLE item (id INTEGER PRIMARY KEY, author INTEGER, '
+            'text TEXT)'
+        )
+        cursor.execute('CREATE INDEX item_author ON item (author)')
+        cursor.execute(
+            'CREATE TABLE counter (author INTEGER PRIMARY KEY, n INTEGER)'
+        )
+        cursor.executemany(
+            'INSERT INTO counter VALUES (%s, 0)', [(i,) for i in range(10)]
+        )
+
+
+def write(alias, author):
+    with transaction.atomic(using=alias):
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                'SELECT COUNT(*) FROM item WHERE author = %s', [author]
+            )
+            cursor.execute(
+                'INSERT INTO item (author, text) VALUES (%s, %s)',
+                [author, 'текст ' * 20]
+            )
+            cursor.execute(
+                'UPDATE counter SET n = n + 1 WHERE author = %s', [author]
+            )
+
+
+def read(alias, author):
+    with connections[alias].cursor() as cursor:
+        cursor.execute(
+            'SELECT id, text FROM item ORDER BY id DESC LIMIT 10'
+        )
+        cursor.fetchall()
+
+
+def run(write_alias, read_alias):
+    """Нагрузка в течение DURATION секунд, вернуть счётчики операций."""
+    stats = {'writes': 0, 'reads': 0, 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + DURATION
+
+    def worker(operation, alias, name, author):
+        done = errors = 0
+        while time.monotonic() < deadline:
+            try:
+                operation(alias, author)
+                done += 1
+            except OperationalError:
+                errors += 1
+        connections[alias].close()
+        with lock:
+            stats[name] += done
+            stats['errors'] += errors
+
+    threads = [
+        threading.Thread(
+            target=worker, args=(write, write_alias, 'writes', i % 10)
+        )
+        for i in range(WRITERS)
+    ] + [
+        threading.Thread(
+            target=worker, args=(read, read_alias, 'reads', i % 10)
+        )
+        for i in range(READERS)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return stats
+
+
+def stress(tmp_path, name, engine):
+    path = str(tmp_path / f'{name}.sqlite3')
+    write_alias, read_alias = f'stress_{name}', f'stress_{name}_read'
+    register(write_alias, engine, path)
+    options = {'read_only': True} if engine == 'core.db' else {}
+    register(read_alias, engine, path, **options)
+    try:
+        create_schema(write_alias)
+        return run(write_alias, read_alias)
+    finally:
+        unregister(write_alias, read_alias)
+
+
+def test_parallel_writers_and_readers(tmp_path, django_db_blocker):
+    with django_db_blocker.unblock():
+        results = {
+            name: stress(tmp_path, name, engine)
+            for name, engine in ENGINES.items()
+        }
+    for name, stats in results.items():
+        print(
+            f'\n{name}: запись {stats["writes"] / DURATION:.0f} оп/с, '
+            f'чтение {stats["reads"] / DURATION:.0f} оп/с, '
+            f'ошибок {stats["errors"]}'
+        )
+    tuned = results['core.db']
+    assert tuned['errors'] == 0, 'core.db не должен падать на блокировке'
+    assert tuned['writes'] > 0 and tuned['reads'] > 0
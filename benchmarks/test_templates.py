@@ -0,0 +1,67 @@
+"""Время рендеринга страницы ленты с разными загрузчиками шаблонов.
+
+Контекст берётся из настоящего ответа ``posts:index``, затем
+``posts/index.html`` рендерится заново без обращений к базе: с обычными
+загрузчиками, со стандартным ``cached.Loader`` и с ``InliningLoader``.
+Карточки постов кешируются, поэтому кеш очищается перед каждым
+рендерингом. Печатается среднее время на страницу::
+
+    python -m pytest benchmarks/test_templates.py -s
+"""
+import os
+import time
+
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.template.backends.django import DjangoTemplates
+from django.urls import reverse
+
+pytestmark = [pytest.mark.django_db]
+
+RUNS = int(os.environ.get('BENCHMARK_TEMPLATE_RUNS', 50))
+
+LOADERS = {
+    'без кеша': settings.TEMPLATE_LOADERS,
+    'cached': [
+        ('django.template.loaders.cached.Loader', settings.TEMPLATE_LOADERS)
+    ],
+    'inlining': [
+        ('core.template_loaders.InliningLoader', settings.TEMPLATE_LOADERS)
+    ],
+}
+
+
+def backend(name, loaders):
+    options = settings.TEMPLATES[0]
+    return DjangoTemplates({
+        'NAME': name,
+        'DIRS': options['DIRS'],
+        'APP_DIRS': False,
+        'OPTIONS': {**options['OPTIONS'], 'loaders': loaders},
+    })
+
+
+def render(engine, context, request):
+    cache.clear()
+    template = engine.get_template('posts/index.html')
+    return template.render(context, request)
+
+
+def test_feed_render(client, dataset):
+    response = client.get(reverse('posts:index'))
+    context = response.context[0].flatten()
+    context.pop('csrf_token', None)
+    request = response.wsgi_request
+    results, pages = {}, {}
+    for name, loaders in LOADERS.items():
+        engine = backend(name, loaders)
+        pages[name] = render(engine, context, request)
+        start = time.perf_counter()
+        for _ in range(RUNS):
+            render(engine, context, request)
+        results[name] = (time.perf_counter() - start) / RUNS
+    for name, seconds in results.items():
+        print(f'\n{name}: {seconds * 1000:.2f} мс на страницу')
+    assert pages['cached'] == pages['без кеша']
+    assert pages['inlining'] == pages['без кеша']
@@ -0,0 +1,55 @@
+"""Построение адресов на странице из 10 постов: ``{% url %}`` и кеш.
+
+Шаблон строит те же адреса, что карточки постов и шапка страницы, один
+раз со стандартным тегом ``url`` и один раз с тегом из
+``core.templatetags.cached_url``. Печатается время на страницу::
+
+    python -m pytest benchmarks/test_urls.py -s
+"""
+import os
+import time
+
+import pytest
+from django.template import engines
+
+from core.reverse import clear_cache
+from posts.models import Post
+
+pytestmark = [pytest.mark.django_db]
+
+RUNS = int(os.environ.get('BENCHMARK_URL_RUNS', 200))
+
+PAGE = (
+    "{% url 'posts:index' %}{% url 'posts:search' %}{% url 'about:author' %}"
+    "{% url 'about:tech' %}{% url 'posts:post_create' %}"
+    "{% url 'users:logout' %}{% url 'posts:follow_index' %}"
+    "{% for post in posts %}"
+    "{% url 'posts:profile' post.author.username %}"
+    "{% url 'posts:post_detail' post.pk %}"
+    "{% if post.group %}{% url 'posts:group_list' post.group.slug %}"
+    "{% endif %}{% endfor %}"
+)
+
+
+def measure(template, context):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        template.render(context)
+    return (time.perf_counter() - start) / RUNS
+
+
+def test_ten_post_page(dataset):
+    posts = list(Post.objects.for_feed()[:10])
+    context = {'posts': posts}
+    engine = engines['django']
+    plain = engine.from_string(PAGE)
+    cached = engine.from_string('{% load cached_url %}' + PAGE)
+    clear_cache()
+    assert cached.render(context) == plain.render(context)
+    results = {
+        'reverse': measure(plain, context),
+        'кеш': measure(cached, context),
+    }
+    for name, seconds in results.items():
+        print(f'\n{name}: {seconds * 1e6:.0f} мкс на страницу')
+    assert results['кеш'] < results['reverse']
@@ -0,0 +1,144 @@
+"""Замеры числа запросов, времени и памяти для каждого адреса posts.
+
+Результаты сравниваются с ``baseline.json``: тест падает, если запросов
+стало больше или память выросла сильнее допуска. Время зависит от
+машины и её загрузки, поэтому проверяется только с
+``BENCHMARK_CHECK_TIME=1``. Обновить базовую линию::
+
+    BENCHMARK_UPDATE=1 python -m pytest benchmarks
+"""
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.urls import urlpatterns
+
+pytestmark = [pytest.mark.django_db]
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+UPDATE = bool(os.environ.get('BENCHMARK_UPDATE'))
+CHECK_TIME = bool(os.environ.get('BENCHMARK_CHECK_TIME'))
+RUNS = int(os.environ.get('BENCHMARK_RUNS', 5))
+TIME_TOLERANCE = float(os.environ.get('BENCHMARK_TIME_TOLERANCE', 1.0))
+MEMORY_TOLERANCE = float(os.environ.get('BENCHMARK_MEMORY_TOLERANCE', 0.25))
+
+CASES = {
+    'index': ('get', lambda data: reverse('posts:index'), None),
+    'group_list': ('get', lambda data: reverse(
+        'posts:group_list', args=(data['group'].slug,)), None),
+    'profile': ('get', lambda data: reverse(
+        'posts:profile', args=(data['author'].username,)), None),
+    'post_detail': ('get', lambda data: reverse(
+        'posts:post_detail', args=(data['post'].pk,)), None),
+    'post_create': ('post', lambda data: reverse('posts:post_create'), {
+        'text': 'Новый пост для замера'}),
+    'post_edit': ('get', lambda data: reverse(
+        'posts:post_edit', args=(data['post'].pk,)), None, 'author'),
+    'post_comments': ('get', lambda data: reverse(
+        'posts:post_comments', args=(data['post'].pk,)), None),
+    'add_comment': ('post', lambda data: reverse(
+        'posts:add_comment', args=(data['post'].pk,)), {
+        'text': 'Новый комментарий для замера'}),
+    'follow_index': ('get', lambda data: reverse('posts:follow_index'), None),
+    'search': ('get', lambda data: reverse('posts:search') + '?q=пост', None),
+    'profile_follow': ('post', lambda data: reverse(
+        'posts:profile_follow', args=(data['author'].username,)), None),
+    'profile_unfollow': ('post', lambda data: reverse(
+        'posts:profile_unfollow', args=(data['author'].username,)), None),
+    'api_index': ('get', lambda data: reverse('posts:api_index'), None),
+    'api_group_posts': ('get', lambda data: reverse(
+        'posts:api_group_posts', args=(data['group'].slug,)), None),
+    'api_profile': ('get', lambda data: reverse(
+        'posts:api_profile', args=(data['author'].username,)), None),
+}
+
+
+@pytest.fixture(scope='session')
+def baseline():
+    results = {}
+    yield results
+    if UPDATE:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=4, sort_keys=True)
+            file.write('\n')
+
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {}
+    with open(BASELINE_PATH, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def request(client, method, url, data):
+    cache.clear()
+    response = getattr(client, method)(url, data or {})
+    assert response.status_code in (200, 302), (
+        f'Адрес `{url}` вернул код {response.status_code}'
+    )
+
+
+def measure(client, method, url, data):
+    """Число запросов, медиана времени (мс) и пик памяти (КБ)."""
+    request(client, method, url, data)
+    with CaptureQueriesContext(connection) as context:
+        request(client, method, url, data)
+    queries = len(context.captured_queries)
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        request(client, method, url, data)
+        timings.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    try:
+        request(client, method, url, data)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'queries': queries,
+        'time_ms': round(statistics.median(timings), 2),
+        'memory_kb': round(peak / 1024, 1),
+    }
+
+
+def test_every_route_measured():
+    names = {pattern.name for pattern in urlpatterns}
+    assert names == set(CASES), (
+        f'Добавьте замеры для адресов: {sorted(names - set(CASES))}'
+    )
+
+
+@pytest.mark.parametrize('name', sorted(CASES))
+def test_view_benchmark(name, dataset, client, baseline):
+    method, get_url, data, *user = CASES[name]
+    client.force_login(dataset[user[0] if user else 'reader'])
+    result = measure(client, method, get_url(dataset), data)
+    baseline[name] = result
+    expected = load_baseline().get(name)
+    if UPDATE or expected is None:
+        pytest.skip(f'Нет базовой линии для `{name}`: {result}')
+    assert result['queries'] <= expected['queries'], (
+        f'`{name}`: запросов стало {result["queries"]}, '
+        f'было {expected["queries"]}'
+    )
+    assert not CHECK_TIME or (
+        result['time_ms'] <= expected['time_ms'] * (1 + TIME_TOLERANCE)
+    ), (
+        f'`{name}`: время {result["time_ms"]} мс, '
+        f'было {expected["time_ms"]} мс'
+    )
+    assert result['memory_kb'] <= (
+        expected['memory_kb'] * (1 + MEMORY_TOLERANCE)
+    ), (
+        f'`{name}`: пик памяти {result["memory_kb"]} КБ, '
+        f'было {expected["memory_kb"]} КБ'
+    )
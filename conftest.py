@@ -0,0 +1,10 @@
+"""Общие хуки pytest для проверочных тестов и замеров."""
+import pytest
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    """Дождаться фоновых превью до того, как фикстуры уберут MEDIA_ROOT."""
+    yield
+    from posts import thumbnails
+    thumbnails.drain()
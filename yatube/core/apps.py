@@ -1,5 +1,23 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from .metrics import install_template_hook
+
+        install_template_hook()
+        if settings.TEMPLATE_CACHE:
+            warm_templates()
+
+
+def warm_templates():
+    """Заранее скомпилировать шаблоны всех кеширующих загрузчиков."""
+    from django.template import engines
+
+    for engine in engines.all():
+        for loader in getattr(engine, 'engine', engine).template_loaders:
+            if hasattr(loader, 'warm'):
+                loader.warm()
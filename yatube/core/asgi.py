@@ -0,0 +1,191 @@
+"""ASGI-вход для Django 2.2 и ограниченный пул потоков для БД.
+
+Django 2.2 не умеет асинхронные представления, поэтому ``ASGIHandler``
+переводит HTTP-запрос ASGI в окружение WSGI и выполняет обычный
+``WSGIHandler`` (с middleware) в пуле из ``ASGI_THREADS`` потоков.
+Представления, помеченные ``async_variant``, под ASGI вызывают свою
+корутину в цикле событий сервера; её независимые запросы к БД идут
+одновременно через ``run_in_db`` в пуле из ``ASGI_DB_THREADS`` потоков.
+Под WSGI работают обычные синхронные представления.
+
+Ограничение: middleware Django 2.2 синхронные, поэтому корутина
+запускается из потока запроса, и этот поток ждёт её результата. Пока
+корутина ждёт БД, поток из ``ASGI_THREADS`` занят, так что одновременных
+запросов не больше ``ASGI_THREADS``, как у WSGI-сервера с потоками.
+Выигрыш ASGI здесь — параллельные запросы к БД внутри одной страницы,
+а не число соединений на процесс.
+"""
+import asyncio
+import contextvars
+import functools
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import close_old_connections
+
+from . import metrics
+
+LOOP_KEY = 'asgi.loop'
+BODY_MEMORY_LIMIT = 1024 * 1024
+
+_executors = {}
+
+
+def _get_executor(name, setting):
+    if name not in _executors:
+        _executors[name] = ThreadPoolExecutor(
+            max_workers=getattr(settings, setting),
+            thread_name_prefix=f'asgi-{name}'
+        )
+    return _executors[name]
+
+
+async def run_in_db(func, *args, **kwargs):
+    """Выполнить синхронный код с запросами к БД в пуле потоков.
+
+    Код видит контекст запроса (``contextvars``): метрики и маршрутизацию.
+    """
+    request_metrics = metrics.current()
+
+    def call():
+        try:
+            if request_metrics is None:
+                return func(*args, **kwargs)
+            with metrics.bind(request_metrics):
+                return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_executor('db', 'ASGI_DB_THREADS'),
+        contextvars.copy_context().run, call
+    )
+
+
+def async_variant(coroutine):
+    """Под ASGI заменить представление корутиной coroutine.
+
+    Поток запроса блокируется до конца корутины (см. описание модуля).
+    """
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            loop = request.META.get(LOOP_KEY)
+            if loop is None:
+                return view(request, *args, **kwargs)
+            return asyncio.run_coroutine_threadsafe(
+                coroutine(request, *args, **kwargs), loop
+            ).result()
+
+        wrapper.async_variant = coroutine
+        return wrapper
+
+    return decorator
+
+
+class ASGIHandler:
+    """Приложение ASGI 3 поверх ``WSGIHandler``."""
+
+    def __init__(self):
+        self.wsgi = WSGIHandler()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемый тип ASGI: {scope["type"]}')
+        body = await self.read_body(receive)
+        loop = asyncio.get_running_loop()
+        environ = self.get_environ(scope, body, loop)
+        try:
+            status, headers, content = await loop.run_in_executor(
+                _get_executor('requests', 'ASGI_THREADS'),
+                self.run_wsgi, environ
+            )
+        finally:
+            body.close()
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': headers,
+        })
+        await send({'type': 'http.response.body', 'body': content})
+
+    @staticmethod
+    async def lifespan(receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def read_body(receive):
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_MEMORY_LIMIT)
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                break
+            body.write(message.get('body', b''))
+            more_body = message.get('more_body', False)
+        body.seek(0)
+        return body
+
+    @staticmethod
+    def get_environ(scope, body, loop):
+        server_name, server_port = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', ''),
+            'PATH_INFO': scope['path'].encode().decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': server_name,
+            'SERVER_PORT': str(server_port),
+            'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+            'REMOTE_ADDR': client[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            LOOP_KEY: loop,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1').upper().replace('-', '_')
+            value = value.decode('latin-1')
+            if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                name = f'HTTP_{name}'
+            if name in environ:
+                value = f'{environ[name]},{value}'
+            environ[name] = value
+        return environ
+
+    def run_wsgi(self, environ):
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = [
+                (name.lower().encode('latin-1'), value.encode('latin-1'))
+                for name, value in headers
+            ]
+
+        response = self.wsgi(environ, start_response)
+        try:
+            content = b''.join(response)
+        finally:
+            close = getattr(response, 'close', None)
+            if close is not None:
+                close()
+        return started['status'], started['headers'], content
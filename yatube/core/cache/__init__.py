@@ -0,0 +1,65 @@
+from django.core.cache import caches
+
+from ..metrics import record_cache
+
+_MISSING = object()
+
+
+class NamespacedCache:
+    """Кеш приложения: ключи получают префикс вида ``posts:``.
+
+    Обёртка делегирует всё выбранному кешу Django, поэтому приложения
+    делят одно хранилище и не пересекаются по ключам.
+    """
+
+    def __init__(self, namespace, alias='default'):
+        self.namespace = namespace
+        self.alias = alias
+
+    @property
+    def backend(self):
+        return caches[self.alias]
+
+    def make_key(self, key):
+        return f'{self.namespace}:{key}'
+
+    def get(self, key, default=None):
+        value = self.backend.get(self.make_key(key), _MISSING)
+        hit = value is not _MISSING
+        record_cache(int(hit), int(not hit))
+        return value if hit else default
+
+    def set(self, key, value, *args, **kwargs):
+        return self.backend.set(self.make_key(key), value, *args, **kwargs)
+
+    def add(self, key, value, *args, **kwargs):
+        return self.backend.add(self.make_key(key), value, *args, **kwargs)
+
+    def delete(self, key):
+        return self.backend.delete(self.make_key(key))
+
+    def incr(self, key, delta=1):
+        return self.backend.incr(self.make_key(key), delta)
+
+    def get_many(self, keys):
+        keys = {self.make_key(key): key for key in keys}
+        values = {
+            keys[key]: value
+            for key, value in self.backend.get_many(keys).items()
+        }
+        record_cache(len(values), len(keys) - len(values))
+        return values
+
+    def set_many(self, data, *args, **kwargs):
+        keys = {self.make_key(key): key for key in data}
+        failed = self.backend.set_many({
+            self.make_key(key): value for key, value in data.items()
+        }, *args, **kwargs)
+        return [keys[key] for key in failed or ()]
+
+    def delete_many(self, keys):
+        return self.backend.delete_many(self.make_key(key) for key in keys)
+
+
+def namespace(name, alias='default'):
+    return NamespacedCache(name, alias)
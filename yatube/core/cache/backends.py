@@ -0,0 +1,418 @@
+"""Общие для всех процессов бэкенды кеша.
+
+``SQLiteCache`` хранит записи в отдельном файле SQLite в режиме WAL и
+подходит для нескольких процессов на одной машине. ``RedisCache``
+говорит с любым сервером по протоколу Redis (RESP). Оба бэкенда сжимают
+большие значения, например отрендеренные страницы.
+"""
+import pickle
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlparse
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+COMPRESS_MIN_LENGTH = 1024
+SQLITE_BATCH_SIZE = 500
+SOCKET_TIMEOUT = 5
+
+
+class SerializingCache(BaseCache):
+    """Сериализация значений: целые числа как есть, остальное — pickle.
+
+    Pickle длиннее ``COMPRESS_MIN_LENGTH`` байт сжимается zlib.
+    """
+
+    def __init__(self, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._compress_min_length = options.get(
+            'COMPRESS_MIN_LENGTH', COMPRESS_MIN_LENGTH
+        )
+
+    def dumps(self, value):
+        if type(value) is int:
+            return str(value).encode()
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(data) >= self._compress_min_length:
+            return b'z' + zlib.compress(data)
+        return b'p' + data
+
+    def loads(self, data):
+        if data[:1] == b'z':
+            return pickle.loads(zlib.decompress(data[1:]))
+        if data[:1] == b'p':
+            return pickle.loads(data[1:])
+        return int(data)
+
+    def _prepare_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+
+class SQLiteCache(SerializingCache):
+    """Кеш в файле SQLite, общий для процессов одной машины."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+        self._sets = 0
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self._path, timeout=5, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+            )
+            self._local.connection = connection
+        return connection
+
+    def _expires(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return None if expires is None else float(expires)
+
+    def get(self, key, default=None, version=None):
+        key = self._prepare_key(key, version)
+        row = self._connection.execute(
+            'SELECT value FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())
+        ).fetchone()
+        return default if row is None else self.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys = {self._prepare_key(key, version): key for key in keys}
+        found = {}
+        names = list(keys)
+        for start in range(0, len(names), SQLITE_BATCH_SIZE):
+            batch = names[start:start + SQLITE_BATCH_SIZE]
+            rows = self._connection.execute(
+                'SELECT key, value FROM cache WHERE key IN ({}) '
+                'AND (expires IS NULL OR expires > ?)'.format(
+                    ', '.join('?' * len(batch))
+                ),
+                (*batch, time.time())
+            )
+            for key, value in rows:
+                found[keys[key]] = self.loads(value)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self._expires(timeout)
+        rows = [
+            (self._prepare_key(key, version), self.dumps(value), expires)
+            for key, value in data.items()
+        ]
+        with self._transaction() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                rows
+            )
+        self._sets += len(rows)
+        if self._sets >= self._max_entries // self._cull_frequency:
+            self._sets = 0
+            self._cull()
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._prepare_key(key, version)
+        with self._transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time())
+            )
+            cursor = connection.execute(
+                'INSERT OR IGNORE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                (key, self.dumps(value), self._expires(timeout))
+            )
+        return cursor.rowcount == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._prepare_key(key, version)
+        cursor = self._connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self._expires(timeout), key, time.time())
+        )
+        return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._prepare_key(key, version)
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = self.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self.dumps(value), key)
+            )
+        return value
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [(self._prepare_key(key, version),) for key in keys]
+        with self._transaction() as connection:
+            connection.executemany('DELETE FROM cache WHERE key = ?', keys)
+
+    def has_key(self, key, version=None):
+        return self.get(key, version=version) is not None
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+    def _transaction(self):
+        return _Transaction(self._connection)
+
+    def _cull(self):
+        with self._transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),)
+            )
+            (count,) = connection.execute(
+                'SELECT COUNT(*) FROM cache'
+            ).fetchone()
+            if count > self._max_entries:
+                connection.execute(
+                    'DELETE FROM cache WHERE key IN ('
+                    # Вечные ключи (поколения, версии) вытесняются последними.
+                    'SELECT key FROM cache '
+                    'ORDER BY expires IS NULL, expires LIMIT ?)',
+                    (count // self._cull_frequency,)
+                )
+
+
+class _Transaction:
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.connection.execute('ROLLBACK' if exc_type else 'COMMIT')
+
+
+class RedisError(Exception):
+    pass
+
+
+class ReplyError(RedisError):
+    """Сервер ответил ошибкой, соединение при этом исправно."""
+
+
+class RespConnection:
+    """Минимальный клиент протокола Redis (RESP2) с конвейером команд."""
+
+    def __init__(self, host, port, db=0, timeout=5):
+        self._socket = socket.create_connection((host, port), timeout)
+        self._reader = self._socket.makefile('rb')
+        if db:
+            try:
+                self.execute('SELECT', db)
+            except BaseException:
+                self.close()
+                raise
+
+    @staticmethod
+    def _encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read(self):
+        line = self._reader.readline()
+        if not line:
+            raise RedisError('Соединение с сервером закрыто')
+        kind, payload = line[:1], line[1:-2]
+        if kind == b'+':
+            return payload.decode()
+        if kind == b'-':
+            raise ReplyError(payload.decode())
+        if kind == b':':
+            return int(payload)
+        if kind == b'$':
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if kind == b'*':
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self._read() for _ in range(length)]
+        raise RedisError(f'Неизвестный ответ сервера: {line!r}')
+
+    def pipeline(self, commands):
+        """Отправить команды разом и прочитать все ответы.
+
+        Ответ-ошибка поднимается только после чтения остальных ответов,
+        чтобы они не достались следующей команде.
+        """
+        self._socket.sendall(
+            b''.join(self._encode(command) for command in commands)
+        )
+        replies = []
+        error = None
+        for _ in commands:
+            try:
+                replies.append(self._read())
+            except ReplyError as exc:
+                error = error or exc
+                replies.append(None)
+        if error is not None:
+            raise error
+        return replies
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def close(self):
+        self._reader.close()
+        self._socket.close()
+
+
+class RedisCache(SerializingCache):
+    """Кеш на сервере Redis, LOCATION вида ``redis://host:port/db``."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        url = urlparse(location)
+        self._host = url.hostname or '127.0.0.1'
+        self._port = url.port or 6379
+        self._db = int(url.path.strip('/') or 0)
+        self._socket_timeout = params.get('OPTIONS', {}).get(
+            'SOCKET_TIMEOUT', SOCKET_TIMEOUT
+        )
+        self._local = threading.local()
+
+    @property
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = RespConnection(
+                self._host, self._port, self._db, self._socket_timeout
+            )
+            self._local.client = client
+        return client
+
+    def _pipeline(self, commands):
+        """Выполнить команды в соединении потока.
+
+        После любой ошибки, кроме ответа-ошибки сервера, соединение
+        закрывается: таймаут или обрыв оставляют в сокете непрочитанные
+        ответы, и следующий вызов откроет новое соединение.
+        """
+        client = self._client
+        try:
+            return client.pipeline(commands)
+        except ReplyError:
+            raise
+        except BaseException:
+            self._local.client = None
+            client.close()
+            raise
+
+    def _execute(self, *args):
+        return self._pipeline([args])[0]
+
+    def _set_command(self, key, value, timeout, *flags):
+        command = ['SET', key, self.dumps(value), *flags]
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None:
+            milliseconds = max(int((timeout - time.time()) * 1000), 1)
+            command += ['PX', milliseconds]
+        return command
+
+    def get(self, key, default=None, version=None):
+        value = self._execute('GET', self._prepare_key(key, version))
+        return default if value is None else self.loads(value)
+
+    def get_many(self, keys, version=None):
+        keys = {self._prepare_key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        values = self._execute('MGET', *keys)
+        return {
+            keys[key]: self.loads(value)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout == 0:
+            self.delete_many(data, version)
+            return []
+        self._pipeline([
+            self._set_command(self._prepare_key(key, version), value, timeout)
+            for key, value in data.items()
+        ])
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        command = self._set_command(
+            self._prepare_key(key, version), value, timeout, 'NX'
+        )
+        return self._execute(*command) == 'OK'
+
+    def incr(self, key, delta=1, version=None):
+        key = self._prepare_key(key, version)
+        value = self._execute('GET', key)
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        if value[:1] in (b'p', b'z'):
+            value = self.loads(value) + delta
+            self._execute('SET', key, self.dumps(value), 'KEEPTTL')
+            return value
+        return self._execute('INCRBY', key, delta)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._prepare_key(key, version) for key in keys]
+        if keys:
+            self._execute('DEL', *keys)
+
+    def has_key(self, key, version=None):
+        return bool(
+            self._execute('EXISTS', self._prepare_key(key, version))
+        )
+
+    def clear(self):
+        self._execute('FLUSHDB')
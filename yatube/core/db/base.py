@@ -0,0 +1,47 @@
+"""Бэкенд SQLite с настройками для нескольких потоков и процессов.
+
+Каждое новое соединение с файлом базы включает журнал WAL (читатели не
+блокируют писателя), ``synchronous=NORMAL``, отображение файла в память,
+большой кеш страниц и ожидание блокировки ``busy_timeout`` вместо
+мгновенной ошибки «database is locked». Транзакции ``atomic`` начинаются с
+``BEGIN IMMEDIATE``: блокировка записи берётся сразу, и транзакция,
+которая сначала читает, а потом пишет, не падает при повышении
+блокировки. Значения задаются в ``OPTIONS['pragmas']``, а соединение с
+``OPTIONS['read_only']`` отклоняет любую запись (``query_only``).
+"""
+from django.db.backends.sqlite3 import base
+
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = {**PRAGMAS, **kwargs.pop('pragmas', {})}
+        self.read_only = kwargs.pop('read_only', False)
+        kwargs.setdefault('timeout', self.pragmas['busy_timeout'] / 1000)
+        return kwargs
+
+    def init_connection_state(self):
+        super().init_connection_state()
+        # Настройки относятся к файлу базы, а не к базе в памяти (тесты).
+        pragmas = {} if self.is_in_memory_db() else dict(self.pragmas)
+        if self.read_only:
+            pragmas.pop('journal_mode', None)
+            pragmas['query_only'] = 'ON'
+        for name, value in pragmas.items():
+            self.connection.execute(f'PRAGMA {name} = {value}')
+
+    def _start_transaction_under_autocommit(self):
+        if self.read_only:
+            super()._start_transaction_under_autocommit()
+            return
+        self.cursor().execute('BEGIN IMMEDIATE')
@@ -0,0 +1,24 @@
+"""Замена настоящей репликации для локального запуска и тестов.
+
+``sync`` копирует основную базу в файлы реплик через backup API SQLite.
+Команда ``replicate`` повторяет это с заданным интервалом, так что
+реплики отстают от основной базы не больше чем на интервал.
+"""
+import sqlite3
+
+from django.conf import settings
+from django.db import connections
+
+from .routers import PRIMARY
+
+
+def sync(replicas=None, source=PRIMARY):
+    """Скопировать базу source в реплики (по умолчанию во все)."""
+    connection = connections[source]
+    connection.ensure_connection()
+    for alias in replicas or settings.DATABASE_REPLICAS:
+        target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+        try:
+            connection.connection.backup(target)
+        finally:
+            target.close()
@@ -0,0 +1,128 @@
+"""Маршрутизация чтения на соединения только для чтения и реплики.
+
+``ReplicaRouter`` отправляет чтение лент (представления с
+``replica_reads``) на реплики ``DATABASE_REPLICAS``; приложения вне
+``DATABASE_REPLICA_APPS``, например сессии, читаются с основной базы.
+После записи пользователь на ``DATABASE_REPLICA_STICKY_SECONDS`` секунд
+закрепляется за основной базой (cookie ``ReplicaMiddleware``), чтобы
+видеть свои изменения, пока реплики их догоняют. ``ReadOnlyRouter``
+отправляет остальное чтение вне транзакций на соединение только для
+чтения к тому же файлу.
+"""
+import functools
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+
+_state = ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    """Маршрутизация текущего запроса."""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.replicas = False
+        self.wrote = False
+
+
+def current():
+    return _state.get()
+
+
+@contextmanager
+def routing(pinned=False):
+    """Маршрутизировать запросы в блоке с учётом закрепления."""
+    token = _state.set(RoutingState(pinned))
+    try:
+        yield _state.get()
+    finally:
+        _state.reset(token)
+
+
+def replica_reads(view):
+    """Разрешить представлению читать с реплик."""
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = current()
+        if state is None:
+            return view(request, *args, **kwargs)
+        previous, state.replicas = state.replicas, True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.replicas = previous
+
+    return wrapper
+
+
+def reads_from_replicas():
+    """Может ли текущее чтение уйти на отстающую реплику."""
+    state = current()
+    return bool(
+        settings.DATABASE_REPLICAS and state is not None and state.replicas
+        and not state.pinned and not state.wrote
+    )
+
+
+def may_be_stale(changed_ns):
+    """Могла ли реплика ещё не получить изменение с меткой changed_ns."""
+    window = settings.DATABASE_REPLICA_STICKY_SECONDS * 10 ** 9
+    return reads_from_replicas() and time.time_ns() - changed_ns < window
+
+
+class ReplicaRouter:
+    """Чтение лент — со случайной реплики, если не нужна основная база."""
+
+    def db_for_read(self, model, **hints):
+        if (
+            model._meta.app_label not in settings.DATABASE_REPLICA_APPS
+            or not reads_from_replicas()
+            or connections[PRIMARY].in_atomic_block
+        ):
+            return None
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        state = current()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReadOnlyRouter:
+    """Чтение вне транзакций идёт в ``DATABASE_READ_ONLY_ALIAS``.
+
+    Это то же файловое хранилище, поэтому запись сразу видна при чтении.
+    Внутри ``atomic`` чтение остаётся на основном соединении, чтобы видеть
+    незафиксированные изменения своей транзакции.
+    """
+
+    def db_for_read(self, model, **hints):
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return settings.DATABASE_READ_ONLY_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == PRIMARY
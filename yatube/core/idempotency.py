@@ -0,0 +1,80 @@
+"""Ключи идемпотентности для форм, которые создают записи.
+
+Форма с ``IdempotentFormMixin`` выводит скрытое поле со случайным
+ключом. Представление передаёт ключ в ``respond_once``: первый запрос
+с ключом занимает его в кеше через атомарный ``add`` и выполняет
+действие, а повторы (двойной клик, повтор клиента) получают тот же
+редирект, не трогая базу. Пока первый запрос не закончил, повторы ждут
+его до ``IDEMPOTENCY_WAIT_SECONDS`` секунд. Ключи живут
+``IDEMPOTENCY_TTL`` секунд и привязаны к пользователю.
+"""
+import re
+import time
+import uuid
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.utils.html import format_html
+
+from .cache import namespace
+
+cache = namespace('idempotency')
+
+FIELD = 'idempotency_key'
+PENDING = ''
+KEY_RE = re.compile(r'[0-9a-f]{32}')
+POLL_SECONDS = 0.01
+
+
+class IdempotentFormMixin:
+    """Ключ идемпотентности формы.
+
+    Ключ не входит в ``fields``: он не сохраняется в модель и не меняет
+    набор полей формы, шаблон выводит его через ``idempotency_input``.
+    """
+
+    @property
+    def idempotency_key(self):
+        if self.is_bound:
+            key = self.data.get(FIELD, '')
+            return key if KEY_RE.fullmatch(key) else None
+        if not hasattr(self, '_idempotency_key'):
+            self._idempotency_key = uuid.uuid4().hex
+        return self._idempotency_key
+
+    def idempotency_input(self):
+        return format_html(
+            '<input type="hidden" name="{}" value="{}">',
+            FIELD, self.idempotency_key or ''
+        )
+
+
+def respond_once(request, key, action):
+    """Выполнить action один раз на ключ и ответить редиректом.
+
+    ``action`` возвращает адрес редиректа; без ключа он просто
+    выполняется. Если первый запрос с ключом не закончил за время
+    ожидания, повтор получает 409.
+    """
+    if key is None:
+        return redirect(action())
+    cache_key = f'{request.user.pk}:{key}'
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        if cache.add(cache_key, PENDING, settings.IDEMPOTENCY_TTL):
+            try:
+                url = action()
+            except BaseException:
+                cache.delete(cache_key)
+                raise
+            cache.set(cache_key, url, settings.IDEMPOTENCY_TTL)
+            return redirect(url)
+        url = cache.get(cache_key)
+        if url:
+            return redirect(url)
+        if time.monotonic() > deadline:
+            return HttpResponse(
+                'Запрос с этим ключом ещё выполняется', status=409
+            )
+        time.sleep(POLL_SECONDS)
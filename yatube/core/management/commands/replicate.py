@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.db import replication
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу в реплики DATABASE_REPLICAS.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять каждые N секунд вместо однократной копии.')
+
+    def handle(self, *args, interval, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Задайте DATABASE_REPLICA_PATHS.')
+        while True:
+            started = time.monotonic()
+            replication.sync()
+            self.stderr.write(
+                f'Реплики обновлены за {time.monotonic() - started:.2f} с')
+            if interval is None:
+                return
+            time.sleep(interval)
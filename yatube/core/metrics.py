@@ -0,0 +1,290 @@
+"""Метрики производительности текущего процесса.
+
+``MetricsMiddleware`` собирает для каждого запроса число и время
+SQL-запросов, время рендеринга каждого шаблона, попадания в кеш и общее
+время ответа. Итог уходит в заголовок ``Server-Timing`` и в гистограммы
+реестра ``REGISTRY``. Адрес ``/metrics/`` отдаёт в JSON гистограммы по
+последним ``METRICS_WINDOW`` значениям, а в формате Prometheus —
+накопленные с запуска процесса: ``_count``, ``_sum`` и корзины там только
+растут, как того ждут ``rate()`` и ``histogram_quantile()``. Код вне
+запроса (например, нарезка миниатюр) пишет в реестр через ``timer``.
+"""
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Метрики одного запроса."""
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.templates = defaultdict(float)
+        self.cache = Counter()
+
+    def server_timing(self, total):
+        """Значение заголовка Server-Timing, длительности в миллисекундах."""
+        entries = [
+            f'sql;dur={self.sql_time * 1000:.1f};'
+            f'desc="{self.sql_count} queries"'
+        ]
+        entries += [
+            f'tpl;dur={seconds * 1000:.1f};desc="{name}"'
+            for name, seconds in self.templates.items()
+        ]
+        entries.append(
+            f'cache;desc="{self.cache["hits"]} hits, '
+            f'{self.cache["misses"]} misses"'
+        )
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def bind(metrics):
+    """Писать метрики кода в блоке, включая SQL всех соединений, в metrics.
+
+    Так же подключаются потоки, которые выполняют часть запроса.
+    """
+    token = _current.set(metrics)
+    try:
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(sql_wrapper)
+                )
+            yield metrics
+    finally:
+        _current.reset(token)
+
+
+def collect():
+    """Собирать метрики кода внутри блока в новый RequestMetrics."""
+    return bind(RequestMetrics())
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    """Обёртка для ``connection.execute_wrapper``: считает запросы."""
+    metrics = current()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            metrics.sql_count += 1
+            metrics.sql_time += time.perf_counter() - start
+
+
+def record_cache(hits, misses):
+    metrics = current()
+    if metrics is not None:
+        metrics.cache['hits'] += hits
+        metrics.cache['misses'] += misses
+
+
+def install_template_hook():
+    """Засекать время ``Template.render`` каждого шаблона Django."""
+    from django.template.base import Template
+
+    original = Template.render
+    if getattr(original, 'instrumented', False):
+        return
+
+    @functools.wraps(original)
+    def render(self, context):
+        metrics = current()
+        if metrics is None:
+            return original(self, context)
+        start = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            name = self.origin.template_name or self.origin.name
+            metrics.templates[name] += time.perf_counter() - start
+
+    render.instrumented = True
+    Template.render = render
+
+
+class Histogram:
+    """Гистограмма по последним ``window`` наблюдениям и с запуска."""
+
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        for index in range(bisect.bisect_left(BUCKETS, value), len(BUCKETS)):
+            self.buckets[index] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self):
+        """Скользящее окно: для JSON и просмотра глазами."""
+        samples = sorted(self.samples)
+        return {
+            'buckets': {
+                str(bound): bisect.bisect_right(samples, bound)
+                for bound in BUCKETS
+            },
+            'count': len(samples),
+            'sum': sum(samples),
+        }
+
+    def cumulative(self):
+        """Накопленные значения: для Prometheus."""
+        return {
+            'buckets': dict(zip(map(str, BUCKETS), self.buckets)),
+            'count': self.count,
+            'sum': self.sum,
+        }
+
+
+class Registry:
+    """Гистограммы и счётчики процесса с метками."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.counters = Counter()
+            self.dumped_at = time.monotonic()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(
+                    settings.METRICS_WINDOW
+                )
+            histogram.observe(value)
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            self.counters[self._key(name, labels)] += value
+
+    def value(self, name, **labels):
+        with self.lock:
+            return self.counters[self._key(name, labels)]
+
+    def record_request(self, view, total, metrics):
+        self.observe('request_seconds', total, view=view)
+        self.observe('sql_seconds', metrics.sql_time, view=view)
+        for name, seconds in metrics.templates.items():
+            self.observe('template_seconds', seconds, template=name)
+        self.inc('requests_total', view=view)
+        self.inc('sql_queries_total', metrics.sql_count, view=view)
+        self.inc('cache_hits_total', metrics.cache['hits'], view=view)
+        self.inc('cache_misses_total', metrics.cache['misses'], view=view)
+
+    def as_json(self, cumulative=False):
+        with self.lock:
+            histograms = [
+                (name, labels, histogram.cumulative() if cumulative
+                 else histogram.snapshot())
+                for (name, labels), histogram in self.histograms.items()
+            ]
+            counters = list(self.counters.items())
+        return {
+            'histograms': [
+                {'name': name, 'labels': dict(labels), **snapshot}
+                for name, labels, snapshot in sorted(histograms)
+            ],
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(counters)
+            ],
+        }
+
+    def as_prometheus(self):
+        """Текстовый формат экспозиции Prometheus."""
+        data = self.as_json(cumulative=True)
+        lines = []
+        typed = set()
+        for kind, items in (
+            ('histogram', data['histograms']), ('counter', data['counters'])
+        ):
+            for item in items:
+                name = f'yatube_{item["name"]}'
+                if name not in typed:
+                    typed.add(name)
+                    lines.append(f'# TYPE {name} {kind}')
+                labels = _labels(item['labels'])
+                if kind == 'counter':
+                    lines.append(f'{name}{labels} {item["value"]}')
+                    continue
+                buckets = [*item['buckets'].items(), ('+Inf', item['count'])]
+                lines += [
+                    f'{name}_bucket{_labels(item["labels"], le=bound)} {count}'
+                    for bound, count in buckets
+                ]
+                lines.append(f'{name}_sum{labels} {item["sum"]}')
+                lines.append(f'{name}_count{labels} {item["count"]}')
+        return '\n'.join(lines) + '\n'
+
+    def maybe_dump(self):
+        """Раз в ``METRICS_DUMP_INTERVAL`` секунд записать JSON в файл."""
+        path = settings.METRICS_DUMP_PATH
+        now = time.monotonic()
+        with self.lock:
+            due = now - self.dumped_at >= settings.METRICS_DUMP_INTERVAL
+            if not path or not due:
+                return False
+            self.dumped_at = now
+        temp_path = f'{path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.as_json(), file)
+        os.replace(temp_path, path)
+        return True
+
+
+def _labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('"', '\\"'))
+        for key, value in sorted(labels.items())
+    ) + '}'
+
+
+REGISTRY = Registry()
+
+
+@contextmanager
+def timer(name, **labels):
+    """Записать длительность блока в гистограмму ``name``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, time.perf_counter() - start, **labels)
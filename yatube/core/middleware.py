@@ -0,0 +1,56 @@
+import time
+
+from django.conf import settings
+
+from . import metrics
+from .db import routers
+
+
+class MetricsMiddleware:
+    """Замер запроса: SQL, шаблоны, кеш и общее время.
+
+    Результат добавляется в заголовок ``Server-Timing`` ответа и в
+    гистограммы ``metrics.REGISTRY`` по имени представления.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with metrics.collect() as request_metrics:
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.REGISTRY.record_request(view, total, request_metrics)
+        response['Server-Timing'] = request_metrics.server_timing(total)
+        metrics.REGISTRY.maybe_dump()
+        return response
+
+
+class ReplicaMiddleware:
+    """Закрепить пользователя за основной базой после записи.
+
+    Пока cookie ``DATABASE_REPLICA_COOKIE`` не истекла, чтение идёт с
+    основной базы, даже в представлениях с ``replica_reads``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        cookie = settings.DATABASE_REPLICA_COOKIE
+        try:
+            pinned_until = float(request.COOKIES.get(cookie, 0))
+        except ValueError:
+            pinned_until = 0
+        with routers.routing(pinned=pinned_until > time.time()) as state:
+            response = self.get_response(request)
+        if state.wrote:
+            sticky = settings.DATABASE_REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                cookie, str(time.time() + sticky), max_age=sticky,
+                httponly=True
+            )
+        return response
@@ -0,0 +1,51 @@
+"""Кеш ``reverse`` для адресов, которые строятся на каждой странице.
+
+Адрес зависит только от имени, аргументов, текущего приложения, URLconf
+потока и префикса скрипта, поэтому результат ``django.urls.reverse``
+можно запомнить. Кешируются только пространства имён из
+``URL_CACHE_NAMESPACES``; кеш сбрасывается при смене ``ROOT_URLCONF``,
+вместе с кешами резолвера Django.
+"""
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.urls import get_script_prefix, get_urlconf
+from django.urls import reverse as django_reverse
+
+
+@lru_cache(maxsize=settings.URL_CACHE_SIZE)
+def _reverse(viewname, args, kwargs, current_app, urlconf, prefix):
+    return django_reverse(
+        viewname, urlconf, args, dict(kwargs), current_app
+    )
+
+
+def reverse(viewname, args=(), kwargs=None, current_app=None):
+    """``django.urls.reverse`` с кешем для горячих пространств имён."""
+    kwargs = kwargs or {}
+    namespace = viewname.partition(':')[0] if ':' in viewname else None
+    # Объекты вроде пользователя превращаются в адрес через str(), а
+    # сравниваются по pk, поэтому кешируются только строки и числа.
+    if namespace not in settings.URL_CACHE_NAMESPACES or not all(
+        type(value) in (str, int)
+        for value in (*args, *kwargs.values())
+    ):
+        return django_reverse(
+            viewname, args=args, kwargs=kwargs, current_app=current_app
+        )
+    return _reverse(
+        viewname, tuple(args), tuple(sorted(kwargs.items())), current_app,
+        get_urlconf(), get_script_prefix()
+    )
+
+
+def clear_cache():
+    _reverse.cache_clear()
+
+
+@receiver(setting_changed)
+def urlconf_changed(setting, **kwargs):
+    if setting == 'ROOT_URLCONF':
+        clear_cache()
@@ -0,0 +1,111 @@
+"""Кешируемый загрузчик шаблонов с подстановкой include при компиляции.
+
+``InliningLoader`` — это ``cached.Loader``, который после разбора шаблона
+заменяет ``{% include 'имя' %}`` с постоянным именем узлом, уже
+хранящим скомпилированный шаблон. При рендеринге не нужно ни искать
+имя, ни обращаться к загрузчику, даже внутри цикла. ``warm`` заранее
+компилирует все шаблоны из каталогов загрузчиков, чтобы первый запрос
+после запуска не читал диск.
+"""
+import os
+
+from django.template import Node, TemplateDoesNotExist, TemplateSyntaxError
+from django.template.defaulttags import IfNode
+from django.template.loader_tags import IncludeNode
+from django.template.loaders import cached
+
+
+class InlinedIncludeNode(Node):
+    """``{% include %}`` с шаблоном, найденным при компиляции."""
+
+    def __init__(self, include, template):
+        self.template = template
+        self.extra_context = include.extra_context
+        self.isolated_context = include.isolated_context
+        self.token = include.token
+        self.origin = include.origin
+
+    def render(self, context):
+        values = {
+            name: var.resolve(context)
+            for name, var in self.extra_context.items()
+        }
+        if self.isolated_context:
+            return self.template.render(context.new(values))
+        with context.push(**values):
+            return self.template.render(context)
+
+
+def _constant_name(node):
+    expression = node.template
+    if expression.filters or not isinstance(expression.var, str):
+        return None
+    return expression.var
+
+
+def _nodelists(node):
+    if isinstance(node, IfNode):
+        return [nodelist for _, nodelist in node.conditions_nodelists]
+    return [
+        getattr(node, name) for name in node.child_nodelists
+        if getattr(node, name, None) is not None
+    ]
+
+
+class InliningLoader(cached.Loader):
+
+    def __init__(self, engine, loaders):
+        super().__init__(engine, loaders)
+        self.inlining = set()
+
+    def get_template(self, template_name, skip=None):
+        compiled = self.cache_key(template_name, skip) in (
+            self.get_template_cache
+        )
+        template = super().get_template(template_name, skip)
+        if not compiled and template_name not in self.inlining:
+            self.inlining.add(template_name)
+            try:
+                self.inline(template.nodelist)
+            finally:
+                self.inlining.discard(template_name)
+        return template
+
+    def inline(self, nodelist):
+        for index, node in enumerate(nodelist):
+            if isinstance(node, IncludeNode):
+                name = _constant_name(node)
+                # Рекурсивный или ненайденный include остаётся обычным.
+                if name is None or name in self.inlining:
+                    continue
+                try:
+                    template = self.get_template(name)
+                except TemplateDoesNotExist:
+                    continue
+                nodelist[index] = InlinedIncludeNode(node, template)
+                continue
+            for child in _nodelists(node):
+                self.inline(child)
+
+    def template_names(self):
+        for loader in self.loaders:
+            get_dirs = getattr(loader, 'get_dirs', list)
+            for directory in get_dirs():
+                for root, _, files in os.walk(directory):
+                    for file in files:
+                        if file.endswith('.html'):
+                            path = os.path.join(root, file)
+                            yield os.path.relpath(path, directory).replace(
+                                os.sep, '/'
+                            )
+
+    def warm(self):
+        """Скомпилировать все шаблоны заранее, вернуть их число."""
+        compiled = 0
+        for name in set(self.template_names()):
+            try:
+                self.get_template(name)
+            except TemplateSyntaxError:
+                continue
+            compiled += 1
+        return compiled
@@ -0,0 +1,38 @@
+from django import template
+from django.template import defaulttags
+from django.urls import NoReverseMatch
+from django.utils.html import conditional_escape
+
+from core.reverse import reverse
+
+register = template.Library()
+
+
+class CachedURLNode(defaulttags.URLNode):
+
+    def render(self, context):
+        args = [arg.resolve(context) for arg in self.args]
+        kwargs = {k: v.resolve(context) for k, v in self.kwargs.items()}
+        view_name = self.view_name.resolve(context)
+        request = getattr(context, 'request', None)
+        current_app = getattr(request, 'current_app', None)
+        if current_app is None:
+            match = getattr(request, 'resolver_match', None)
+            current_app = getattr(match, 'namespace', None)
+        url = ''
+        try:
+            url = reverse(view_name, args, kwargs, current_app)
+        except NoReverseMatch:
+            if self.asvar is None:
+                raise
+        if self.asvar:
+            context[self.asvar] = url
+            return ''
+        return conditional_escape(url) if context.autoescape else url
+
+
+@register.tag
+def url(parser, token):
+    """``{% url %}``, который берёт адрес из кеша ``core.reverse``."""
+    node = defaulttags.url(parser, token)
+    return CachedURLNode(node.view_name, node.args, node.kwargs, node.asvar)
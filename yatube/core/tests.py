@@ -1,4 +1,31 @@
-from django.test import TestCase
+import json
+import os
+import socketserver
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.template import Context, Engine, engines
+from django.template.loader_tags import IncludeNode
+from django.test import Client, TestCase, override_settings
+from django.urls import include, path, reverse
+
+from .cache import namespace
+from .cache.backends import RedisCache, RedisError, SQLiteCache
+from .db.base import DatabaseWrapper
+from .db.routers import ReadOnlyRouter
+from .metrics import REGISTRY
+from .reverse import _reverse, clear_cache
+from .reverse import reverse as cached_reverse
+from .template_loaders import InlinedIncludeNode
+from posts.models import Comment, Post
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -7,3 +34,526 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Заглушка сервера Redis: подмножество команд для тестов кеша."""
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        if value is None:
+            self.wfile.write(b'$-1\r\n')
+        elif isinstance(value, int):
+            self.wfile.write(b':%d\r\n' % value)
+        elif isinstance(value, list):
+            self.wfile.write(b'*%d\r\n' % len(value))
+            for item in value:
+                self.reply(item)
+        elif isinstance(value, str):
+            self.wfile.write(b'+%s\r\n' % value.encode())
+        else:
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(value), value))
+
+    def get(self, key):
+        value, expires = self.server.data.get(key, (None, None))
+        if expires is not None and expires <= time.time():
+            self.server.data.pop(key, None)
+            return None
+        return value
+
+    def command_get(self, key):
+        return self.get(key)
+
+    def command_mget(self, *keys):
+        return [self.get(key) for key in keys]
+
+    def command_set(self, key, value, *flags):
+        flags = [flag.upper() for flag in flags]
+        if b'NX' in flags and self.get(key) is not None:
+            return None
+        expires = None
+        if b'PX' in flags:
+            milliseconds = int(flags[flags.index(b'PX') + 1])
+            expires = time.time() + milliseconds / 1000
+        elif b'KEEPTTL' in flags:
+            expires = self.server.data[key][1]
+        self.server.data[key] = (value, expires)
+        return 'OK'
+
+    def command_incrby(self, key, delta):
+        value = int(self.get(key)) + int(delta)
+        self.server.data[key] = (str(value).encode(), self.server.data[key][1])
+        return value
+
+    def command_del(self, *keys):
+        return sum(
+            self.server.data.pop(key, None) is not None for key in keys)
+
+    def command_exists(self, key):
+        return int(self.get(key) is not None)
+
+    def command_flushdb(self):
+        self.server.data.clear()
+        return 'OK'
+
+    def command_debug(self, subcommand, seconds):
+        time.sleep(float(seconds))
+        return 'OK'
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            name, *args = args
+            command = getattr(self, f'command_{name.decode().lower()}', None)
+            try:
+                if command is None:
+                    self.wfile.write(b'-ERR unknown command\r\n')
+                else:
+                    self.reply(command(*args))
+            except OSError:
+                # Клиент закрыл соединение, не дождавшись ответа.
+                return
+
+
+class CacheBackendTestsMixin:
+    def test_get_set(self):
+        """Значения сохраняются и читаются из кеша."""
+        self.cache.set('key', {'text': 'Тестовый пост'})
+        self.assertEqual(self.cache.get('key'), {'text': 'Тестовый пост'})
+        self.assertIsNone(self.cache.get('missing'))
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_bulk_and_compression(self):
+        """Групповые операции и сжатие больших значений."""
+        page = 'Тестовая страница ' * 1000
+        self.cache.set_many({'a': 1, 'b': page})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': page})
+        self.assertTrue(self.cache.dumps(page).startswith(b'z'))
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_add_incr_timeout(self):
+        """add не перезаписывает, incr увеличивает, timeout истекает."""
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertFalse(self.cache.add('counter', 5))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        self.assertEqual(self.cache.get('counter'), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('short', 'value', 0.05)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertTrue(self.cache.add('short', 'new'))
+
+
+class SQLiteCacheTests(CacheBackendTestsMixin, TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = SQLiteCache(
+            os.path.join(self.directory.name, 'cache.sqlite3'), {})
+        self.other_process_cache = SQLiteCache(
+            os.path.join(self.directory.name, 'cache.sqlite3'), {})
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_shared_between_instances(self):
+        """Кеш виден другим экземплярам с тем же файлом."""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.other_process_cache.get('key'), 'value')
+
+    def test_cull_keeps_persistent_keys(self):
+        """Вытеснение начинает с ключей со сроком, вечные остаются."""
+        cache = SQLiteCache(
+            os.path.join(self.directory.name, 'cache.sqlite3'),
+            {'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 2}})
+        cache.set('generation', 1, None)
+        for number in range(4):
+            cache.set(f'key{number}', number, 60)
+        cache._cull()
+        self.assertEqual(cache.get('generation'), 1)
+
+
+class RedisCacheTests(CacheBackendTestsMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = socketserver.ThreadingTCPServer(
+            ('127.0.0.1', 0), FakeRedisHandler)
+        cls.server.daemon_threads = True
+        cls.server.data = {}
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        host, port = self.server.server_address
+        self.cache = RedisCache(
+            f'redis://{host}:{port}/0', {'OPTIONS': {'SOCKET_TIMEOUT': 0.1}})
+        self.cache.clear()
+
+    def test_reconnect_after_timeout(self):
+        """После таймаута поток открывает новое соединение."""
+        self.cache.set('key', 'value')
+        with self.assertRaises(OSError):
+            self.cache._execute('DEBUG', 'SLEEP', 0.3)
+        self.assertEqual(self.cache.get('key'), 'value')
+
+    def test_error_reply_in_pipeline(self):
+        """Ошибка в конвейере не сдвигает ответы следующих команд."""
+        self.cache.set('key', 'value')
+        with self.assertRaises(RedisError):
+            self.cache._pipeline([['UNKNOWN'], ['GET', 'key']])
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get_many(['key']), {'key': 'value'})
+
+
+class NamespacedCacheTests(TestCase):
+    def test_namespaces_do_not_collide(self):
+        """Одинаковые ключи разных приложений не пересекаются."""
+        posts_cache = namespace('posts')
+        users_cache = namespace('users')
+        posts_cache.set('key', 'posts')
+        users_cache.set('key', 'users')
+        self.assertEqual(posts_cache.get('key'), 'posts')
+        self.assertEqual(users_cache.get_many(['key']), {'key': 'users'})
+        self.assertEqual(cache.get('posts:key'), 'posts')
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        REGISTRY.reset()
+        self.guest_client = Client()
+
+    def test_server_timing(self):
+        """Ответ содержит SQL, шаблоны и кеш в Server-Timing."""
+        response = self.guest_client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'sql;dur=[\d.]+;desc="\d+ queries"')
+        self.assertIn('desc="posts/index.html"', timing)
+        self.assertIn('desc="includes/feed.html"', timing)
+        self.assertRegex(timing, r'cache;desc="\d+ hits, [1-9]\d* misses"')
+        self.assertRegex(timing, r'total;dur=[\d.]+$')
+
+    def test_registry(self):
+        """Запросы попадают в гистограммы и счётчики по представлениям."""
+        for _ in range(2):
+            self.guest_client.get(reverse('posts:index'))
+        data = REGISTRY.as_json()
+        requests = [
+            item for item in data['histograms']
+            if item['name'] == 'request_seconds'
+            and item['labels'] == {'view': 'posts:index'}
+        ]
+        self.assertEqual(requests[0]['count'], 2)
+        self.assertIn(
+            {'template': 'includes/feed.html'},
+            [item['labels'] for item in data['histograms']]
+        )
+        counters = {
+            (item['name'], item['labels'].get('view')): item['value']
+            for item in data['counters']
+        }
+        self.assertEqual(counters['requests_total', 'posts:index'], 2)
+        self.assertGreater(counters['cache_hits_total', 'posts:index'], 0)
+
+    def test_metrics_endpoint(self):
+        """Метрики отдаются в JSON и в формате Prometheus."""
+        self.guest_client.get(reverse('posts:index'))
+        self.guest_client.force_login(
+            User.objects.create_user(username='staff', is_staff=True))
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'].split(';')[0], 'text/plain')
+        self.assertContains(
+            response, '# TYPE yatube_request_seconds histogram')
+        self.assertContains(
+            response,
+            'yatube_request_seconds_bucket{le="+Inf",view="posts:index"} 1'
+        )
+        response = self.guest_client.get(
+            reverse('metrics'), {'format': 'json'})
+        self.assertIn('histograms', response.json())
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_private(self):
+        """Метрики видят только сотрудники и сборщик с токеном."""
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+        response = self.guest_client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 404)
+        response = self.guest_client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.create_user(username='user')
+        self.guest_client.force_login(user)
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
+        user.is_staff = True
+        user.save()
+        response = self.guest_client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_WINDOW=2)
+    def test_prometheus_cumulative(self):
+        """Prometheus получает накопленные значения, а не окно."""
+        for _ in range(3):
+            self.guest_client.get(reverse('posts:index'))
+        requests = [
+            item for item in REGISTRY.as_json()['histograms']
+            if item['name'] == 'request_seconds'
+        ]
+        self.assertEqual(requests[0]['count'], 2)
+        text = REGISTRY.as_prometheus()
+        self.assertIn(
+            'yatube_request_seconds_count{view="posts:index"} 3', text)
+        self.assertIn(
+            'yatube_request_seconds_bucket{le="+Inf",view="posts:index"} 3',
+            text
+        )
+
+    def test_periodic_dump(self):
+        """Метрики периодически сбрасываются в JSON-файл."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.json')
+            with override_settings(
+                METRICS_DUMP_PATH=path, METRICS_DUMP_INTERVAL=0
+            ):
+                self.guest_client.get(reverse('posts:index'))
+            with open(path, encoding='utf-8') as file:
+                self.assertIn('counters', json.load(file))
+
+
+class SQLiteBackendTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'db.sqlite3')
+        self.wrappers = []
+
+    def tearDown(self):
+        for wrapper in self.wrappers:
+            wrapper.close()
+        self.directory.cleanup()
+
+    def wrapper(self, **options):
+        wrapper = DatabaseWrapper({
+            **connections['default'].settings_dict,
+            'NAME': self.path,
+            'OPTIONS': options,
+        })
+        self.wrappers.append(wrapper)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """Соединение включает WAL и ждёт блокировку."""
+        wrapper = self.wrapper(pragmas={'cache_size': -1024})
+        self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+        self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+        self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 20000)
+        self.assertEqual(self.pragma(wrapper, 'cache_size'), -1024)
+        self.assertEqual(self.pragma(wrapper, 'query_only'), 0)
+
+    def test_read_only(self):
+        """Соединение только для чтения не пишет."""
+        with self.wrapper().cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        with self.wrapper(read_only=True).cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            with self.assertRaises(OperationalError):
+                cursor.execute('INSERT INTO item VALUES (1)')
+
+    def test_begin_immediate(self):
+        """Транзакция берёт блокировку записи сразу."""
+        first = self.wrapper()
+        second = self.wrapper(pragmas={'busy_timeout': 0}, timeout=0)
+        with first.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+        first._start_transaction_under_autocommit()
+        try:
+            with self.assertRaises(OperationalError):
+                with second.cursor() as cursor:
+                    cursor.execute('INSERT INTO item VALUES (1)')
+        finally:
+            first.connection.rollback()
+
+    def test_read_only_router(self):
+        """Чтение вне транзакции идёт на соединение только для чтения."""
+        router = ReadOnlyRouter()
+        self.assertEqual(router.db_for_read(User), 'default')
+        with mock.patch.object(
+            connections['default'], 'in_atomic_block', False
+        ):
+            self.assertEqual(router.db_for_read(User), 'readonly')
+        self.assertEqual(router.db_for_write(User), 'default')
+        self.assertFalse(router.allow_migrate('readonly', 'posts'))
+
+
+LOCMEM_TEMPLATES = {
+    'page.html': (
+        "{% for i in items %}{% include 'item.html' with n=i %}{% endfor %}"
+    ),
+    'dynamic.html': "{% include name %}{% include 'item.html' only %}",
+    'item.html': '[{{ n }}]',
+    'tree.html': "{{ n }}{% if n %}{% include 'tree.html' with n=n|add:-1 %}"
+                 "{% endif %}",
+}
+
+
+def inlining_engine(loaders, dirs=()):
+    return Engine(
+        dirs=dirs,
+        loaders=[('core.template_loaders.InliningLoader', loaders)],
+        libraries=engines['django'].engine.libraries,
+    )
+
+
+class InliningLoaderTests(TestCase):
+    def setUp(self):
+        self.engine = inlining_engine(
+            [('django.template.loaders.locmem.Loader', LOCMEM_TEMPLATES)])
+        self.loader = self.engine.template_loaders[0]
+
+    def test_include_inlined(self):
+        """Include с постоянным именем подставляется при компиляции."""
+        template = self.engine.get_template('page.html')
+        self.assertIsInstance(
+            template.nodelist[0].nodelist_loop[0], InlinedIncludeNode)
+        with mock.patch.object(
+            self.loader, 'get_template', side_effect=AssertionError
+        ):
+            html = template.render(Context({'items': [1, 2, 3]}))
+        self.assertEqual(html, '[1][2][3]')
+
+    def test_dynamic_include(self):
+        """Include с переменным именем не подставляется, only работает."""
+        template = self.engine.get_template('dynamic.html')
+        dynamic, isolated = template.nodelist
+        self.assertIsInstance(dynamic, IncludeNode)
+        self.assertIsInstance(isolated, InlinedIncludeNode)
+        html = template.render(Context({'name': 'item.html', 'n': 0}))
+        self.assertEqual(html, '[0][]')
+
+    def test_recursive_include(self):
+        """Рекурсивный include остаётся обычным и работает."""
+        template = self.engine.get_template('tree.html')
+        self.assertEqual(template.render(Context({'n': 3})), '3210')
+
+    def test_pages_match_default_loaders(self):
+        """Страницы с подстановкой совпадают со страницами без неё."""
+        options = {
+            name: value
+            for name, value in settings.TEMPLATES[0]['OPTIONS'].items()
+            if name != 'loaders'
+        }
+        default = [
+            {**settings.TEMPLATES[0], 'APP_DIRS': True, 'OPTIONS': options}
+        ]
+        inlining = [{**settings.TEMPLATES[0], 'APP_DIRS': False, 'OPTIONS': {
+            **options, 'loaders': [(
+                'core.template_loaders.InliningLoader',
+                settings.TEMPLATE_LOADERS
+            )],
+        }}]
+        user = User.objects.create_user(username='TestUser')
+        post = Post.objects.create(author=user, text='Тестовый пост')
+        Comment.objects.create(post=post, author=user, text='Комментарий')
+        adresses = (
+            reverse('posts:index'),
+            reverse('posts:post_detail', args=(post.pk,)),
+            reverse('posts:profile', args=(user.username,)),
+        )
+        for adress in adresses:
+            with self.subTest(adress=adress):
+                cache.clear()
+                with override_settings(TEMPLATES=default):
+                    expected = self.client.get(adress).content
+                cache.clear()
+                with override_settings(TEMPLATES=inlining):
+                    self.assertEqual(self.client.get(adress).content, expected)
+
+    def test_warm(self):
+        """Прогрев компилирует все шаблоны из каталогов загрузчиков."""
+        engine = inlining_engine(
+            settings.TEMPLATE_LOADERS, settings.TEMPLATES[0]['DIRS'],
+        )
+        loader = engine.template_loaders[0]
+        self.assertGreater(loader.warm(), 0)
+        self.assertIn('includes/post.html', loader.get_template_cache)
+
+
+urlpatterns = [
+    path('prefix/', include('posts.urls', namespace='posts')),
+]
+
+
+class ReverseCacheTests(TestCase):
+    def setUp(self):
+        clear_cache()
+
+    def test_cached(self):
+        """Повторный reverse берётся из кеша и совпадает с Django."""
+        for args in ((1,), (1,), (2,)):
+            self.assertEqual(
+                cached_reverse('posts:post_detail', args),
+                reverse('posts:post_detail', args=args))
+        info = _reverse.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 2))
+        self.assertEqual(
+            cached_reverse('posts:profile', kwargs={'username': 'TestUser'}),
+            reverse('posts:profile', args=('TestUser',)))
+
+    def test_objects_not_cached(self):
+        """Объекты и чужие пространства имён не попадают в кеш."""
+        user = User.objects.create_user(username='TestUser')
+        self.assertEqual(
+            cached_reverse('posts:profile', (user,)), '/profile/TestUser/')
+        self.assertEqual(cached_reverse('metrics'), reverse('metrics'))
+        self.assertEqual(_reverse.cache_info().currsize, 0)
+
+    def test_urlconf_change(self):
+        """Смена ROOT_URLCONF сбрасывает кеш."""
+        post = Post.objects.create(
+            author=User.objects.create_user(username='TestUser'),
+            text='Тестовый пост')
+        self.assertEqual(post.get_absolute_url(), f'/posts/{post.pk}/')
+        with override_settings(ROOT_URLCONF='core.tests'):
+            self.assertEqual(
+                post.get_absolute_url(), f'/prefix/posts/{post.pk}/')
+        self.assertEqual(post.get_absolute_url(), f'/posts/{post.pk}/')
+
+    def test_template_tag(self):
+        """Тег url из cached_url выводит те же адреса."""
+        source = (
+            "{% url 'posts:profile' name %} {% url 'posts:index' as home %}"
+            "{{ home }} {% url 'about:tech' %}"
+        )
+        context = {'name': 'Test&User'}
+        expected = engines['django'].from_string(source).render(context)
+        self.assertIn('Test&amp;User', expected)
+        rendered = engines['django'].from_string(
+            '{% load cached_url %}' + source).render(context)
+        self.assertEqual(rendered, expected)
+        self.assertEqual(_reverse.cache_info().currsize, 3)
@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render
 
+from .metrics import REGISTRY
+
 
 def page_not_found(request, exception):
     """Отправка на кастомную страницу 404 ошибки."""
@@ -14,3 +20,24 @@ def csrf_failure(request, reason=''):
 def server_error(request):
     """Отправка на кастомную страницу 500 ошибки."""
     return render(request, 'core/500_server_error.html', status=500)
+
+
+def _has_metrics_token(request):
+    """Заголовок ``Authorization: Bearer <METRICS_TOKEN>`` от сборщика."""
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(
+        header.encode(), f'Bearer {token}'.encode()
+    )
+
+
+def metrics(request):
+    """Метрики процесса для сотрудников и сборщика с токеном."""
+    if not request.user.is_staff and not _has_metrics_token(request):
+        raise Http404
+    if request.GET.get('format') == 'json':
+        return JsonResponse(REGISTRY.as_json())
+    return HttpResponse(
+        REGISTRY.as_prometheus(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Post, Group
+from .search import search_ids
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -9,6 +10,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=search_ids(search_term)), False
+
 
 class PostGroup(admin.ModelAdmin):
     prepopulated_fields = {"slug": ("title",)}
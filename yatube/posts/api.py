@@ -0,0 +1,107 @@
+"""JSON API лент только для чтения: главная, группа и профиль.
+
+Ленты строятся теми же запросами и курсорной пагинацией, что и HTML, но
+отдают только поля, нужные клиенту. ETag складывается из поколения лент
+(``feed_cache.generation``) и даты самого свежего поста ленты, поэтому
+повторный запрос с ``If-None-Match`` получает 304 за один запрос к
+индексу и без рендеринга. Без общего кеша поколение истекает через
+``FEED_GENERATION_TIMEOUT`` секунд, так что правки из других процессов
+не прячутся за 304 дольше этого срока.
+"""
+import hashlib
+from datetime import datetime, timezone
+
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import condition, require_GET
+
+from . import feed_cache
+from .models import Group, Post, User
+from .paginators import CursorPaginator
+
+PER_PAGE = 10
+
+
+def serialize_post(post):
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+        'comments': post.comment_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+        'author': comment.author.username,
+    }
+
+
+def _feed_state(request, queryset):
+    """(ETag, Last-Modified) ленты, считается один раз на запрос."""
+    if not hasattr(request, 'feed_state'):
+        generation = feed_cache.generation()
+        newest = queryset.order_by('-pub_date').values_list(
+            'pub_date', flat=True
+        ).first()
+        stamp = f'{generation}:{newest}:{request.GET.urlencode()}'
+        last_modified = datetime.fromtimestamp(
+            generation / 10 ** 9, tz=timezone.utc
+        )
+        if newest is not None:
+            last_modified = max(last_modified, newest)
+        request.feed_state = (
+            hashlib.md5(stamp.encode()).hexdigest(), last_modified
+        )
+    return request.feed_state
+
+
+def conditional(get_queryset):
+    """Отвечать 304, если лента не менялась с версии клиента."""
+    return condition(
+        etag_func=lambda request, **kwargs: _feed_state(
+            request, get_queryset(**kwargs)
+        )[0],
+        last_modified_func=lambda request, **kwargs: _feed_state(
+            request, get_queryset(**kwargs)
+        )[1],
+    )
+
+
+def feed_response(request, queryset):
+    paginator = CursorPaginator(queryset.for_feed(), PER_PAGE)
+    page = paginator.get_page_from_query(request.GET)
+    return JsonResponse({
+        'results': [serialize_post(post) for post in page],
+        'next': page.next_cursor,
+        'previous': page.previous_cursor,
+    }, json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')})
+
+
+@require_GET
+@conditional(lambda: Post.objects.all())
+def index(request):
+    """Главная лента."""
+    return feed_response(request, Post.objects.all())
+
+
+@require_GET
+@conditional(lambda slug: Post.objects.filter(group__slug=slug))
+def group_posts(request, slug):
+    """Лента группы."""
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(request, group.posts.all())
+
+
+@require_GET
+@conditional(lambda username: Post.objects.filter(author__username=username))
+def profile(request, username):
+    """Лента автора."""
+    author = get_object_or_404(User, username=username)
+    return feed_response(request, author.posts.all())
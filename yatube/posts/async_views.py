@@ -0,0 +1,131 @@
+"""Асинхронные варианты страниц с лентами для ASGI (``core.asgi``).
+
+Независимые запросы страницы выполняются одновременно в пуле потоков
+БД: на профиле — автор, счётчики, проверка подписки и страница постов,
+на странице поста — пост, страница комментариев и счётчики автора.
+``request.user`` ленивый и читает сессию и БД, поэтому его тоже
+разрешают только в пуле, а не в цикле событий.
+"""
+import asyncio
+import functools
+
+from django.http import Http404
+from django.shortcuts import render
+from django.template.loader import render_to_string
+from django.utils.functional import SimpleLazyObject
+
+from core.asgi import run_in_db
+
+from . import comment_queue, follow_graph
+from .feed_cache import cached_feed
+from .forms import CommentForm
+from .models import Comment, Group, Post, User, UserCounter
+from .paginators import COMMENTS_PER_PAGE, CommentPaginator, CursorPaginator
+from .timeline import feed_page
+
+
+def _user_id(request):
+    return request.user.pk
+
+
+def _page(queryset, query):
+    paginator = CursorPaginator(queryset.for_feed(), 10)
+    return paginator.get_page_from_query(query)
+
+
+async def index(request):
+    """Главная страница: кешированная лента собирается в пуле потоков."""
+    context = {
+        'index': True,
+        'page_obj': SimpleLazyObject(
+            lambda: _page(Post.objects.all(), request.GET)
+        ),
+    }
+
+    def render_feed():
+        return render_to_string('includes/feed.html', context, request)
+
+    context['feed'] = await run_in_db(
+        cached_feed, request, 'index', render_feed
+    )
+    return await run_in_db(render, request, 'posts/index.html', context)
+
+
+async def group_posts(request, slug):
+    """Страница группы."""
+    group, page_obj = await asyncio.gather(
+        run_in_db(Group.objects.filter(slug=slug).first),
+        run_in_db(_page, Post.objects.filter(group__slug=slug), request.GET),
+    )
+    if group is None:
+        raise Http404
+    context = {
+        'group': group,
+        'page_obj': page_obj,
+    }
+    return await run_in_db(render, request, 'posts/group_list.html', context)
+
+
+async def profile(request, username):
+    """Страница пользователя."""
+    author, counters, page_obj, user_id = await asyncio.gather(
+        run_in_db(User.objects.filter(username=username).first),
+        run_in_db(UserCounter.objects.filter(user__username=username).first),
+        run_in_db(
+            _page, Post.objects.filter(author__username=username), request.GET
+        ),
+        run_in_db(_user_id, request),
+    )
+    if author is None:
+        raise Http404
+    counters = counters or UserCounter(user_id=author.pk)
+    following, followers = await asyncio.gather(
+        run_in_db(follow_graph.is_following, user_id, author.pk),
+        run_in_db(
+            follow_graph.follower_count, author.pk, counters.followers
+        ),
+    )
+    context = {
+        'author': author,
+        'counters': counters,
+        'followers': followers,
+        'page_obj': page_obj,
+        'following': following,
+    }
+    return await run_in_db(render, request, 'posts/profile.html', context)
+
+
+async def post_detail(request, post_id):
+    """Страница поста."""
+    post, comments, counters = await asyncio.gather(
+        run_in_db(Post.objects.for_feed().filter(pk=post_id).first),
+        run_in_db(
+            comment_queue.with_pending, post_id, request.user,
+            functools.partial(
+                CommentPaginator(
+                    Comment.objects.for_post(post_id), COMMENTS_PER_PAGE
+                ).get_page_from_query,
+                request.GET
+            )
+        ),
+        run_in_db(UserCounter.objects.filter(user__posts=post_id).first),
+    )
+    if post is None:
+        raise Http404
+    context = {
+        'post': post,
+        'author_counters': counters or UserCounter(user_id=post.author_id),
+        'comments': comments,
+        'form': CommentForm(),
+    }
+    return await run_in_db(render, request, 'posts/post_detail.html', context)
+
+
+async def follow_index(request):
+    """Страница постов авторов из подписок."""
+    page_obj = await run_in_db(feed_page, request.user, request.GET, 10)
+    context = {
+        'page_obj': page_obj,
+        'follow': True,
+    }
+    return await run_in_db(render, request, 'posts/follow.html', context)
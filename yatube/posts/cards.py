@@ -0,0 +1,108 @@
+"""Кеш отрендеренных карточек постов (``includes/post.html``).
+
+Ключ карточки состоит из id поста и версий поста, его группы и автора.
+Версия — метка времени, которую сигналы обновляют при изменении записи,
+поэтому устаревшая карточка просто перестаёт запрашиваться. Лента
+достаёт все версии и все карточки двумя групповыми запросами к кешу.
+Карточку, прочитанную с реплики вскоре после изменения, не кешируют:
+реплика могла ещё не получить это изменение. Без общего кеша версии
+видны только своему процессу, поэтому карточки живут
+``POST_CARD_TIMEOUT`` секунд. Попадания и промахи идут в счётчики
+``core.metrics`` и видны на ``/metrics/``.
+"""
+import time
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.cache import namespace
+from core.db import routers
+from core.metrics import REGISTRY
+
+cache = namespace('posts')
+
+CARD_TEMPLATE = 'includes/post.html'
+
+
+def _version_key(kind, pk):
+    return f'card_version:{kind}:{pk}'
+
+
+def bump(kind, pk):
+    """Сделать устаревшими карточки, зависящие от записи kind/pk."""
+    cache.set(_version_key(kind, pk), time.time_ns(), None)
+
+
+def bump_many(kind, pks):
+    """То же для нескольких записей одним обращением к кешу."""
+    version = time.time_ns()
+    cache.set_many({_version_key(kind, pk): version for pk in pks}, None)
+
+
+def _versions(posts):
+    keys = set()
+    for post in posts:
+        keys.add(_version_key('post', post.pk))
+        keys.add(_version_key('user', post.author_id))
+        if post.group_id:
+            keys.add(_version_key('group', post.group_id))
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return versions
+
+
+def _newest_version(post, versions):
+    kinds = [('post', post.pk), ('user', post.author_id)]
+    if post.group_id:
+        kinds.append(('group', post.group_id))
+    return max(versions[_version_key(*kind)] for kind in kinds)
+
+
+def _card_key(post, versions):
+    group_version = '-'
+    if post.group_id:
+        group_version = versions[_version_key('group', post.group_id)]
+    return 'card:{}:{}:{}:{}'.format(
+        post.pk,
+        versions[_version_key('post', post.pk)],
+        versions[_version_key('user', post.author_id)],
+        group_version,
+    )
+
+
+def render_cards(posts):
+    """Вернуть HTML карточек постов, рендеря только отсутствующие в кеше."""
+    posts = list(posts)
+    versions = _versions(posts)
+    keys = [_card_key(post, versions) for post in posts]
+    cards = cache.get_many(keys)
+    rendered = {}
+    stale = set()
+    for post, key in zip(posts, keys):
+        if key not in cards:
+            rendered[key] = render_to_string(CARD_TEMPLATE, {'post': post})
+            if routers.may_be_stale(_newest_version(post, versions)):
+                stale.add(key)
+    cache.set_many({
+        key: html for key, html in rendered.items() if key not in stale
+    }, settings.POST_CARD_TIMEOUT)
+    cards.update(rendered)
+    REGISTRY.inc('card_cache_hits_total', len(posts) - len(rendered))
+    REGISTRY.inc('card_cache_misses_total', len(rendered))
+    return [mark_safe(cards[key]) for key in keys]
+
+
+def stats():
+    """Статистика попаданий в кеш карточек текущего процесса."""
+    hits = REGISTRY.value('card_cache_hits_total')
+    misses = REGISTRY.value('card_cache_misses_total')
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': hits / total if total else 0.0,
+    }
@@ -0,0 +1,327 @@
+"""Отложенная запись комментариев пачками (write-behind).
+
+При ``COMMENT_WRITE_BEHIND`` ``add_comment`` только проверяет форму,
+дописывает комментарий строкой NDJSON в спул-файл на локальном диске
+(с ``fsync``) и сразу отвечает. Фоновый поток раз в ``COMMENT_FLUSH_MS``
+миллисекунд откладывает накопленный файл в сторону и записывает его
+одной транзакцией, поэтому на горячем посте запросы не ждут друг друга
+на блокировке записи SQLite. Сигналы при пачке не отправляются:
+счётчики, карточки и поколение ленты обновляются один раз на пачку.
+
+У каждого процесса свой спул-файл ``active-<pid>.ndjson`` и свои пачки
+``batch-<pid>-*.ndjson``. Файл удаляется только после фиксации
+транзакции, а строки, которые уже есть в базе (тот же пост, автор и
+время), пропускаются. Поэтому после сбоя незаписанные файлы можно
+безопасно дописать ещё раз: новый процесс забирает себе файлы
+завершившихся процессов. Пачка, которая не записалась
+``MAX_ATTEMPTS`` раз подряд, откладывается в ``failed-*.ndjson`` и
+больше не задерживает остальные. Пока комментарий в очереди, автор видит
+его на последней странице комментариев: очередь хранит копию в кеше.
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.cache import namespace
+
+from . import cards, counters, feed_cache
+from .models import Comment, Post, User
+
+logger = logging.getLogger(__name__)
+
+cache = namespace('posts')
+
+ACTIVE = 'active-{}.ndjson'
+BATCH = 'batch-{}-{}.ndjson'
+FAILED = 'failed-{}.ndjson'
+MAX_ATTEMPTS = 3
+OVERLAY_TIMEOUT = 60
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def enabled():
+    return settings.COMMENT_WRITE_BEHIND
+
+
+def _overlay_key(post_id, author_id):
+    return f'comments:pending:{post_id}:{author_id}'
+
+
+def _comment(entry):
+    return Comment(
+        post_id=entry['post'],
+        author_id=entry['author'],
+        text=entry['text'],
+        created=parse_datetime(entry['created']),
+    )
+
+
+def _owner(name):
+    """pid процесса, которому принадлежит файл спула, или None."""
+    prefix, _, rest = name.partition('-')
+    if prefix not in ('active', 'batch'):
+        return None
+    pid = rest.split('-')[0].split('.')[0]
+    return int(pid) if pid.isdigit() else None
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as file:
+        # Последняя строка могла оборваться при сбое: она не подтверждена.
+        return [
+            json.loads(line) for line in file if line.endswith('\n')
+        ]
+
+
+def write(entries):
+    """Записать комментарии одной транзакцией, вернуть число новых."""
+    comments = [_comment(entry) for entry in entries]
+    if not comments:
+        return 0
+    post_ids = {comment.post_id for comment in comments}
+    with transaction.atomic():
+        # Пост или автор мог быть удалён, пока комментарий ждал в очереди.
+        alive = set(
+            Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True)
+        )
+        authors = set(User.objects.filter(
+            pk__in={comment.author_id for comment in comments}
+        ).values_list('pk', flat=True))
+        written = set(Comment.objects.filter(
+            post_id__in=post_ids,
+            created__gte=min(comment.created for comment in comments),
+        ).values_list('post_id', 'author_id', 'created'))
+        new = [
+            comment for comment in comments
+            if comment.post_id in alive
+            and comment.author_id in authors and (
+                comment.post_id, comment.author_id, comment.created
+            ) not in written
+        ]
+        Comment.objects.insert_many(new)
+        changed = Counter(comment.post_id for comment in new)
+        for post_id, count in changed.items():
+            counters.change_comments(post_id, count)
+    for post_id in changed:
+        cards.bump('post', post_id)
+    if changed:
+        feed_cache.bump()
+    return len(new)
+
+
+class CommentQueue:
+    """Спул-файл комментариев и поток, который сбрасывает его в базу."""
+
+    def __init__(self, directory, interval):
+        self.directory = directory
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.pid = os.getpid()
+        self.attempts = Counter()
+        self.path = os.path.join(directory, ACTIVE.format(self.pid))
+        # Остаток спула прошлого процесса уходит в базу первым сбросом.
+        self.pending = os.path.exists(self.path) and bool(
+            os.path.getsize(self.path)
+        )
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.adopt()
+
+    def put(self, entry):
+        """Надёжно дописать комментарий в спул."""
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = True
+        if self.thread is None:
+            self.start()
+
+    def _batch_path(self):
+        return os.path.join(
+            self.directory, BATCH.format(self.pid, time.time_ns())
+        )
+
+    def adopt(self):
+        """Забрать спул и пачки процессов, которых больше нет."""
+        for name in sorted(os.listdir(self.directory)):
+            pid = _owner(name)
+            if pid is None or pid == self.pid or _alive(pid):
+                continue
+            try:
+                # Забрать файл может только один процесс: у остальных
+                # его уже не будет на месте.
+                os.replace(
+                    os.path.join(self.directory, name), self._batch_path()
+                )
+            except FileNotFoundError:
+                continue
+
+    def _rotate(self):
+        with self.lock:
+            if not self.pending:
+                return
+            self.file.close()
+            os.replace(self.path, self._batch_path())
+            self.file = open(self.path, 'a', encoding='utf-8')
+            self.pending = False
+
+    def batches(self):
+        prefix = f'batch-{self.pid}-'
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.startswith(prefix)
+        )
+
+    def quarantined(self):
+        return sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.startswith('failed-')
+        )
+
+    def _quarantine(self, path):
+        name = os.path.basename(path)
+        os.replace(path, os.path.join(
+            self.directory, FAILED.format(name[len('batch-'):-7])
+        ))
+        del self.attempts[path]
+        logger.error('Пачка комментариев %s отложена после %d попыток',
+                     name, MAX_ATTEMPTS)
+
+    def flush(self):
+        """Записать в базу всё из спула, вернуть число новых комментариев.
+
+        Пачка с ошибкой не мешает следующим: она повторяется при
+        следующих сбросах, а после ``MAX_ATTEMPTS`` неудач откладывается.
+        """
+        with self.flush_lock:
+            self._rotate()
+            written = 0
+            for path in self.batches():
+                try:
+                    written += write(_read(path))
+                except Exception:
+                    self.attempts[path] += 1
+                    logger.exception(
+                        'Не удалось записать пачку комментариев %s', path)
+                    if self.attempts[path] >= MAX_ATTEMPTS:
+                        self._quarantine(path)
+                    continue
+                os.remove(path)
+                self.attempts.pop(path, None)
+            return written
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                # Файлы остались на диске, следующий сброс повторит их.
+                logger.exception('Сброс очереди комментариев не удался')
+
+    def start(self):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(
+                target=self.run, name='comment-queue', daemon=True
+            )
+            self.thread.start()
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.file.close()
+
+
+def get_queue():
+    global _queue
+    directory = settings.COMMENT_SPOOL_DIR
+    with _queue_lock:
+        if (
+            _queue is None
+            or _queue.directory != directory
+            or _queue.pid != os.getpid()
+        ):
+            if _queue is not None:
+                _queue.close()
+            _queue = CommentQueue(
+                directory, settings.COMMENT_FLUSH_MS / 1000
+            )
+        return _queue
+
+
+@atexit.register
+def _shutdown():
+    if _queue is not None and not _queue.stopped.is_set():
+        _queue.close()
+        try:
+            _queue.flush()
+        except DatabaseError:
+            pass
+
+
+def put(comment):
+    """Поставить комментарий в очередь вместо INSERT."""
+    comment.created = timezone.now()
+    entry = {
+        'post': comment.post_id,
+        'author': comment.author_id,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+    get_queue().put(entry)
+    key = _overlay_key(comment.post_id, comment.author_id)
+    cache.set(key, cache.get(key, []) + [entry], OVERLAY_TIMEOUT)
+
+
+def with_pending(post_id, user, get_page):
+    """Страница комментариев с ещё не записанными комментариями автора.
+
+    Очередь читается до базы: комментарий, записанный между двумя
+    чтениями, найдётся в базе и не повторится.
+    """
+    entries = []
+    if enabled() and user.is_authenticated:
+        entries = cache.get(_overlay_key(post_id, user.pk), [])
+    page = get_page()
+    if not entries or page.next_cursor:
+        return page
+    shown = {(comment.author_id, comment.created) for comment in page}
+    pending = []
+    for entry in entries:
+        comment = _comment(entry)
+        if (comment.author_id, comment.created) not in shown:
+            comment.author = user
+            pending.append(comment)
+    page.object_list = list(page.object_list) + pending
+    return page
@@ -0,0 +1,94 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарным ``UPDATE ... SET x = x + 1`` из сигналов,
+поэтому страницы профиля и поста не считают строки через COUNT.
+Расхождения исправляет команда ``manage.py reconcile_counters``.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment, Follow, Post, UserCounter
+
+User = get_user_model()
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def change_user(user_id, field, delta):
+    """Изменить счётчик пользователя на delta."""
+    counters = UserCounter.objects.filter(user_id=user_id)
+    if delta < 0:
+        counters = counters.filter(**{f'{field}__gte': -delta})
+    updated = counters.update(**{field: F(field) + delta})
+    if not updated and delta > 0:
+        recount_user(user_id)
+
+
+def change_comments(post_id, delta):
+    """Изменить счётчик комментариев поста на delta."""
+    Post.objects.filter(pk=post_id, comment_count__gte=-delta).update(
+        comment_count=F('comment_count') + delta
+    )
+
+
+def recount_user(user_id):
+    """Пересчитать счётчики пользователя по таблицам."""
+    UserCounter.objects.update_or_create(user_id=user_id, defaults={
+        'posts': Post.objects.filter(author_id=user_id).count(),
+        'followers': Follow.objects.filter(author_id=user_id).count(),
+        'following': Follow.objects.filter(user_id=user_id).count(),
+    })
+
+
+def reconcile():
+    """Сверить все счётчики с таблицами, вернуть число исправлений."""
+    return reconcile_users() + reconcile_posts()
+
+
+def reconcile_users(user_ids=None):
+    """Сверить счётчики пользователей (всех или user_ids)."""
+    fixed = 0
+    users = User.objects.all()
+    stored = UserCounter.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        stored = stored.filter(user_id__in=user_ids)
+    users = users.annotate(
+        posts_total=_count(Post, 'author'),
+        followers_total=_count(Follow, 'author'),
+        following_total=_count(Follow, 'user'),
+    ).values_list('pk', 'posts_total', 'followers_total', 'following_total')
+    stored = {
+        counters.user_id: (
+            counters.posts, counters.followers, counters.following
+        )
+        for counters in stored
+    }
+    for user_id, posts, followers, following in users.iterator():
+        if stored.get(user_id, (0, 0, 0)) != (posts, followers, following):
+            UserCounter.objects.update_or_create(user_id=user_id, defaults={
+                'posts': posts,
+                'followers': followers,
+                'following': following,
+            })
+            fixed += 1
+    return fixed
+
+
+def reconcile_posts():
+    """Сверить счётчики комментариев всех постов."""
+    fixed = 0
+    posts = Post.objects.annotate(
+        comments_total=_count(Comment, 'post')
+    ).exclude(comment_count=F('comments_total'))
+    for post_id, comments in posts.values_list('pk', 'comments_total'):
+        Post.objects.filter(pk=post_id).update(comment_count=comments)
+        fixed += 1
+    return fixed
@@ -0,0 +1,81 @@
+"""Кеш ленты главной страницы с версией («поколением») ленты.
+
+Любое изменение, видимое в ленте (пост, комментарий, группа, автор),
+меняет поколение, и закешированная лента сразу считается устаревшей.
+Устаревшую ленту пересобирает только один обработчик (под блокировкой
+в кеше), остальные в это время отдают старую версию, поэтому истечение
+кеша не создаёт всплеска запросов к БД.
+Анонимы и вошедшие пользователи получают разные записи кеша; в ключ
+входят только параметры страницы, прочие параметры запроса не создают
+новых записей.
+Без общего кеша поколение видно только своему процессу и живёт
+``FEED_GENERATION_TIMEOUT`` секунд: изменение из другого процесса
+меняет поколение (и ETag API) не позже чем через этот срок.
+"""
+import time
+
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+from core.cache import namespace
+from core.db import routers
+
+from .paginators import CursorPaginator
+
+cache = namespace('posts')
+
+GENERATION_KEY = 'feed:generation'
+FEED_TIMEOUT = 60
+STALE_TIMEOUT = 10 * 60
+LOCK_TIMEOUT = 10
+
+
+def bump():
+    """Сделать устаревшими все закешированные ленты."""
+    cache.set(
+        GENERATION_KEY, time.time_ns(), settings.FEED_GENERATION_TIMEOUT
+    )
+
+
+def generation():
+    current = cache.get(GENERATION_KEY)
+    if current is None:
+        current = time.time_ns()
+        cache.add(GENERATION_KEY, current, settings.FEED_GENERATION_TIMEOUT)
+        current = cache.get(GENERATION_KEY, current)
+    return current
+
+
+def _feed_key(request, name):
+    variant = 'auth' if request.user.is_authenticated else 'anon'
+    page = CursorPaginator.query_key(request.GET)
+    return f'feed:{name}:{variant}:{page}'
+
+
+def cached_feed(request, name, render):
+    """Вернуть HTML ленты из кеша или построить его вызовом render()."""
+    key = _feed_key(request, name)
+    current = generation()
+    entry = cache.get(key)
+    if entry is not None:
+        fresh = (
+            entry['generation'] == current
+            and entry['expires'] > time.time()
+        )
+        if fresh or not cache.add(f'{key}:lock', 1, LOCK_TIMEOUT):
+            return mark_safe(entry['html'])
+    expires = time.time() + FEED_TIMEOUT
+    if routers.may_be_stale(current):
+        # Лента с реплики может отставать: пересобрать, когда та догонит.
+        expires = current / 10 ** 9 + settings.DATABASE_REPLICA_STICKY_SECONDS
+    try:
+        html = render()
+        cache.set(key, {
+            'html': html,
+            'generation': current,
+            'expires': expires,
+        }, STALE_TIMEOUT)
+    finally:
+        if entry is not None:
+            cache.delete(f'{key}:lock')
+    return mark_safe(html)
@@ -0,0 +1,265 @@
+"""Граф подписок в памяти: на кого подписан каждый пользователь.
+
+Подписки пользователя хранятся отсортированным массивом ``array('I')``
+(4 байта на автора), проверка подписки — двоичный поиск. Массив лежит
+в общем кеше упакованными байтами под ключом с меткой версии, как
+карточки в ``cards``, а в процессе — в LRU, ограниченном
+``FOLLOW_GRAPH_LOCAL_BYTES``. Чтение проверяет только маленький ключ
+метки; массив скачивается и распаковывается, лишь когда метка сменилась.
+Подписки грузятся лениво одним запросом к основной базе и
+перечитываются после фиксации каждой подписки или отписки. Сброс виден
+другим процессам только через общий кеш (SQLite, Redis); с локальным
+``locmem`` ``FOLLOW_GRAPH_TIMEOUT`` короткий и ограничивает, сколько
+процесс может показывать чужое устаревшее состояние.
+
+Здесь же лежат число подписчиков автора (счётчик в кеше) и
+отсортированный массив популярных авторов, чьи посты не раскладываются
+по лентам (см. ``timeline``): лента подписок берёт их пересечение с
+подписками пользователя без запроса к базе.
+"""
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+
+from core.cache import namespace
+from core.db.routers import PRIMARY
+
+from . import timeline
+from .models import Follow, UserCounter
+
+cache = namespace('posts')
+
+TYPECODE = 'I'
+GENERATION_KEY = 'follow_graph:generation'
+# Ключ словаря, кортеж метки и запись OrderedDict сверх самого массива.
+ENTRY_OVERHEAD = 200
+
+_local = OrderedDict()
+_local_bytes = 0
+_lock = threading.Lock()
+
+
+def _stamp_key(user_id):
+    return f'follow_graph:stamp:{user_id}'
+
+
+def _data_key(user_id, stamp):
+    return 'follow_graph:{}:{}:{}'.format(user_id, *stamp)
+
+
+def _followers_key(author_id, generation):
+    return f'follow_graph:followers:{generation}:{author_id}'
+
+
+def _popular_key(generation, limit):
+    return f'follow_graph:popular:{generation}:{limit}'
+
+
+def _timeout():
+    return settings.FOLLOW_GRAPH_TIMEOUT
+
+
+def pack(ids):
+    return array(TYPECODE, sorted(ids))
+
+
+def unpack(data):
+    ids = array(TYPECODE)
+    ids.frombytes(data)
+    return ids
+
+
+def contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def entry_size(ids):
+    return sys.getsizeof(ids) + ENTRY_OVERHEAD
+
+
+def _generation():
+    current = cache.get(GENERATION_KEY)
+    if current is None:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        current = cache.get(GENERATION_KEY)
+    return current
+
+
+def _remember(user_id, stamp, ids):
+    global _local_bytes
+    with _lock:
+        previous = _local.pop(user_id, None)
+        if previous is not None:
+            _local_bytes -= entry_size(previous[1])
+        _local[user_id] = (stamp, ids)
+        _local_bytes += entry_size(ids)
+        while _local_bytes > settings.FOLLOW_GRAPH_LOCAL_BYTES and _local:
+            _, (_, evicted) = _local.popitem(last=False)
+            _local_bytes -= entry_size(evicted)
+
+
+def _forget(user_id):
+    global _local_bytes
+    with _lock:
+        entry = _local.pop(user_id, None)
+        if entry is not None:
+            _local_bytes -= entry_size(entry[1])
+
+
+def _recall(user_id, stamp):
+    with _lock:
+        entry = _local.get(user_id)
+        if entry is None or entry[0] != stamp:
+            return None
+        _local.move_to_end(user_id)
+        return entry[1]
+
+
+def _load(user_id, overwrite=False):
+    """Прочитать подписки с основной базы и положить в оба кеша."""
+    generation = _generation()
+    ids = pack(
+        Follow.objects.using(PRIMARY).filter(user_id=user_id).values_list(
+            'author_id', flat=True
+        )
+    )
+    stamp = (generation, time.time_ns())
+    cache.set(_data_key(user_id, stamp), ids.tobytes(), _timeout())
+    # Ленивая загрузка не перетирает метку, поставленную после записи:
+    # её данные могли быть прочитаны раньше этой записи.
+    if overwrite:
+        cache.set(_stamp_key(user_id), stamp, _timeout())
+    elif not cache.add(_stamp_key(user_id), stamp, _timeout()):
+        return followees(user_id)
+    _remember(user_id, stamp, ids)
+    return ids
+
+
+def followees(user_id):
+    """Отсортированный массив id авторов, на которых подписан user_id."""
+    values = cache.get_many([GENERATION_KEY, _stamp_key(user_id)])
+    stamp = values.get(_stamp_key(user_id))
+    if stamp is None:
+        return _load(user_id)
+    if stamp[0] != values.get(GENERATION_KEY):
+        return _load(user_id, overwrite=True)
+    ids = _recall(user_id, stamp)
+    if ids is not None:
+        return ids
+    data = cache.get(_data_key(user_id, stamp))
+    if data is None:
+        return _load(user_id, overwrite=True)
+    ids = unpack(data)
+    _remember(user_id, stamp, ids)
+    return ids
+
+
+def is_following(user_id, author_id):
+    return user_id is not None and contains(followees(user_id), author_id)
+
+
+def follower_count(author_id, default=None):
+    """Число подписчиков автора из кеша, при промахе — из счётчиков.
+
+    default — уже прочитанное значение счётчика: при промахе оно
+    возвращается без запроса и не кешируется (могло прийти с реплики).
+    """
+    key = _followers_key(author_id, _generation())
+    count = cache.get(key)
+    if count is None and default is not None:
+        return default
+    if count is None:
+        count = UserCounter.objects.using(PRIMARY).filter(
+            user_id=author_id
+        ).values_list('followers', flat=True).first() or 0
+        cache.add(key, count, _timeout())
+    return count
+
+
+def popular_authors():
+    """Отсортированный массив авторов, чьи посты не раскладываются."""
+    limit = timeline.FANOUT_FOLLOWERS_LIMIT
+    key = _popular_key(_generation(), limit)
+    data = cache.get(key)
+    if data is not None:
+        return unpack(data)
+    ids = pack(
+        UserCounter.objects.using(PRIMARY).filter(
+            followers__gt=limit
+        ).values_list('user_id', flat=True)
+    )
+    cache.set(key, ids.tobytes(), _timeout())
+    return ids
+
+
+def popular_followees(user_id):
+    """Популярные авторы из подписок пользователя."""
+    popular = popular_authors()
+    if not popular:
+        return []
+    ids = followees(user_id)
+    return [author_id for author_id in popular if contains(ids, author_id)]
+
+
+def _invalidate(user_id, author_id, delta):
+    generation = _generation()
+    cache.delete_many([
+        _stamp_key(user_id), _followers_key(author_id, generation)
+    ])
+    _forget(user_id)
+    count = follower_count(author_id)
+    limit = timeline.FANOUT_FOLLOWERS_LIMIT
+    if (delta > 0 and count == limit + 1) or (delta < 0 and count == limit):
+        cache.delete(_popular_key(generation, limit))
+
+
+def _refresh(user_id, author_id, delta):
+    _invalidate(user_id, author_id, delta)
+    _load(user_id, overwrite=True)
+
+
+def changed(user_id, author_id, delta):
+    """Обновить граф после подписки (+1) или отписки (-1).
+
+    Граф сбрасывается сразу, чтобы транзакция видела свою запись, и
+    перечитывается после фиксации: другие запросы могли успеть положить
+    в кеш состояние до неё.
+    """
+    _invalidate(user_id, author_id, delta)
+    transaction.on_commit(lambda: _refresh(user_id, author_id, delta))
+
+
+def forget_user(user_id):
+    """Сбросить подписки и подписчиков нового пользователя.
+
+    id пользователя может повториться после отката транзакции.
+    """
+    cache.delete_many([
+        _stamp_key(user_id), _followers_key(user_id, _generation())
+    ])
+    _forget(user_id)
+
+
+def bump():
+    """Сбросить граф целиком, например после импорта подписок."""
+    cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def memory():
+    """Сколько занимает локальная часть графа: пользователей и байт."""
+    with _lock:
+        return {'users': len(_local), 'bytes': _local_bytes}
+
+
+def clear_local():
+    global _local_bytes
+    with _lock:
+        _local.clear()
+        _local_bytes = 0
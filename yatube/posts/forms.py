@@ -1,8 +1,12 @@
 from django import forms
+
+from core.idempotency import IdempotentFormMixin
+
 from .models import Post, Comment
+from .uploads import downscale
 
 
-class PostForm(forms.ModelForm):
+class PostForm(IdempotentFormMixin, forms.ModelForm):
     class Meta:
         model = Post
         fields = (
@@ -22,8 +26,21 @@ class PostForm(forms.ModelForm):
             ),
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if image and 'image' in self.files:
+            downscale(image)
+        return image
+
+    def clean(self):
+        error = getattr(self.files.get('image'), 'upload_error', None)
+        if error:
+            self.errors.pop('image', None)
+            self.add_error('image', error)
+        return super().clean()
+
 
-class CommentForm(forms.ModelForm):
+class CommentForm(IdempotentFormMixin, forms.ModelForm):
     class Meta:
         model = Comment
         fields = (
@@ -0,0 +1,30 @@
+import sys
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии или подписки в NDJSON/CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(bulk.MODELS))
+        parser.add_argument(
+            'path', nargs='?', default='-', help='Файл или «-» для stdout.')
+        parser.add_argument('--format', choices=bulk.FORMATS)
+
+    def handle(self, *args, kind, path, **options):
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson')
+        started = time.monotonic()
+        with ExitStack() as stack:
+            file = sys.stdout if path == '-' else stack.enter_context(
+                open(path, 'w', encoding='utf-8', newline=''))
+            total = bulk.export(kind, file, file_format)
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Выгружено строк: {total} за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-9):.0f} строк/с)')
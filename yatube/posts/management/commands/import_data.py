@@ -0,0 +1,53 @@
+import os
+import sys
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = 'Загружает группы, посты, комментарии или подписки из NDJSON/CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(bulk.MODELS))
+        parser.add_argument('path', help='Файл или «-» для stdin.')
+        parser.add_argument('--format', choices=bulk.FORMATS)
+        parser.add_argument(
+            '--batch-size', type=int, default=bulk.BATCH_SIZE)
+        parser.add_argument(
+            '--defer-indexes', action='store_true',
+            help='Построить индексы после загрузки, а не во время.')
+
+    def progress(self, total, elapsed):
+        if total % (self.batch_size * 10) == 0:
+            self.stderr.write(
+                f'{total} строк, {total / max(elapsed, 1e-9):.0f} строк/с')
+
+    def handle(self, *args, kind, path, batch_size, defer_indexes, **options):
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson')
+        self.batch_size = batch_size
+        with ExitStack() as stack:
+            if path == '-':
+                file = sys.stdin
+            elif os.path.exists(path):
+                file = stack.enter_context(
+                    open(path, encoding='utf-8', newline=''))
+            else:
+                raise CommandError(f'Файл {path} не найден')
+            if defer_indexes:
+                stack.enter_context(bulk.deferred_indexes(bulk.MODELS[kind]))
+            stopwatch = time.monotonic()
+            try:
+                total = bulk.import_rows(
+                    kind, bulk.read_rows(file, file_format),
+                    batch_size, self.progress)
+            except (KeyError, ValueError) as error:
+                raise CommandError(f'Ошибка в данных: {error}')
+        elapsed = time.monotonic() - stopwatch
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено строк: {total} за {elapsed:.1f} с '
+            f'({total / max(elapsed, 1e-9):.0f} строк/с)'))
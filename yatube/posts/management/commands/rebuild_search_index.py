@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Заново индексирует все посты для полнотекстового поиска.'
+
+    def handle(self, *args, **options):
+        rebuild()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс пересобран'))
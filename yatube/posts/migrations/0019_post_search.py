@@ -0,0 +1,31 @@
+from django.db import migrations
+
+# Имя таблицы задано здесь, а не взято из posts.search: миграция не
+# должна меняться вместе с кодом приложения. Таблица создаётся пустой,
+# существующие посты индексирует ``manage.py rebuild_search_index``.
+FTS_TABLE = 'posts_post_search'
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} '
+        f'USING fts5(stems, tokenize="unicode61")'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
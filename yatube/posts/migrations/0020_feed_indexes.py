@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:09
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    UserCounter = apps.get_model('posts', 'UserCounter')
+    duplicates = Follow.objects.values('user', 'author').annotate(
+        first=Min('id'), total=Count('id')
+    ).filter(total__gt=1)
+    for row in duplicates.iterator():
+        Follow.objects.filter(
+            user=row['user'], author=row['author']
+        ).exclude(pk=row['first']).delete()
+        extra = row['total'] - 1
+        UserCounter.objects.filter(user=row['author']).update(
+            followers=F('followers') - extra
+        )
+        UserCounter.objects.filter(user=row['user']).update(
+            following=F('following') - extra
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_search'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ['created']},
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_pub_date_idx'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
@@ -1,5 +1,10 @@
+import json
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models, router
+from django.db.models.signals import post_delete, post_save
+
+from core.reverse import reverse
 
 User = get_user_model()
 
@@ -23,6 +28,20 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+
+    FEED_FIELDS = (
+        'text', 'pub_date', 'image', 'thumbnails', 'comment_count',
+        'author_id',
+        'group_id', 'author__username', 'author__first_name',
+        'author__last_name', 'group__slug', 'group__title',
+    )
+
+    def for_feed(self):
+        """Посты вместе с автором и группой, только нужные ленте поля."""
+        return self.select_related('author', 'group').only(*self.FEED_FIELDS)
+
+
 class Post(models.Model):
 
     text = models.TextField(
@@ -54,15 +73,87 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    thumbnails = models.TextField(
+        'Миниатюры',
+        blank=True,
+        default='',
+        editable=False
+    )
+    comment_count = models.PositiveIntegerField(
+        'Число комментариев',
+        default=0,
+        editable=False
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    def get_absolute_url(self):
+        return reverse('posts:post_detail', (self.pk,))
+
+    @property
+    def thumbnail_urls(self):
+        """Адреса готовых миниатюр: {размер: {формат: адрес}}."""
+        return json.loads(self.thumbnails) if self.thumbnails else {}
+
+
+class CommentQuerySet(models.QuerySet):
+
+    def for_post(self, post_id):
+        """Комментарии поста с автором, только нужные странице поля."""
+        return self.filter(post_id=post_id).select_related('author').only(
+            'text', 'created', 'post_id', 'author_id', 'author__username'
+        )
+
+    def insert_many(self, comments):
+        """Вставить комментарии одним executemany.
+
+        В отличие от ``bulk_create`` сохраняет заданное время ``created``
+        вместо ``auto_now_add`` и не отправляет сигналов.
+        """
+        if not comments:
+            return
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+        fields = [
+            self.model._meta.get_field(name)
+            for name in ('text', 'post', 'author', 'created')
+        ]
+        columns = ', '.join(
+            connection.ops.quote_name(field.column) for field in fields
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {self.model._meta.db_table} ({columns}) '
+                f'VALUES ({", ".join(["%s"] * len(fields))})',
+                [
+                    [
+                        field.get_db_prep_save(
+                            getattr(comment, field.attname), connection
+                        )
+                        for field in fields
+                    ]
+                    for comment in comments
+                ]
+            )
+
 
 class Comment(models.Model):
 
@@ -87,10 +178,64 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['created']
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+        ]
+
     def __str__(self):
         return self.text[:15]
 
 
+class FollowQuerySet(models.QuerySet):
+
+    def _returning(self, sql, params):
+        db = router.db_for_write(self.model)
+        with connections[db].cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        return db, row and row[0]
+
+    def follow(self, user_id, author_id):
+        """Подписаться одним запросом; True, если подписки ещё не было."""
+        db, pk = self._returning(
+            f'INSERT INTO {self.model._meta.db_table} (user_id, author_id) '
+            f'VALUES (%s, %s) ON CONFLICT (user_id, author_id) DO NOTHING '
+            f'RETURNING id',
+            [user_id, author_id]
+        )
+        if pk is None:
+            return False
+        post_save.send(
+            sender=self.model,
+            instance=self.model(pk=pk, user_id=user_id, author_id=author_id),
+            created=True, update_fields=None, raw=False, using=db
+        )
+        return True
+
+    def unfollow(self, user_id, author_id):
+        """Отписаться одним запросом; True, если подписка была."""
+        db, pk = self._returning(
+            f'DELETE FROM {self.model._meta.db_table} '
+            f'WHERE user_id = %s AND author_id = %s RETURNING id',
+            [user_id, author_id]
+        )
+        if pk is None:
+            return False
+        post_delete.send(
+            sender=self.model,
+            instance=self.model(pk=pk, user_id=user_id, author_id=author_id),
+            using=db
+        )
+        return True
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -104,3 +249,74 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Автор'
     )
+
+    objects = FollowQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow'
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        ordering = ['-pub_date']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_post_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class UserCounter(models.Model):
+    """Денормализованные счётчики пользователя."""
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='counters',
+        verbose_name='Пользователь'
+    )
+    posts = models.PositiveIntegerField('Постов', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return str(self.user_id)
+
+    @classmethod
+    def for_user(cls, user_id):
+        """Счётчики пользователя или нулевые, если их ещё нет."""
+        counters = cls.objects.filter(user_id=user_id).first()
+        return counters or cls(user_id=user_id)
@@ -0,0 +1,231 @@
+import base64
+import binascii
+import heapq
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+COMMENTS_PER_PAGE = 20
+# Больший номер страницы не даст строк, а OFFSET вышел бы за 64 бита.
+MAX_PAGE = 10 ** 6
+MAX_PK = 2 ** 63 - 1
+
+
+class CursorPaginator(Paginator):
+    """Постраничный вывод по ключу (pub_date, id) без OFFSET и COUNT.
+
+    Ссылки на соседние страницы передаются непрозрачными токенами
+    ``?after=`` и ``?before=``, поэтому любая страница ленты стоит
+    столько же, сколько первая. Ссылки вида ``?page=N`` читаются через
+    OFFSET. В обоих случаях выбирается ``per_page + 1`` строк: лишняя
+    строка говорит, есть ли следующая страница, а общее число страниц
+    не считается. Шаблону отдаётся только окно номеров вокруг текущей
+    страницы (``page.page_window``).
+    """
+
+    date_field = 'pub_date'
+    key_field = 'pk'
+    ordering = ('-pub_date', '-pk')
+    window = 2
+
+    def __init__(self, object_list, per_page, **kwargs):
+        super().__init__(
+            object_list.order_by(*self.ordering), per_page, **kwargs
+        )
+        self.known_pages = 1
+
+    def cursor_key(self, obj):
+        return getattr(obj, self.date_field), obj.pk
+
+    def encode_cursor(self, obj, number):
+        date, pk = self.cursor_key(obj)
+        raw = f'{date.isoformat()}|{pk}|{number}'
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(token):
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(
+                token + '=' * (-len(token) % 4)
+            ).decode()
+            pub_date, pk, number = raw.split('|')
+            pub_date, pk, number = (
+                datetime.fromisoformat(pub_date), int(pk), int(number)
+            )
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        # Токен приходит от клиента: ключ вне INTEGER SQLite не ищется.
+        if not (0 < pk <= MAX_PK and 0 < number <= MAX_PAGE):
+            return None
+        return pub_date, pk, number
+
+    @classmethod
+    def query_key(cls, query):
+        """Параметры страницы из запроса в том виде, как их читает пагинатор.
+
+        Остальные параметры и неверные курсоры на страницу не влияют,
+        поэтому не попадают в ключ кеша.
+        """
+        cursor = cls.decode_cursor(query.get('after'))
+        if cursor is not None:
+            return 'after:{}:{}:{}'.format(*cursor)
+        cursor = cls.decode_cursor(query.get('before'))
+        if cursor is not None:
+            return 'before:{}:{}:{}'.format(*cursor)
+        return f'page:{cls.page_number(query.get("page"))}'
+
+    @cached_property
+    def num_pages(self):
+        return self.known_pages
+
+    @staticmethod
+    def page_number(value):
+        try:
+            return min(max(int(value), 1), MAX_PAGE)
+        except (TypeError, ValueError):
+            return 1
+
+    def _seek(self, date, pk, forward):
+        """Строки после ключа (forward) или до него в порядке вывода."""
+        descending = self.ordering[0].startswith('-')
+        lookup = 'lt' if descending == forward else 'gt'
+        return Q(**{f'{self.date_field}__{lookup}': date}) | Q(
+            **{self.date_field: date, f'{self.key_field}__{lookup}': pk}
+        )
+
+    def _reversed_ordering(self):
+        return [
+            field[1:] if field.startswith('-') else f'-{field}'
+            for field in self.ordering
+        ]
+
+    def _fetch(self, queryset, offset=0):
+        rows = list(queryset[offset:offset + self.per_page + 1])
+        return rows[:self.per_page], len(rows) > self.per_page
+
+    def get_page_from_query(self, query):
+        """Вернуть страницу по параметрам запроса after/before/page."""
+        after = self.decode_cursor(query.get('after'))
+        before = self.decode_cursor(query.get('before'))
+        if after is None and before is None:
+            number = self.page_number(query.get('page'))
+            rows, has_next = self._fetch(
+                self.object_list, (number - 1) * self.per_page
+            )
+            if not rows and number > 1:
+                number = 1
+                rows, has_next = self._fetch(self.object_list)
+            self.known_pages = number + 1 if has_next else number
+            return self._set_cursors(Page(rows, number, self), has_next)
+        queryset = self.object_list
+        number = 1
+        if after is not None:
+            date, pk, number = after
+            queryset = queryset.filter(self._seek(date, pk, forward=True))
+            number = max(number, 2)
+        elif before is not None:
+            date, pk, number = before
+            queryset = queryset.filter(
+                self._seek(date, pk, forward=False)
+            ).order_by(*self._reversed_ordering())
+        rows, has_more = self._fetch(queryset)
+        if before is not None:
+            rows.reverse()
+            number = max(number, 2) if has_more else 1
+            has_next = True
+        else:
+            has_next = has_more
+        self.known_pages = number + 1 if has_next else number
+        return self._set_cursors(Page(rows, number, self), has_next)
+
+    def _set_cursors(self, page, has_next):
+        rows = page.object_list
+        page.page_window = range(
+            max(page.number - self.window, 1), self.num_pages + 1
+        )
+        page.next_cursor = None
+        page.previous_cursor = None
+        if rows and has_next:
+            page.next_cursor = self.encode_cursor(rows[-1], page.number + 1)
+        if rows and page.number > 1:
+            page.previous_cursor = self.encode_cursor(
+                rows[0], page.number - 1
+            )
+        return page
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии поста по ключу (created, id), от старых к новым."""
+
+    date_field = 'created'
+    ordering = ('created', 'pk')
+
+
+class MergedKeys:
+    """Слияние querysets словарей с одинаковым порядком строк.
+
+    Каждый queryset читается своим индексом с тем же LIMIT, строки
+    сливаются в Python. Поддерживает то, что нужно ``CursorPaginator``:
+    ``filter``, ``order_by`` и срезы.
+    """
+
+    ordered = True
+
+    def __init__(self, querysets):
+        self.querysets = querysets
+
+    def filter(self, *args, **kwargs):
+        return MergedKeys([
+            queryset.filter(*args, **kwargs) for queryset in self.querysets
+        ])
+
+    def order_by(self, *fields):
+        return MergedKeys([
+            queryset.order_by(*fields) for queryset in self.querysets
+        ])
+
+    def __getitem__(self, index):
+        fields = self.querysets[0].query.order_by
+        key = itemgetter(*(field.lstrip('-') for field in fields))
+        rows = heapq.merge(
+            *(queryset[:index.stop] for queryset in self.querysets),
+            key=key, reverse=fields[0].startswith('-')
+        )
+        # Одна строка может прийти из нескольких querysets.
+        return [next(group) for _, group in groupby(rows, key)][index]
+
+
+class TimelinePaginator(CursorPaginator):
+    """Лента подписок по ключам записей ленты (pub_date, post_id).
+
+    Страница ключей читается диапазоном по индексу (user, -pub_date,
+    -post) таблицы ``TimelineEntry``, посты страницы загружаются одним
+    запросом ``in_bulk``. Курсоры строятся по ключу записи.
+    """
+
+    key_field = 'post_id'
+    ordering = ('-pub_date', '-post_id')
+
+    def __init__(self, keys, posts, per_page, **kwargs):
+        super().__init__(keys, per_page, **kwargs)
+        self.posts = posts
+
+    def cursor_key(self, obj):
+        return obj['pub_date'], obj['post_id']
+
+    def get_page_from_query(self, query):
+        page = super().get_page_from_query(query)
+        posts = self.posts.in_bulk(
+            [row['post_id'] for row in page.object_list]
+        )
+        page.object_list = [
+            posts[row['post_id']] for row in page.object_list
+            if row['post_id'] in posts
+        ]
+        return page
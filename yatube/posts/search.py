@@ -0,0 +1,405 @@
+"""Полнотекстовый поиск по постам на инвертированном индексе.
+
+На SQLite индекс — виртуальная таблица FTS5 ``posts_post_search``, в
+которой лежат основы слов поста, а ранжирование делает ``bm25``. На
+других СУБД (или без FTS5) используется инвертированный индекс в
+памяти процесса с тем же BM25. Основы слов выделяет ``stem`` — стеммер
+Портера (Snowball) для русского языка. Индекс обновляется сигналами при
+сохранении и удалении поста, а посты, написанные до его появления,
+индексирует ``manage.py rebuild_search_index``.
+"""
+import base64
+import binascii
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.core.paginator import Page, Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+
+FTS_TABLE = 'posts_post_search'
+REBUILD_BATCH_SIZE = 1000
+
+VOWELS = 'аеиоуыэюя'
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    (),
+    (
+        'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+        'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+        'ая', 'яя', 'ою', 'ею',
+    ),
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (
+    (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+    ),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+        'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+        'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    (),
+    (
+        'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+        'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+        'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+        'ья', 'я',
+    ),
+)
+WORD_RE = re.compile(r'\w+')
+
+
+def _remove_ending(word, endings):
+    """Отрезать самое длинное окончание; None, если его нет."""
+    after_vowel, plain = endings
+    for ending in sorted(after_vowel + plain, key=len, reverse=True):
+        if not word.endswith(ending):
+            continue
+        rest = word[:-len(ending)]
+        if ending in plain or rest.endswith(('а', 'я')):
+            return rest
+    return None
+
+
+def _region(word):
+    """Часть слова после первого сочетания «гласная + согласная»."""
+    for index in range(1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return word[index + 1:]
+    return ''
+
+
+def _strip_inflection(rv):
+    """Шаг 1: отрезать окончание деепричастия, прилагательного и т. п."""
+    result = _remove_ending(rv, PERFECTIVE_GERUND)
+    if result is not None:
+        return result
+    rv = _remove_ending(rv, REFLEXIVE) or rv
+    result = _remove_ending(rv, ADJECTIVE)
+    if result is not None:
+        participle = _remove_ending(result, PARTICIPLE)
+        return result if participle is None else participle
+    for endings in (VERB, NOUN):
+        result = _remove_ending(rv, endings)
+        if result is not None:
+            return result
+    return rv
+
+
+def _strip_superlative(rv):
+    """Шаг 4: убрать превосходную степень, двойную «н» и «ь»."""
+    if rv.endswith('нн'):
+        return rv[:-1]
+    for ending in ('ейше', 'ейш'):
+        if rv.endswith(ending):
+            rv = rv[:-len(ending)]
+            return rv[:-1] if rv.endswith('нн') else rv
+    return rv[:-1] if rv.endswith('ь') else rv
+
+
+def stem(word):
+    """Основа русского слова по алгоритму Snowball."""
+    word = word.lower().replace('ё', 'е')
+    for index, letter in enumerate(word):
+        if letter in VOWELS:
+            break
+    else:
+        return word
+    start = word[:index + 1]
+    rv = _strip_inflection(word[index + 1:])
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    r2 = _region(_region(start + rv))
+    for ending in ('ость', 'ост'):
+        if rv.endswith(ending) and len(r2) >= len(ending):
+            rv = rv[:-len(ending)]
+            break
+    return start + _strip_superlative(rv)
+
+
+def stems(text):
+    return [stem(word) for word in WORD_RE.findall(text.lower())]
+
+
+def stem_text(text):
+    return ' '.join(stems(text))
+
+
+class FTS5Backend:
+    """Индекс во виртуальной таблице FTS5 основной базы."""
+
+    def index(self, post_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, stems) VALUES (%s, %s)',
+                [post_id, stem_text(text)]
+            )
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id]
+            )
+
+    def index_many(self, posts):
+        posts = list(posts)
+        if not posts:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid IN '
+                f'({", ".join(["%s"] * len(posts))})',
+                [post_id for post_id, _ in posts]
+            )
+            self._insert_many(cursor, [
+                (post_id, stem_text(text)) for post_id, text in posts
+            ])
+
+    def rebuild(self, posts):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            batch = []
+            for post_id, text in posts:
+                batch.append((post_id, stem_text(text)))
+                if len(batch) >= REBUILD_BATCH_SIZE:
+                    self._insert_many(cursor, batch)
+                    batch = []
+            self._insert_many(cursor, batch)
+
+    @staticmethod
+    def _insert_many(cursor, rows):
+        if rows:
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, stems) VALUES (%s, %s)',
+                rows
+            )
+
+    def search(self, terms, after=None, limit=10):
+        match = ' '.join(
+            '"{}"'.format(term.replace('"', '')) for term in terms
+        )
+        sql = (
+            f'SELECT id, score FROM (SELECT rowid AS id, '
+            f'bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s)'
+        )
+        params = [match]
+        if after is not None:
+            sql += ' WHERE score > %s OR (score = %s AND id > %s)'
+            params += [after[0], after[0], after[1]]
+        sql += ' ORDER BY score, id LIMIT %s'
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params + [limit])
+            return cursor.fetchall()
+
+
+class MemoryBackend:
+    """Инвертированный индекс в памяти процесса (BM25)."""
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.lengths = {}
+        # Термы каждого поста: удаление не обходит весь словарь.
+        self.terms = {}
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def _load(self):
+        from .models import Post
+
+        with self.lock:
+            if self.loaded:
+                return
+            for post_id, text in Post.objects.values_list(
+                'pk', 'text'
+            ).iterator():
+                self._add(post_id, text)
+            self.loaded = True
+
+    def _add(self, post_id, text):
+        terms = stems(text)
+        self.lengths[post_id] = len(terms)
+        self.terms[post_id] = set(terms)
+        for term in terms:
+            self.postings[term][post_id] = (
+                self.postings[term].get(post_id, 0) + 1
+            )
+
+    def index(self, post_id, text):
+        if self.loaded:
+            self.remove(post_id)
+            self._add(post_id, text)
+
+    def index_many(self, posts):
+        for post_id, text in posts:
+            self.index(post_id, text)
+
+    def remove(self, post_id):
+        if not self.loaded or self.lengths.pop(post_id, None) is None:
+            return
+        for term in self.terms.pop(post_id):
+            self.postings[term].pop(post_id, None)
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def rebuild(self, posts):
+        with self.lock:
+            self.postings = defaultdict(dict)
+            self.lengths = {}
+            self.terms = {}
+            self.loaded = False
+
+    def search(self, terms, after=None, limit=10):
+        self._load()
+        postings = [self.postings.get(term, {}) for term in set(terms)]
+        if not postings or not all(postings):
+            return []
+        total = len(self.lengths)
+        average = sum(self.lengths.values()) / total
+        scores = {}
+        for post_id in set.intersection(*(set(p) for p in postings)):
+            score = 0.0
+            for documents in postings:
+                frequency = documents[post_id]
+                idf = math.log(
+                    1 + (total - len(documents) + 0.5) / (len(documents) + 0.5)
+                )
+                score -= idf * frequency * (self.k1 + 1) / (
+                    frequency + self.k1 * (
+                        1 - self.b + self.b * self.lengths[post_id] / average
+                    )
+                )
+            scores[post_id] = score
+        results = sorted(
+            ((post_id, score) for post_id, score in scores.items()),
+            key=lambda item: (item[1], item[0])
+        )
+        if after is not None:
+            results = [
+                (post_id, score) for post_id, score in results
+                if (score, post_id) > (after[0], after[1])
+            ]
+        return results[:limit]
+
+
+_backend = None
+
+
+def fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = FTS5Backend() if fts5_available() else MemoryBackend()
+    return _backend
+
+
+def index_post(post):
+    get_backend().index(post.pk, post.text)
+
+
+def remove_post(post_id):
+    get_backend().remove(post_id)
+
+
+def index_posts(post_ids):
+    """Проиндексировать посты post_ids, например после импорта."""
+    from .models import Post
+
+    get_backend().index_many(
+        Post.objects.filter(pk__in=post_ids).values_list('pk', 'text')
+    )
+
+
+def rebuild():
+    """Переиндексировать все посты, например после массового импорта."""
+    from .models import Post
+
+    get_backend().rebuild(
+        Post.objects.order_by().values_list('pk', 'text').iterator()
+    )
+
+
+def search_ids(query, limit=1000):
+    """id постов по запросу, лучшие совпадения первыми."""
+    terms = stems(query)
+    if not terms:
+        return []
+    return [
+        post_id for post_id, score in get_backend().search(terms, None, limit)
+    ]
+
+
+class SearchPaginator(Paginator):
+    """Постраничный вывод результатов поиска без подсчёта общего числа."""
+
+    def __init__(self, per_page, known_pages):
+        super().__init__([], per_page)
+        self.known_pages = known_pages
+
+    @cached_property
+    def num_pages(self):
+        return self.known_pages
+
+
+def encode_cursor(score, post_id, number):
+    raw = f'{score!r}|{post_id}|{number}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        score, post_id, number = raw.decode().split('|')
+        return float(score), int(post_id), int(number)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+
+
+def search_page(queryset, query, after=None, per_page=10):
+    """Страница результатов поиска, упорядоченная по релевантности."""
+    terms = stems(query)
+    cursor = decode_cursor(after)
+    number = max(cursor[2], 2) if cursor else 1
+    results = []
+    if terms:
+        results = get_backend().search(terms, cursor, per_page + 1)
+    has_next = len(results) > per_page
+    results = results[:per_page]
+    posts = queryset.in_bulk([post_id for post_id, score in results])
+    rows = [posts[post_id] for post_id, score in results if post_id in posts]
+    paginator = SearchPaginator(per_page, number + 1 if has_next else number)
+    page = Page(rows, number, paginator)
+    page.page_window = [number]
+    page.previous_cursor = None
+    page.next_cursor = None
+    if has_next:
+        post_id, score = results[-1]
+        page.next_cursor = encode_cursor(score, post_id, number + 1)
+    return page
@@ -0,0 +1,78 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cards, counters, feed_cache, follow_graph, search, timeline
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    cards.bump('post', instance.pk)
+    feed_cache.bump()
+    search.index_post(instance)
+    if created:
+        counters.change_user(instance.author_id, 'posts', 1)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    feed_cache.bump()
+    search.remove_post(instance.pk)
+    counters.change_user(instance.author_id, 'posts', -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments(instance.post_id, 1)
+        cards.bump('post', instance.post_id)
+        feed_cache.bump()
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+    cards.bump('post', instance.post_id)
+    feed_cache.bump()
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, 'followers', 1)
+        counters.change_user(instance.user_id, 'following', 1)
+        follow_graph.changed(instance.user_id, instance.author_id, 1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'followers', -1)
+    counters.change_user(instance.user_id, 'following', -1)
+    follow_graph.changed(instance.user_id, instance.author_id, -1)
+    timeline.unfollowed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    cards.bump('group', instance.pk)
+    feed_cache.bump()
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    feed_cache.bump()
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        follow_graph.forget_user(instance.pk)
+        return
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        cards.bump('user', instance.pk)
+        feed_cache.bump()
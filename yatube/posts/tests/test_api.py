@@ -0,0 +1,106 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group)
+        self.urls = (
+            reverse('posts:api_index'),
+            reverse('posts:api_group_posts', args=(self.group.slug,)),
+            reverse('posts:api_profile', args=(self.user.username,)),
+        )
+
+    def test_feed(self):
+        """Лента отдаёт только нужные поля поста."""
+        for adress in self.urls:
+            with self.subTest(adress=adress):
+                response = self.client.get(adress)
+                self.assertEqual(response.json(), {
+                    'results': [{
+                        'id': self.post.pk,
+                        'text': 'Тестовый пост',
+                        'pub_date': self.post.pub_date.isoformat(),
+                        'author': 'TestUser',
+                        'group': 'test-slug',
+                        'image': None,
+                        'comments': 0,
+                    }],
+                    'next': None,
+                    'previous': None,
+                })
+        response = self.client.get(
+            reverse('posts:api_group_posts', args=('nonexistent',)))
+        self.assertEqual(response.status_code, 404)
+
+    def test_not_modified(self):
+        """Повторный запрос получает 304 за один запрос к индексу."""
+        for adress in self.urls:
+            with self.subTest(adress=adress):
+                response = self.client.get(adress)
+                etag = response['ETag']
+                self.assertTrue(response.has_header('Last-Modified'))
+                with CaptureQueriesContext(connection) as context:
+                    response = self.client.get(
+                        adress, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertLessEqual(len(context.captured_queries), 1)
+                for query in context.captured_queries:
+                    with connection.cursor() as cursor:
+                        cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                        plan = [row[-1] for row in cursor.fetchall()]
+                    for step in plan:
+                        self.assertRegex(step, 'INDEX|PRIMARY KEY')
+
+    def test_etag_expires_without_shared_cache(self):
+        """Правка из другого процесса меняет ETag после срока поколения."""
+        adress = reverse('posts:api_index')
+        with override_settings(FEED_GENERATION_TIMEOUT=0.05):
+            cache.clear()
+            etag = self.client.get(adress)['ETag']
+            # update() не шлёт сигналов, как запись в другом процессе.
+            Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+            response = self.client.get(adress, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            time.sleep(0.1)
+            response = self.client.get(adress, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.json()['results'][0]['text'], 'Новый текст')
+
+    def test_changes_invalidate_etag(self):
+        """Новый комментарий или правка поста меняют ETag."""
+        adress = reverse('posts:api_index')
+        etag = self.client.get(adress)['ETag']
+        Comment.objects.create(post=self.post, author=self.user, text='К')
+        response = self.client.get(adress, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['comments'], 1)
+        etag = response['ETag']
+        self.post.text = 'Новый текст'
+        self.post.save()
+        response = self.client.get(adress, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,155 @@
+import asyncio
+import re
+import threading
+from unittest import mock
+
+from django.contrib import auth
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TransactionTestCase
+from django.urls import reverse
+
+from core.asgi import ASGIHandler, run_in_db
+from .. import async_views
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+TOKENS = re.compile(
+    r'name="(csrfmiddlewaretoken|idempotency_key)" value="[^"]*"'
+)
+
+
+def asgi_request(path, cookies=''):
+    """Выполнить GET через ASGIHandler, вернуть отправленные сообщения."""
+    messages = [{'type': 'http.request', 'body': b''}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'method': 'GET',
+        'path': path,
+        'query_string': query.encode(),
+        'headers': [(b'host', b'testserver'), (b'cookie', cookies.encode())],
+    }
+    asyncio.run(ASGIHandler()(scope, receive, send))
+    return sent
+
+
+def asgi_get(path, cookies=''):
+    """Выполнить GET через ASGIHandler, вернуть (статус, тело)."""
+    start, body = asgi_request(path, cookies)
+    return start['status'], body['body']
+
+
+class ASGITests(TransactionTestCase):
+    # Пул потоков БД не видит незавершённую транзакцию TestCase.
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='TestUser')
+        self.reader = User.objects.create_user(username='Reader')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
+            author=self.user, text='Тестовый пост', group=self.group)
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.user)
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.cookies = f'sessionid={self.client.cookies["sessionid"].value}'
+
+    def test_pages_match_wsgi(self):
+        """Асинхронные варианты отдают ту же страницу, что и WSGI."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.group.slug,)),
+            reverse('posts:profile', args=(self.user.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+            reverse('posts:follow_index'),
+            reverse('posts:group_list', args=('nonexistent',)),
+            reverse('posts:profile', args=('nonexistent',)),
+            reverse('posts:post_detail', args=(self.post.pk + 100,)),
+        )
+        for adress in urls:
+            with self.subTest(adress=adress):
+                cache.clear()
+                response = self.client.get(adress)
+                cache.clear()
+                status, body = asgi_get(adress, self.cookies)
+                self.assertEqual(status, response.status_code)
+                if status == 200:
+                    self.assertEqual(
+                        TOKENS.sub('', body.decode()),
+                        TOKENS.sub('', response.content.decode()),
+                    )
+
+    def test_concurrent_lookups(self):
+        """Профиль под ASGI запрашивает данные параллельно в пуле БД."""
+        with mock.patch.object(
+            async_views, 'run_in_db', wraps=run_in_db
+        ) as patched:
+            status, _ = asgi_get(
+                reverse('posts:profile', args=(self.user.username,)))
+        self.assertEqual(status, 200)
+        self.assertEqual(patched.call_count, 7)
+
+    def test_user_resolved_off_loop(self):
+        """Сессия и пользователь читаются не в потоке цикла событий."""
+        threads = []
+        get_user = auth.get_user
+
+        def record(request):
+            threads.append(threading.current_thread())
+            return get_user(request)
+
+        with mock.patch.object(auth, 'get_user', record):
+            for adress in (
+                reverse('posts:profile', args=(self.user.username,)),
+                reverse('posts:post_detail', args=(self.post.pk,)),
+            ):
+                status, _ = asgi_get(adress, self.cookies)
+                self.assertEqual(status, 200)
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_metrics_include_db_pool(self):
+        """Server-Timing учитывает запросы из пула потоков БД."""
+        start, _ = asgi_request(
+            reverse('posts:profile', args=(self.user.username,)))
+        timing = dict(start['headers'])[b'server-timing'].decode()
+        queries = int(re.search(r'"(\d+) queries"', timing).group(1))
+        self.assertGreaterEqual(queries, 3)
+
+    def test_follow_index_requires_login(self):
+        """Лента подписок под ASGI перенаправляет анонима на вход."""
+        status, _ = asgi_get(reverse('posts:follow_index'))
+        self.assertEqual(status, 302)
+
+    def test_lifespan(self):
+        """Сервер получает подтверждение запуска и остановки."""
+        messages = [
+            {'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(ASGIHandler()({'type': 'lifespan'}, receive, send))
+        self.assertEqual(
+            sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from .. import cards, search
+from ..models import Comment, Follow, Group, Post, TimelineEntry, UserCounter
+
+User = get_user_model()
+KINDS = ('group', 'post', 'comment', 'follow')
+
+
+class BulkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.devnull = open(os.devnull, 'w')
+        self.addCleanup(self.devnull.close)
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.post = Post.objects.create(
+            author=self.author, text='Кошки гуляют', group=self.group)
+        Post.objects.create(author=self.reader, text='Без группы')
+        Comment.objects.create(
+            post=self.post, author=self.reader, text='Коммент')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def snapshot(self):
+        return {
+            'group': list(Group.objects.values_list('slug', 'title')),
+            'post': list(Post.objects.order_by('pk').values_list(
+                'pk', 'text', 'pub_date', 'author__username', 'group__slug',
+                'comment_count')),
+            'comment': list(Comment.objects.values_list(
+                'post_id', 'author__username', 'text', 'created')),
+            'follow': list(Follow.objects.values_list(
+                'user__username', 'author__username')),
+        }
+
+    def round_trip(self, extension, *options):
+        expected = self.snapshot()
+        paths = {
+            kind: os.path.join(self.directory, f'{kind}.{extension}')
+            for kind in KINDS
+        }
+        for kind, path in paths.items():
+            call_command('export_data', kind, path, stderr=self.devnull)
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        User.objects.all().delete()
+        for kind, path in paths.items():
+            call_command(
+                'import_data', kind, path, *options, stdout=self.devnull)
+        self.assertEqual(self.snapshot(), expected)
+
+    def test_round_trip_ndjson(self):
+        """Выгрузка и загрузка NDJSON сохраняют данные и связи."""
+        self.round_trip('ndjson')
+
+    def test_round_trip_csv(self):
+        """Выгрузка и загрузка CSV сохраняют данные и связи."""
+        self.round_trip('csv', '--batch-size', '1')
+
+    def test_derived_state_rebuilt(self):
+        """После загрузки пересобраны счётчики, ленты и поиск."""
+        self.round_trip('ndjson', '--defer-indexes')
+        author = User.objects.get(username='author')
+        reader = User.objects.get(username='reader')
+        self.assertFalse(author.has_usable_password())
+        counters = UserCounter.for_user(author.pk)
+        self.assertEqual((counters.posts, counters.followers), (1, 1))
+        post = Post.objects.get(author=author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=reader, post=post).exists())
+        self.assertEqual(search.search_ids('кошка'), [post.pk])
+        with connection.cursor() as cursor:
+            indexes = connection.introspection.get_constraints(
+                cursor, Post._meta.db_table)
+        self.assertIn('post_author_pub_date_idx', indexes)
+
+    def test_duplicate_follows_skipped(self):
+        """Повторные подписки в файле не ломают загрузку."""
+        path = os.path.join(self.directory, 'follows.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write('{"user": "reader", "author": "author"}\n' * 3)
+            file.write('{"user": "author", "author": "author"}\n')
+        call_command('import_data', 'follow', path, stdout=self.devnull)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(UserCounter.for_user(self.author.pk).followers, 1)
+
+    def import_lines(self, kind, *lines):
+        path = os.path.join(self.directory, f'{kind}-lines.ndjson')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(''.join(line + '\n' for line in lines))
+        call_command('import_data', kind, path, stdout=self.devnull)
+
+    def test_derived_state_scoped(self):
+        """Импорт пересчитывает только загруженные записи."""
+        TimelineEntry.objects.all().delete()
+        UserCounter.objects.filter(user=self.reader).update(posts=100)
+        self.import_lines(
+            'post', '{"text": "Собаки бегают", "author": "author"}')
+        post = Post.objects.get(text='Собаки бегают')
+        self.assertEqual(
+            list(TimelineEntry.objects.values_list('user', 'post')),
+            [(self.reader.pk, post.pk)])
+        self.assertEqual(search.search_ids('собака'), [post.pk])
+        self.assertEqual(UserCounter.for_user(self.author.pk).posts, 2)
+        self.assertEqual(UserCounter.for_user(self.reader.pk).posts, 100)
+
+    def test_comment_import_bumps_cards(self):
+        """Загрузка комментариев обновляет счётчик и карточку поста."""
+        cache.clear()
+        posts = Post.objects.for_feed().filter(pk=self.post.pk)
+        self.assertIn('Комментариев:\n        1', cards.render_cards(posts)[0])
+        posts = posts.all()
+        self.import_lines(
+            'comment',
+            f'{{"post": {self.post.pk}, "author": "reader", "text": "Ещё"}}')
+        self.assertIn('Комментариев:\n        2', cards.render_cards(posts)[0])
@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+import time
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import REGISTRY
+
+from .. import cards
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class CardsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        REGISTRY.reset()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовый пост больше 15 символов',
+            group=self.group,
+        )
+
+    def render(self):
+        return cards.render_cards(Post.objects.for_feed())[0]
+
+    def test_card_cached(self):
+        """Повторный рендер карточки берётся из кеша."""
+        first = self.render()
+        second = self.render()
+        self.assertEqual(first, second)
+        self.assertEqual(cards.stats()['hits'], 1)
+        self.assertEqual(cards.stats()['misses'], 1)
+
+    def test_card_invalidated(self):
+        """Изменение поста, группы или автора обновляет карточку."""
+        self.render()
+        self.post.text = 'Изменённый текст поста'
+        self.post.save()
+        self.assertIn('Изменённый текст поста', self.render())
+        self.group.title = 'Новая группа'
+        self.group.save()
+        self.assertIn('Новая группа', self.render())
+        self.user.first_name = 'Иван'
+        self.user.save()
+        self.assertIn('Иван', self.render())
+        self.assertEqual(cards.stats()['misses'], 4)
+
+    def test_stats_in_metrics(self):
+        """Попадания в кеш карточек видны на /metrics/."""
+        self.render()
+        self.render()
+        self.client.force_login(
+            User.objects.create_user(username='staff', is_staff=True))
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(response, 'yatube_card_cache_hits_total 1')
+        self.assertContains(response, 'yatube_card_cache_misses_total 1')
+
+    def test_card_expires_without_shared_cache(self):
+        """Без общего кеша карточка живёт POST_CARD_TIMEOUT секунд."""
+        with override_settings(POST_CARD_TIMEOUT=0.05):
+            self.render()
+            # update() не шлёт сигналов, как запись в другом процессе.
+            Post.objects.filter(pk=self.post.pk).update(text='Новый текст')
+            self.assertNotIn('Новый текст', self.render())
+            time.sleep(0.1)
+            self.assertIn('Новый текст', self.render())
@@ -0,0 +1,200 @@
+import json
+import os
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, TransactionTestCase
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import comment_queue
+from ..models import Comment, Post
+
+User = get_user_model()
+
+DEAD_PID = 2 ** 22 + 1
+
+
+class WriteBehindMixin:
+    flush_ms = 60 * 1000
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            COMMENT_WRITE_BEHIND=True,
+            COMMENT_SPOOL_DIR=self.directory.name,
+            COMMENT_FLUSH_MS=self.flush_ms,
+        )
+        self.settings_override.enable()
+        self.user = User.objects.create_user(username='TestUser')
+        self.reader = User.objects.create_user(username='Reader')
+        self.post = Post.objects.create(author=self.user, text='Тестовый пост')
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def tearDown(self):
+        comment_queue.get_queue().close()
+        self.settings_override.disable()
+        self.directory.cleanup()
+
+    def comment(self, text):
+        return self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': text}
+        )
+
+
+class CommentQueueTests(WriteBehindMixin, TestCase):
+    def spooled(self):
+        path = os.path.join(
+            self.directory.name, comment_queue.ACTIVE.format(os.getpid()))
+        with open(path, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_acknowledged_before_write(self):
+        """Комментарий подтверждается сразу и попадает только в спул."""
+        response = self.comment('Комментарий')
+        self.assertRedirects(
+            response, reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(
+            [entry['text'] for entry in self.spooled()], ['Комментарий'])
+        self.comment('')
+        self.assertEqual(len(self.spooled()), 1)
+
+    def test_read_your_writes(self):
+        """Автор видит свой комментарий из очереди, остальные — нет."""
+        self.comment('Комментарий в очереди')
+        adress = reverse('posts:post_detail', args=(self.post.pk,))
+        self.assertContains(self.client.get(adress), 'Комментарий в очереди')
+        self.assertNotContains(
+            self.reader_client.get(adress), 'Комментарий в очереди')
+        data = self.client.get(
+            reverse('posts:post_comments', args=(self.post.pk,)),
+            {'format': 'json'}
+        ).json()
+        self.assertEqual(
+            [comment['text'] for comment in data['results']],
+            ['Комментарий в очереди'])
+
+    def test_flush(self):
+        """Сброс пишет пачку, обновляет счётчик и не дублирует показ."""
+        for number in range(3):
+            self.comment(f'Комментарий {number}')
+        queue = comment_queue.get_queue()
+        self.assertEqual(queue.flush(), 3)
+        self.assertEqual(queue.flush(), 0)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Комментарий 0', 'Комментарий 1', 'Комментарий 2'])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+        self.assertEqual(queue.batches(), [])
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertEqual(len(response.context['comments']), 3)
+
+    def test_recovery(self):
+        """Спул после сбоя дописывается без повторов уже записанного."""
+        created = timezone.now()
+        entries = [
+            {
+                'post': self.post.pk,
+                'author': self.user.pk,
+                'text': f'Комментарий {number}',
+                'created': (
+                    created + timezone.timedelta(seconds=number)
+                ).isoformat(),
+            }
+            for number in range(3)
+        ]
+        comment_queue.write(entries[:1])
+        comment_queue.get_queue().close()
+        path = os.path.join(self.directory.name, 'spool')
+        os.makedirs(path)
+        # Спул процесса, которого уже нет: pid больше любого возможного.
+        active = comment_queue.ACTIVE.format(DEAD_PID)
+        with open(os.path.join(path, active), 'w') as file:
+            for entry in entries:
+                file.write(json.dumps(entry) + '\n')
+            file.write('{"post": ')
+        with override_settings(COMMENT_SPOOL_DIR=path):
+            self.assertEqual(comment_queue.get_queue().flush(), 2)
+        self.assertEqual(Comment.objects.count(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+
+    def test_deleted_author(self):
+        """Комментарий удалённого автора пропускается, очередь не встаёт."""
+        other = User.objects.create_user(username='Other')
+        other_client = Client()
+        other_client.force_login(other)
+        other_client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'Удалённый автор'}
+        )
+        other.delete()
+        self.comment('Комментарий')
+        self.assertEqual(comment_queue.get_queue().flush(), 1)
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            ['Комментарий'])
+
+    def test_quarantine(self):
+        """Сломанная пачка откладывается и не держит следующие."""
+        queue = comment_queue.get_queue()
+        broken = queue._batch_path()
+        with open(broken, 'w') as file:
+            file.write('{"post": 1, "created": "не дата"}\n')
+        self.comment('Комментарий')
+        with self.assertLogs('posts.comment_queue', 'ERROR') as logs:
+            self.assertEqual(queue.flush(), 1)
+            for _ in range(comment_queue.MAX_ATTEMPTS - 1):
+                queue.flush()
+        self.assertIn('отложена', logs.output[-1])
+        self.assertEqual(queue.batches(), [])
+        self.assertEqual(len(queue.quarantined()), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_other_process_spool(self):
+        """Спул живого процесса не трогается, завершившегося — забирается."""
+        for pid in (os.getppid(), DEAD_PID):
+            with open(os.path.join(
+                self.directory.name, comment_queue.ACTIVE.format(pid)
+            ), 'w') as file:
+                file.write(json.dumps({
+                    'post': self.post.pk,
+                    'author': self.user.pk,
+                    'text': f'Процесс {pid}',
+                    'created': timezone.now().isoformat(),
+                }) + '\n')
+        queue = comment_queue.CommentQueue(self.directory.name, 60)
+        self.assertEqual(queue.flush(), 1)
+        queue.close()
+        self.assertEqual(
+            list(Comment.objects.values_list('text', flat=True)),
+            [f'Процесс {DEAD_PID}'])
+
+
+class CommentFlusherTests(WriteBehindMixin, TransactionTestCase):
+    flush_ms = 10
+
+    def test_background_flush(self):
+        """Фоновый поток сам записывает комментарии пачкой."""
+        for number in range(5):
+            self.comment(f'Комментарий {number}')
+        queue = comment_queue.get_queue()
+        deadline = time.monotonic() + 5
+        # Опрашивается спул, а не таблица: общая база в памяти не даёт
+        # читать таблицу, пока поток пишет в неё.
+        while (
+            queue.pending or queue.batches()
+        ) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(Comment.objects.count(), 5)
@@ -0,0 +1,93 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Post
+from ..paginators import COMMENTS_PER_PAGE, CommentPaginator
+
+User = get_user_model()
+
+COMMENTS = COMMENTS_PER_PAGE * 2 + 5
+
+
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.user, text=f'Комментарий {i}')
+            for i in range(COMMENTS)
+        )
+        cls.comments = list(Comment.objects.order_by('created', 'pk'))
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_first_page(self):
+        """Страница поста показывает первые комментарии и ссылку на ещё."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        page = response.context['comments']
+        self.assertEqual(
+            list(page), self.comments[:COMMENTS_PER_PAGE])
+        self.assertContains(
+            response, f'{reverse("posts:post_comments", args=(self.post.pk,))}'
+            f'?after={page.next_cursor}')
+
+    def test_lazy_loading(self):
+        """Endpoint отдаёт следующие страницы фрагментом и в JSON."""
+        adress = reverse('posts:post_comments', args=(self.post.pk,))
+        cursor = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,))
+        ).context['comments'].next_cursor
+        loaded = []
+        while cursor:
+            response = self.client.get(adress, {'after': cursor})
+            self.assertTemplateUsed(response, 'includes/comments.html')
+            self.assertNotContains(response, '<html')
+            page = response.context['comments']
+            loaded += list(page)
+            cursor = page.next_cursor
+        self.assertEqual(loaded, self.comments[COMMENTS_PER_PAGE:])
+        data = self.client.get(adress, {'format': 'json'}).json()
+        self.assertEqual(len(data['results']), COMMENTS_PER_PAGE)
+        self.assertEqual(data['results'][0], {
+            'id': self.comments[0].pk,
+            'text': self.comments[0].text,
+            'created': self.comments[0].created.isoformat(),
+            'author': 'TestUser',
+        })
+        self.assertIsNotNone(data['next'])
+
+    def test_bounded_queries(self):
+        """Число запросов не зависит от числа комментариев."""
+        adress = reverse('posts:post_detail', args=(self.post.pk,))
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(adress)
+        Comment.objects.filter(pk__in=[
+            comment.pk for comment in self.comments[5:]
+        ]).delete()
+        cache.clear()
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(adress)
+        self.assertEqual(len(many.captured_queries), len(few.captured_queries))
+
+    def test_cursor_uses_index(self):
+        """Страница комментариев читается по индексу без сортировки."""
+        paginator = CommentPaginator(
+            Comment.objects.for_post(self.post.pk), COMMENTS_PER_PAGE)
+        cursor = paginator.get_page_from_query({}).next_cursor
+        with CaptureQueriesContext(connection) as context:
+            paginator.get_page_from_query({'after': cursor})
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(
+                'EXPLAIN QUERY PLAN ' + context.captured_queries[0]['sql'])
+            plan = ' '.join(row[-1] for row in db_cursor.fetchall())
+        self.assertIn('comment_post_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
@@ -0,0 +1,50 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Comment, Follow, Post, UserCounter
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.author = User.objects.create_user(username='author')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении записей."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Коммент')
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        counters = UserCounter.for_user(self.author.pk)
+        self.assertEqual((counters.posts, counters.followers), (1, 1))
+        self.assertEqual(UserCounter.for_user(self.user.pk).following, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        counters = UserCounter.for_user(self.author.pk)
+        self.assertEqual((counters.posts, counters.followers), (1, 0))
+        post.delete()
+        self.assertEqual(UserCounter.for_user(self.author.pk).posts, 0)
+
+    def test_reconcile_counters(self):
+        """Команда reconcile_counters исправляет расхождения."""
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        Comment.objects.create(post=post, author=self.user, text='Коммент')
+        UserCounter.objects.filter(user=self.author).update(posts=10)
+        Post.objects.filter(pk=post.pk).update(comment_count=5)
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('2', out.getvalue())
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(UserCounter.for_user(self.author.pk).posts, 1)
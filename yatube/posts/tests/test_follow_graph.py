@@ -0,0 +1,137 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import follow_graph, timeline
+from ..models import Follow
+
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        follow_graph.clear_local()
+        self.reader = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='author')
+        self.other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_is_following_without_queries(self):
+        """Прогретая проверка подписки не ходит в базу."""
+        self.assertTrue(
+            follow_graph.is_following(self.reader.pk, self.author.pk))
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                follow_graph.is_following(self.reader.pk, self.author.pk))
+            self.assertFalse(
+                follow_graph.is_following(self.reader.pk, self.other.pk))
+            self.assertFalse(follow_graph.is_following(None, self.author.pk))
+        follow_graph.clear_local()
+        with self.assertNumQueries(0):
+            self.assertTrue(
+                follow_graph.is_following(self.reader.pk, self.author.pk))
+
+    def test_follow_and_unfollow(self):
+        """Подписка и отписка сразу видны в графе и в числе подписчиков."""
+        self.assertEqual(follow_graph.follower_count(self.other.pk), 0)
+        self.assertFalse(
+            follow_graph.is_following(self.reader.pk, self.other.pk))
+        Follow.objects.create(user=self.reader, author=self.other)
+        self.assertTrue(
+            follow_graph.is_following(self.reader.pk, self.other.pk))
+        self.assertEqual(follow_graph.follower_count(self.other.pk), 1)
+        Follow.objects.filter(user=self.reader, author=self.other).delete()
+        self.assertFalse(
+            follow_graph.is_following(self.reader.pk, self.other.pk))
+        self.assertEqual(follow_graph.follower_count(self.other.pk), 0)
+
+    def test_profile_uses_graph(self):
+        """Профиль берёт подписку из графа, без запроса к подпискам."""
+        client = Client()
+        client.force_login(self.reader)
+        adress = reverse('posts:profile', args=(self.author.username,))
+        client.get(adress)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(adress)
+        self.assertTrue(response.context['following'])
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'posts_follow' in query['sql']
+        ])
+
+    def test_profile_follower_count_from_graph(self):
+        """Число подписчиков в профиле берётся из графа."""
+        adress = reverse('posts:profile', args=(self.author.username,))
+        response = Client().get(adress)
+        self.assertEqual(response.context['followers'], 1)
+        with mock.patch.object(
+            follow_graph, 'follower_count', return_value=42
+        ):
+            response = Client().get(adress)
+        self.assertContains(response, 'Подписчиков: 42,')
+
+    def test_popular_followees(self):
+        """Популярные авторы из подписок считаются по графу."""
+        self.assertEqual(follow_graph.popular_followees(self.reader.pk), [])
+        with mock.patch.object(timeline, 'FANOUT_FOLLOWERS_LIMIT', 0):
+            self.assertEqual(
+                follow_graph.popular_followees(self.reader.pk),
+                [self.author.pk])
+            with self.assertNumQueries(0):
+                follow_graph.popular_followees(self.reader.pk)
+            Follow.objects.create(user=self.other, author=self.other)
+            self.assertEqual(
+                list(follow_graph.popular_authors()),
+                sorted([self.author.pk, self.other.pk]))
+
+    def test_expires_without_shared_cache(self):
+        """Запись другого процесса видна после истечения срока графа."""
+        with override_settings(FOLLOW_GRAPH_TIMEOUT=0.05):
+            follow_graph.followees(self.reader.pk)
+            # bulk_create не шлёт сигналов, как запись в другом процессе.
+            Follow.objects.bulk_create(
+                [Follow(user=self.reader, author=self.other)])
+            self.assertFalse(
+                follow_graph.is_following(self.reader.pk, self.other.pk))
+            time.sleep(0.1)
+            self.assertTrue(
+                follow_graph.is_following(self.reader.pk, self.other.pk))
+
+    def test_bump(self):
+        """Смена поколения перечитывает граф после массовой записи."""
+        follow_graph.followees(self.reader.pk)
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.other)])
+        self.assertFalse(
+            follow_graph.is_following(self.reader.pk, self.other.pk))
+        follow_graph.bump()
+        self.assertTrue(
+            follow_graph.is_following(self.reader.pk, self.other.pk))
+
+    def test_forget_new_user(self):
+        """Новый пользователь не наследует граф с тем же id."""
+        follow_graph.followees(self.reader.pk)
+        follow_graph.forget_user(self.reader.pk)
+        self.assertEqual(follow_graph.memory()['users'], 0)
+        with self.assertNumQueries(1):
+            follow_graph.followees(self.reader.pk)
+
+    def test_local_memory_bound(self):
+        """Локальный LRU держит размер в пределах настройки."""
+        ids = follow_graph.pack(range(100))
+        limit = follow_graph.entry_size(ids) * 3
+        with override_settings(FOLLOW_GRAPH_LOCAL_BYTES=limit):
+            for user_id in range(5):
+                follow_graph._remember(user_id, (0, user_id), ids)
+            self.assertEqual(follow_graph.memory(), {
+                'users': 3, 'bytes': limit})
+            self.assertIsNone(follow_graph._recall(0, (0, 0)))
+            self.assertIs(follow_graph._recall(4, (0, 4)), ids)
+            self.assertIsNone(follow_graph._recall(4, (0, 5)))
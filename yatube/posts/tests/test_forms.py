@@ -1,11 +1,15 @@
+import os
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
+from .. import thumbnails
 from ..models import Comment, Group, Post
 
 
@@ -27,6 +31,7 @@ class PostCreateFormTests(TestCase):
 
     @classmethod
     def tearDownClass(cls):
+        thumbnails.drain()
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
@@ -78,6 +83,57 @@ class PostCreateFormTests(TestCase):
             post_latest.image.name, 'posts/' + form_data['image'].name
         )
 
+    @staticmethod
+    def get_image(name='image.png', size=(200, 100)):
+        buffer = BytesIO()
+        Image.new('RGB', size, (255, 0, 0)).save(buffer, 'png')
+        return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+    def create_with_image(self, image):
+        return self.author_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Новый текст для поста', 'image': image},
+        )
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_create_post_image_too_large(self):
+        """Картинка с большим числом пикселей отклоняется по заголовку."""
+        response = self.create_with_image(self.get_image())
+        self.assertFormError(
+            response, 'form', 'image', 'Слишком большое изображение: 200x100.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100)
+    def test_create_post_image_any_content_type(self):
+        """Проверка не зависит от Content-Type, присланного клиентом."""
+        image = self.get_image()
+        image.content_type = 'application/octet-stream'
+        response = self.create_with_image(image)
+        self.assertFormError(
+            response, 'form', 'image', 'Слишком большое изображение: 200x100.'
+        )
+        self.assertFalse(Post.objects.exists())
+
+    def test_create_post_not_image(self):
+        """Файл, который не является картинкой, отклоняется."""
+        response = self.create_with_image(SimpleUploadedFile(
+            'fake.png', b'not an image', 'image/png'))
+        self.assertFormError(
+            response, 'form', 'image', 'Файл не является изображением.'
+        )
+        uploads = os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'posts'))
+        self.assertFalse(
+            [name for name in uploads if name.endswith('.upload')])
+
+    @override_settings(POST_IMAGE_MAX_SIDE=50)
+    def test_create_post_image_downscaled(self):
+        """Слишком большой оригинал уменьшается при загрузке."""
+        self.create_with_image(self.get_image('large.png'))
+        post = Post.objects.get()
+        with post.image.open() as file:
+            self.assertEqual(Image.open(file).size, (50, 25))
+
     def test_edit_post(self):
         """Валидная форма редактирования записи в Post."""
         post = Post.objects.create(
@@ -0,0 +1,127 @@
+import threading
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.idempotency import FIELD
+from ..forms import CommentForm, PostForm
+from ..models import Comment, Post
+
+User = get_user_model()
+
+DUPLICATES = 8
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='TestUser')
+        self.post = Post.objects.create(author=self.user, text='Тестовый пост')
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_forms_carry_key(self):
+        """Формы выводят скрытый ключ, не добавляя полей."""
+        response = self.client.get(reverse('posts:post_create'))
+        form = response.context['form']
+        self.assertEqual(len(form.fields), len(PostForm.Meta.fields))
+        self.assertRegex(form.idempotency_key, r'^[0-9a-f]{32}$')
+        self.assertContains(
+            response, f'name="{FIELD}" value="{form.idempotency_key}"')
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertContains(
+            response,
+            f'value="{response.context["form"].idempotency_key}"')
+        self.assertIsNone(CommentForm({FIELD: 'не ключ'}).idempotency_key)
+
+    def test_retried_post(self):
+        """Повтор создания поста отдаёт тот же редирект без записи."""
+        data = {'text': 'Новый пост', FIELD: uuid.uuid4().hex}
+        first = self.client.post(reverse('posts:post_create'), data)
+        with CaptureQueriesContext(connection) as context:
+            retry = self.client.post(reverse('posts:post_create'), data)
+        self.assertEqual(retry.url, first.url)
+        self.assertEqual(Post.objects.filter(text='Новый пост').count(), 1)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'posts_post' in query['sql']
+        ])
+
+    def test_retried_comment(self):
+        """Повтор комментария отдаёт тот же редирект без записи."""
+        adress = reverse('posts:add_comment', args=(self.post.pk,))
+        data = {'text': 'Комментарий', FIELD: uuid.uuid4().hex}
+        first = self.client.post(adress, data)
+        with CaptureQueriesContext(connection) as context:
+            retry = self.client.post(adress, data)
+        self.assertEqual(retry.url, first.url)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'INSERT' in query['sql'] or 'UPDATE' in query['sql']
+        ])
+        self.client.post(adress, {'text': 'Комментарий'})
+        self.client.post(adress, {**data, FIELD: uuid.uuid4().hex})
+        self.assertEqual(Comment.objects.count(), 3)
+
+    def test_key_per_user(self):
+        """Ключ другого пользователя не подавляет его запрос."""
+        data = {'text': 'Новый пост', FIELD: uuid.uuid4().hex}
+        self.client.post(reverse('posts:post_create'), data)
+        other = Client()
+        other.force_login(User.objects.create_user(username='Other'))
+        other.post(reverse('posts:post_create'), data)
+        self.assertEqual(Post.objects.filter(text='Новый пост').count(), 2)
+
+    def test_invalid_form_not_claimed(self):
+        """Ошибка в форме не занимает ключ."""
+        key = uuid.uuid4().hex
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': '', FIELD: key})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'value="{key}"')
+        self.client.post(
+            reverse('posts:post_create'), {'text': 'Новый пост', FIELD: key})
+        self.assertTrue(Post.objects.filter(text='Новый пост').exists())
+
+
+class ParallelDuplicatesTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='TestUser')
+
+    def test_parallel_duplicates(self):
+        """Одновременные дубли создают один пост и один ответ."""
+        data = {'text': 'Новый пост', FIELD: uuid.uuid4().hex}
+        clients = []
+        for _ in range(DUPLICATES):
+            client = Client()
+            client.force_login(self.user)
+            clients.append(client)
+        barrier = threading.Barrier(DUPLICATES)
+        responses = []
+
+        def submit(client):
+            barrier.wait()
+            responses.append(
+                client.post(reverse('posts:post_create'), data))
+
+        threads = [
+            threading.Thread(target=submit, args=(client,))
+            for client in clients
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(Post.objects.filter(text='Новый пост').count(), 1)
+        self.assertEqual(len(responses), DUPLICATES)
+        self.assertEqual(
+            {(response.status_code, response.url) for response in responses},
+            {(302, reverse('posts:profile', args=(self.user.username,)))})
@@ -0,0 +1,86 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedIndexTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовый пост', group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Коммент')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get_plans(self, adress, table):
+        # Граф подписок читается из базы только при холодном кеше.
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            self.reader_client.get(adress)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query['sql']
+                if sql.startswith('SELECT') and f'FROM "{table}"' in sql:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                    plans.append([row[-1] for row in cursor.fetchall()])
+        return plans
+
+    def test_feed_queries_use_index(self):
+        """Запросы лент читают таблицы по индексу, без сортировки."""
+        url_tables = {
+            reverse('posts:group_list', args=(self.group.slug,)): (
+                'posts_post', 'post_group_pub_date_idx'),
+            reverse('posts:profile', args=(self.author.username,)): (
+                'posts_post', 'post_author_pub_date_idx'),
+            reverse('posts:post_detail', args=(self.post.pk,)): (
+                'posts_comment', 'comment_post_created_idx'),
+            reverse('posts:follow_index'): (
+                'posts_timelineentry', 'timeline_user_pub_post_idx'),
+        }
+        for adress, (table, index) in url_tables.items():
+            with self.subTest(adress=adress):
+                plans = self.get_plans(adress, table)
+                self.assertTrue(plans)
+                self.assertIn(index, ' '.join(sum(plans, [])))
+                for plan in plans:
+                    self.assertFalse(
+                        [step for step in plan if 'TEMP B-TREE' in step])
+
+    def test_follow_queries_use_index(self):
+        """Лента подписок и проверка подписки не сканируют таблицы."""
+        url_tables = {
+            reverse('posts:follow_index'): 'posts_timelineentry',
+            reverse('posts:profile', args=(self.author.username,)): (
+                'posts_follow'),
+        }
+        for adress, table in url_tables.items():
+            with self.subTest(adress=adress):
+                plans = self.get_plans(adress, table)
+                self.assertTrue(plans)
+                for plan in plans:
+                    self.assertFalse(
+                        [step for step in plan if step.startswith('SCAN')])
+                    self.assertFalse(
+                        [step for step in plan if 'TEMP B-TREE' in step])
+                    self.assertIn('INDEX', ' '.join(plan))
@@ -0,0 +1,95 @@
+import os
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from core.db import replication
+from ..models import Group, Post
+from .test_asgi import asgi_get
+
+User = get_user_model()
+
+REPLICA = 'replica_test'
+
+
+@override_settings(
+    DATABASE_REPLICAS=[REPLICA],
+    DATABASE_ROUTERS=['core.db.routers.ReplicaRouter'],
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    # Реплика — второй файл SQLite, его обновляет replication.sync.
+
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.TemporaryDirectory()
+        connections.databases[REPLICA] = {
+            'ENGINE': 'core.db',
+            'NAME': os.path.join(self.directory.name, 'replica.sqlite3'),
+            'OPTIONS': {'read_only': True},
+        }
+        connections.ensure_defaults(REPLICA)
+        connections.prepare_test_settings(REPLICA)
+        self.user = User.objects.create_user(username='TestUser')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.old_post = Post.objects.create(
+            author=self.user, text='Старый пост', group=self.group)
+        replication.sync()
+        self.new_post = Post.objects.create(
+            author=self.user, text='Новый пост', group=self.group)
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        self.directory.cleanup()
+
+    def test_feeds_read_from_replica(self):
+        """Ленты читаются с реплики, остальные страницы — с основной базы."""
+        response = self.client.get(
+            reverse('posts:group_list', args=(self.group.slug,)))
+        self.assertContains(response, 'Старый пост')
+        self.assertNotContains(response, 'Новый пост')
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.new_post.pk,)))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            reverse('posts:post_edit', args=(self.new_post.pk,)))
+        self.assertEqual(response.status_code, 200)
+
+    def test_asgi_feeds_read_from_replica(self):
+        """Асинхронные варианты лент тоже читают с реплики."""
+        status, body = asgi_get(
+            reverse('posts:group_list', args=(self.group.slug,)))
+        self.assertEqual(status, 200)
+        self.assertIn('Старый пост', body.decode())
+        self.assertNotIn('Новый пост', body.decode())
+
+    def test_sticky_after_write(self):
+        """После записи пользователь читает свои изменения с основной базы."""
+        adress = reverse('posts:post_detail', args=(self.new_post.pk,))
+        response = self.client.post(
+            reverse('posts:add_comment', args=(self.old_post.pk,)),
+            {'text': 'Комментарий'})
+        self.assertIn('pin_primary', response.cookies)
+        self.assertEqual(self.client.get(adress).status_code, 200)
+        self.client.cookies['pin_primary'] = str(time.time() - 1)
+        self.assertEqual(self.client.get(adress).status_code, 404)
+
+    def test_replicate_command(self):
+        """Команда replicate догоняет реплику до основной базы."""
+        adress = reverse('posts:post_detail', args=(self.new_post.pk,))
+        self.assertEqual(self.client.get(adress).status_code, 404)
+        call_command('replicate', stderr=open(os.devnull, 'w'))
+        self.assertEqual(self.client.get(adress).status_code, 200)
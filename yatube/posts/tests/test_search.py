@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from .. import search
+from ..models import Post
+
+User = get_user_model()
+
+
+class StemTests(TestCase):
+    def test_stem(self):
+        """Разные формы слова сводятся к одной основе."""
+        forms = {
+            'кошка': 'кошк',
+            'кошками': 'кошк',
+            'новости': 'новост',
+            'красивейший': 'красив',
+            'ёлки': 'елк',
+        }
+        for word, expected in forms.items():
+            with self.subTest(word=word):
+                self.assertEqual(search.stem(word), expected)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.cat_post = Post.objects.create(
+            author=self.user, text='Кошки любят гулять по крышам')
+        self.cats_post = Post.objects.create(
+            author=self.user, text='Кошка, кошке, кошкой: про кошек')
+        self.dog_post = Post.objects.create(
+            author=self.user, text='Собака гуляла во дворе')
+
+    def get_page(self, query, **params):
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': query, **params})
+        return response.context['page_obj']
+
+    def test_search_ranked(self):
+        """Поиск находит формы слова, релевантные посты идут первыми."""
+        page = self.get_page('кошкам')
+        self.assertEqual(page.object_list, [self.cats_post, self.cat_post])
+        self.assertEqual(len(self.get_page('гулять')), 2)
+        self.assertEqual(self.get_page('жираф').object_list, [])
+
+    def test_search_cursor(self):
+        """Результаты поиска листаются курсором."""
+        first_page = search.search_page(Post.objects.all(), 'кошки', None, 1)
+        self.assertEqual(first_page.object_list, [self.cats_post])
+        page = self.get_page('кошки', after=first_page.next_cursor)
+        self.assertEqual(page.object_list, [self.cat_post])
+        self.assertEqual(page.number, 2)
+        self.assertIsNone(page.next_cursor)
+
+    def test_search_index_synced(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        self.dog_post.text = 'Кошка во дворе'
+        self.dog_post.save()
+        self.assertIn(self.dog_post, self.get_page('кошка').object_list)
+        self.dog_post.delete()
+        self.assertEqual(self.get_page('двор').object_list, [])
+
+    def test_admin_search(self):
+        """Поиск в админке использует индекс."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin')
+        admin_client = Client()
+        admin_client.force_login(admin)
+        response = admin_client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кошкам'})
+        self.assertEqual(
+            set(response.context['cl'].result_list),
+            {self.cat_post, self.cats_post}
+        )
+
+    def test_memory_backend(self):
+        """Индекс в памяти ранжирует так же, как FTS5."""
+        backend = search.MemoryBackend()
+        terms = search.stems('кошкам')
+        self.assertEqual(
+            [post_id for post_id, score in backend.search(terms)],
+            [self.cats_post.pk, self.cat_post.pk]
+        )
+        first, = backend.search(terms, limit=1)
+        self.assertEqual(
+            backend.search(terms, after=(first[1], first[0])),
+            backend.search(terms)[1:]
+        )
+        backend.remove(self.cats_post.pk)
+        self.assertEqual(
+            [post_id for post_id, score in backend.search(terms)],
+            [self.cat_post.pk]
+        )
+        backend.index(self.cat_post.pk, 'Собака')
+        self.assertEqual(backend.search(terms), [])
+        self.assertEqual(backend.terms[self.cat_post.pk], {'собак'})
+
+    def test_rebuild_command(self):
+        """Команда индексирует посты, которых нет в индексе."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(self.get_page('кошка').object_list, [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertIn(self.cat_post, self.get_page('кошка').object_list)
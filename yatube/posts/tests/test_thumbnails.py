@@ -0,0 +1,106 @@
+import shutil
+import tempfile
+import time
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        thumbnails.drain()
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+
+    @staticmethod
+    def get_image(name='image.png', color=(255, 0, 0)):
+        buffer = BytesIO()
+        Image.new('RGB', (200, 100), color).save(buffer, 'png')
+        return SimpleUploadedFile(name, buffer.getvalue(), 'image/png')
+
+    def test_generate(self):
+        """Миниатюры нарезаются и их адреса попадают в карточку поста."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', image=self.get_image())
+        urls = thumbnails.generate(post.pk)
+        jpeg = urls['card']['jpeg']
+        path = jpeg[len(settings.MEDIA_URL):]
+        with default_storage.open(path) as file:
+            self.assertEqual(Image.open(file).size, (960, 339))
+        post.refresh_from_db()
+        self.assertEqual(post.thumbnail_urls, urls)
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, jpeg)
+
+    def test_schedule_on_create(self):
+        """Создание поста с картинкой ставит нарезку в очередь."""
+        with mock.patch.object(
+            thumbnails, '_submit'
+        ) as submit, mock.patch.object(
+            thumbnails.transaction, 'on_commit', lambda func: func()
+        ):
+            self.author_client.post(
+                reverse('posts:post_create'),
+                data={'text': 'Тестовый пост', 'image': self.get_image()},
+            )
+        post = Post.objects.get()
+        submit.assert_called_once_with(post.pk)
+
+    def test_new_image_new_url(self):
+        """После замены картинки у миниатюры новый адрес, старая удалена."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', image=self.get_image())
+        old = thumbnails.generate(post.pk)['card']['jpeg']
+        self.assertEqual(thumbnails.generate(post.pk)['card']['jpeg'], old)
+        post.refresh_from_db()
+        post.image = self.get_image('new.png', (0, 0, 255))
+        post.save()
+        new = thumbnails.generate(post.pk)['card']['jpeg']
+        self.assertNotEqual(new, old)
+        self.assertFalse(
+            default_storage.exists(old[len(settings.MEDIA_URL):]))
+        self.assertTrue(
+            default_storage.exists(new[len(settings.MEDIA_URL):]))
+
+    def test_drain(self):
+        """drain дожидается задач, запущенных в пуле потоков."""
+        post = Post.objects.create(
+            author=self.user, text='Тестовый пост', image=self.get_image())
+        done = []
+
+        def run(post_id):
+            time.sleep(0.1)
+            done.append(post_id)
+
+        with mock.patch.object(
+            thumbnails.transaction, 'on_commit', lambda func: func()
+        ), mock.patch.object(thumbnails, '_run', run):
+            thumbnails.schedule(post)
+            thumbnails.drain()
+        self.assertEqual(done, [post.pk])
@@ -0,0 +1,94 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+
+from .. import follow_graph, timeline
+from ..models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+
+    def setUp(self):
+        cache.clear()
+        follow_graph.clear_local()
+
+    def test_fan_out_on_post_create(self):
+        """Новый пост попадает в ленты подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Тестовый пост')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post, pub_date=post.pub_date).exists())
+
+    def test_backfill_and_prune(self):
+        """Подписка заполняет ленту, отписка очищает её."""
+        for i in range(3):
+            Post.objects.create(author=self.author, text=f'Пост №{i}')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(self.reader.timeline.count(), 3)
+        follow.delete()
+        self.assertEqual(self.reader.timeline.count(), 0)
+
+    def test_feed_page_popular_author(self):
+        """Посты популярных авторов подмешиваются при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch.object(timeline, 'FANOUT_FOLLOWERS_LIMIT', 0):
+            post = Post.objects.create(author=self.author, text='Пост')
+            self.assertFalse(self.reader.timeline.filter(post=post).exists())
+            Post.objects.create(author=self.reader, text='Свой пост')
+            self.assertEqual(
+                list(timeline.feed_page(self.reader, {}, 10)), [post])
+
+    def test_popular_author_falls_back(self):
+        """Посты бывшего популярного автора остаются в лентах подписчиков."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=self.author)
+        follow = Follow.objects.create(user=other, author=self.author)
+        with mock.patch.object(timeline, 'FANOUT_FOLLOWERS_LIMIT', 1):
+            post = Post.objects.create(author=self.author, text='Пост')
+            self.assertFalse(self.reader.timeline.filter(post=post).exists())
+            self.assertEqual(
+                list(timeline.feed_page(self.reader, {}, 10)), [post])
+            follow.delete()
+            self.assertEqual(
+                list(timeline.feed_page(self.reader, {}, 10)), [post])
+            self.assertFalse(other.timeline.exists())
+
+    def test_feed_page_by_entry_key(self):
+        """Страницы ленты идут по ключу записи, популярные подмешиваются."""
+        popular = User.objects.create_user(username='popular')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=popular)
+        posts = []
+        with mock.patch.object(timeline, 'FANOUT_FOLLOWERS_LIMIT', 0):
+            for i in range(5):
+                posts.append(
+                    Post.objects.create(author=self.author, text=f'Пост {i}'))
+                posts.append(
+                    Post.objects.create(author=popular, text=f'Пост {i}'))
+        # Эти записи разложены, пока автор не был популярным.
+        TimelineEntry.objects.bulk_create(
+            TimelineEntry(user=self.reader, post=post, pub_date=post.pub_date)
+            for post in posts
+        )
+        expected = sorted(
+            posts, key=lambda post: (post.pub_date, post.pk), reverse=True)
+        with mock.patch.object(timeline, 'FANOUT_FOLLOWERS_LIMIT', 1):
+            pages = [timeline.feed_page(self.reader, {}, 4)]
+            while pages[-1].next_cursor:
+                pages.append(timeline.feed_page(
+                    self.reader, {'after': pages[-1].next_cursor}, 4))
+            self.assertEqual(sum((list(page) for page in pages), []), expected)
+            previous = timeline.feed_page(
+                self.reader, {'before': pages[-1].previous_cursor}, 4)
+            self.assertEqual(list(previous), list(pages[-2]))
+            second = timeline.feed_page(self.reader, {'page': 2}, 4)
+            self.assertEqual(list(second), list(pages[1]))
@@ -1,14 +1,19 @@
+import base64
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django import forms
-from ..models import Follow, Group, Post
+from .. import feed_cache, thumbnails
+from ..models import Comment, Follow, Group, Post, UserCounter
 
 User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -23,6 +28,7 @@ class PostViewsTests(TestCase):
 
     @classmethod
     def tearDownClass(cls):
+        thumbnails.drain()
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
@@ -195,6 +201,68 @@ class PaginatorViewsTest(TestCase):
                 response = self.client.get(adress + '?page=2')
                 self.assertEqual(len(response.context['page_obj']), 5)
 
+    def test_cursor_paginator(self):
+        """Переход по токенам after/before на страницах с постами."""
+        url_names = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user})
+        ]
+        for adress in url_names:
+            with self.subTest(adress=adress):
+                cache.clear()
+                first_page = self.client.get(adress).context['page_obj']
+                self.assertIsNone(first_page.previous_cursor)
+                response = self.client.get(
+                    adress + '?after=' + first_page.next_cursor)
+                second_page = response.context['page_obj']
+                self.assertEqual(len(second_page), 5)
+                self.assertEqual(second_page.number, 2)
+                self.assertFalse(second_page.has_next())
+                self.assertFalse(
+                    set(first_page.object_list)
+                    & set(second_page.object_list)
+                )
+                response = self.client.get(
+                    adress + '?before=' + second_page.previous_cursor)
+                self.assertEqual(
+                    response.context['page_obj'].object_list,
+                    first_page.object_list
+                )
+                self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_cursor_out_of_range(self):
+        """Токен с ключом вне 64 бит считается отсутствующим."""
+        adress = reverse('posts:index')
+        for raw in (
+            '2020-01-01T00:00:00+00:00|99999999999999999999|2',
+            '2020-01-01T00:00:00+00:00|1|99999999999999999999',
+        ):
+            with self.subTest(raw=raw):
+                token = base64.urlsafe_b64encode(raw.encode()).decode()
+                response = self.client.get(adress + '?after=' + token)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_paginator_without_count(self):
+        """Страницы не считают COUNT и показывают окно номеров."""
+        adress = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(adress + '?page=2')
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'COUNT(' in query['sql']
+        ])
+        page = response.context['page_obj']
+        self.assertEqual(list(page.page_window), [1, 2])
+        self.assertContains(response, 'href="?page=1"')
+        page = self.client.get(adress).context['page_obj']
+        self.assertEqual(list(page.page_window), [1, 2])
+        response = self.client.get(adress + '?page=99')
+        self.assertEqual(response.context['page_obj'].number, 1)
+        response = self.client.get(adress + '?page=100000000000000000000')
+        self.assertEqual(response.context['page_obj'].number, 1)
+
 
 class CacheTests(TestCase):
     @ classmethod
@@ -203,6 +271,7 @@ class CacheTests(TestCase):
         cls.user = User.objects.create_user(username='TestUser')
 
     def setUp(self):
+        cache.clear()
         self.author_client = Client()
         self.author_client.force_login(self.user)
 
@@ -213,15 +282,75 @@ class CacheTests(TestCase):
             text='Тестовый пост больше 15 символов',
         )
         response = self.author_client.get(reverse('posts:index'))
-        content_before_delete = response.content
-        post.delete()
+        content_before_update = response.content
+        Post.objects.filter(pk=post.pk).update(text='Текст без сигналов')
         response = self.author_client.get(reverse('posts:index'))
-        content_after_delete = response.content
-        self.assertEqual(content_after_delete, content_before_delete)
+        self.assertEqual(response.content, content_before_update)
         cache.clear()
         response = self.author_client.get(reverse('posts:index'))
-        content_before_clear = response.content
-        self.assertNotEqual(content_before_clear, content_before_delete)
+        self.assertNotEqual(response.content, content_before_update)
+
+    def test_cache_index_invalidated(self):
+        """Создание и удаление поста обновляют кеш index."""
+        response = self.author_client.get(reverse('posts:index'))
+        post = Post.objects.create(
+            author=self.user,
+            text='Тестовый пост больше 15 символов',
+        )
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, post.text)
+        post.delete()
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertNotContains(response, post.text)
+
+    def test_cache_index_stale_while_locked(self):
+        """Пока ленту пересобирает другой обработчик, отдаётся старая."""
+        response = self.author_client.get(reverse('posts:index'))
+        content_before = response.content
+        with mock.patch.object(feed_cache.cache, 'add', return_value=False):
+            Post.objects.create(
+                author=self.user,
+                text='Тестовый пост больше 15 символов',
+            )
+            response = self.author_client.get(reverse('posts:index'))
+        self.assertEqual(response.content, content_before)
+
+    def test_cache_index_page_obj(self):
+        """На попадании в кеш page_obj есть в контексте, но без запроса."""
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        self.author_client.get(reverse('posts:index'))
+        with CaptureQueriesContext(connection) as context:
+            response = self.author_client.get(reverse('posts:index'))
+        self.assertFalse([
+            query for query in context.captured_queries
+            if 'FROM "posts_post"' in query['sql']
+        ])
+        self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_cache_index_ignores_other_params(self):
+        """Посторонние параметры запроса не создают новых записей кеша."""
+        Post.objects.create(author=self.user, text='Тестовый пост')
+        self.author_client.get(reverse('posts:index'))
+        for params in ({'x': 1}, {'x': 2}, {'page': 1, 'after': 'bad'}):
+            with self.subTest(params=params):
+                with CaptureQueriesContext(connection) as context:
+                    self.author_client.get(reverse('posts:index'), params)
+                self.assertFalse([
+                    query for query in context.captured_queries
+                    if 'FROM "posts_post"' in query['sql']
+                ])
+
+    def test_cache_index_variants(self):
+        """Анонимы и пользователи получают разные варианты ленты."""
+        Post.objects.create(
+            author=self.user,
+            text='Тестовый пост больше 15 символов',
+        )
+        self.author_client.get(reverse('posts:index'))
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, reverse('posts:follow_index'))
+        response = self.author_client.get(reverse('posts:index'))
+        self.assertContains(response, reverse('posts:follow_index'))
 
 
 class FollowTests(TestCase):
@@ -249,6 +378,24 @@ class FollowTests(TestCase):
         self.assertEqual(latest_follow.user, self.second_user)
         self.assertEqual(latest_follow.author, self.first_user)
 
+    def test_follow_idempotent(self):
+        """Повторная подписка и отписка ничего не ломают."""
+        adress = reverse(
+            'posts:profile_follow', args=(self.first_user.username,))
+        self.second_user_client.post(adress)
+        self.second_user_client.post(adress)
+        follow = Follow.objects.get()
+        self.assertEqual(follow.user, self.second_user)
+        counters = UserCounter.for_user(self.first_user.pk)
+        self.assertEqual(counters.followers, 1)
+        adress = reverse(
+            'posts:profile_unfollow', args=(self.first_user.username,))
+        self.second_user_client.post(adress)
+        self.second_user_client.post(adress)
+        self.assertFalse(Follow.objects.exists())
+        counters = UserCounter.for_user(self.first_user.pk)
+        self.assertEqual(counters.followers, 0)
+
     def test_unfollow(self):
         """Проверка отписки от автора."""
         Follow.objects.create(
@@ -285,3 +432,66 @@ class FollowTests(TestCase):
         )
         post_response = response.context['page_obj'][0]
         self.assertEqual(post_response, post)
+
+
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.user)
+
+    def create_posts(self, count):
+        for i in range(count):
+            author = User.objects.create_user(username=f'author{count}_{i}')
+            Follow.objects.create(user=self.user, author=author)
+            post = Post.objects.create(
+                author=author,
+                text='№' + str(i) + ' Тестовый пост больше 15 символов',
+                group=self.group,
+            )
+            Comment.objects.create(post=post, author=author, text='Коммент')
+            own = Post.objects.create(
+                author=self.user, text='Свой пост', group=self.group)
+            Comment.objects.create(post=own, author=author, text='Коммент')
+
+    def test_feed_query_count(self):
+        """Число запросов на страницах ленты не зависит от числа постов."""
+        url_names = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}): 4,
+            reverse('posts:follow_index'): 5,
+            reverse('posts:profile', args=(self.user.username,)): 6,
+        }
+        for count in (1, 10):
+            self.create_posts(count)
+            for adress, queries in url_names.items():
+                with self.subTest(adress=adress, count=count):
+                    cache.clear()
+                    with self.assertNumQueries(queries):
+                        self.author_client.get(adress)
+
+    def test_post_detail_query_count(self):
+        """Число запросов на странице поста не зависит от комментариев."""
+        post = Post.objects.create(author=self.user, text='Тестовый пост')
+        for count in (1, 10):
+            for i in range(count):
+                Comment.objects.create(
+                    post=post,
+                    author=User.objects.create_user(
+                        username=f'commentator{count}_{i}'),
+                    text='Коммент',
+                )
+            with self.subTest(count=count):
+                with self.assertNumQueries(5):
+                    self.author_client.get(
+                        reverse('posts:post_detail', args=(post.id,)))
@@ -0,0 +1,138 @@
+"""Миниатюры картинок постов, которые готовятся при загрузке.
+
+После сохранения поста с новой картинкой задача уходит в пул потоков:
+он нарезает миниатюры всех размеров из ``POST_THUMBNAIL_SIZES`` в
+форматах ``POST_THUMBNAIL_FORMATS`` и записывает их адреса в пост.
+В имени файла миниатюры есть хеш исходной картинки, поэтому после замены
+картинки у миниатюры новый адрес и браузеры не показывают старую.
+Шаблоны берут готовые адреса и не обращаются к Pillow.
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from PIL import Image, ImageOps, features
+
+from core.metrics import timer
+
+from . import cards, feed_cache
+from .models import Post
+
+EXTENSIONS = {'JPEG': 'jpg', 'WEBP': 'webp'}
+
+_executor = None
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POST_THUMBNAIL_WORKERS,
+            thread_name_prefix='thumbnails'
+        )
+    return _executor
+
+
+def _formats():
+    return [
+        image_format for image_format in settings.POST_THUMBNAIL_FORMATS
+        if image_format != 'WEBP' or features.check('webp')
+    ]
+
+
+def _save(image, path, image_format):
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=85)
+    if default_storage.exists(path):
+        default_storage.delete(path)
+    return default_storage.url(
+        default_storage.save(path, ContentFile(buffer.getvalue()))
+    )
+
+
+def _paths(thumbnails):
+    """Пути в хранилище по адресам миниатюр."""
+    return {
+        url[len(settings.MEDIA_URL):]
+        for formats in thumbnails.values()
+        for url in formats.values()
+        if url.startswith(settings.MEDIA_URL)
+    }
+
+
+def generate(post_id):
+    """Нарезать миниатюры картинки поста и сохранить их адреса."""
+    post = Post.objects.only('image', 'thumbnails').get(pk=post_id)
+    if not post.image:
+        return {}
+    with post.image.open('rb') as file:
+        data = file.read()
+    digest = hashlib.sha1(data).hexdigest()[:12]
+    original = Image.open(BytesIO(data))
+    original.load()
+    original = original.convert('RGB')
+    thumbnails = {}
+    for name, size in settings.POST_THUMBNAIL_SIZES.items():
+        image = ImageOps.fit(original, size, Image.LANCZOS)
+        thumbnails[name] = {
+            image_format.lower(): _save(
+                image,
+                'cache/posts/{}/{}_{}x{}_{}.{}'.format(
+                    post_id, name, *size, digest, EXTENSIONS[image_format]
+                ),
+                image_format
+            )
+            for image_format in _formats()
+        }
+    Post.objects.filter(pk=post_id).update(thumbnails=json.dumps(thumbnails))
+    for path in _paths(post.thumbnail_urls) - _paths(thumbnails):
+        default_storage.delete(path)
+    cards.bump('post', post_id)
+    feed_cache.bump()
+    return thumbnails
+
+
+def _run(post_id):
+    close_old_connections()
+    try:
+        with timer('thumbnail_seconds'):
+            generate(post_id)
+    finally:
+        connection.close()
+
+
+def _submit(post_id):
+    future = _get_executor().submit(_run, post_id)
+    with _pending_lock:
+        _pending.add(future)
+
+    def done(future):
+        with _pending_lock:
+            _pending.discard(future)
+
+    future.add_done_callback(done)
+
+
+def schedule(post):
+    """Поставить нарезку миниатюр в очередь после фиксации транзакции."""
+    if post.image:
+        transaction.on_commit(lambda: _submit(post.pk))
+
+
+def drain(timeout=None):
+    """Дождаться нарезки всех поставленных в очередь миниатюр.
+
+    Нужен тестам: поток не должен писать в MEDIA_ROOT теста после того,
+    как тест удалил каталог.
+    """
+    with _pending_lock:
+        pending = list(_pending)
+    wait(pending, timeout)
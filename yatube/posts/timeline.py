@@ -0,0 +1,155 @@
+"""Материализованная лента подписок (fan-out-on-write).
+
+Новый пост раскладывается по лентам всех подписчиков автора, поэтому
+страница «Избранные авторы» читается одним диапазоном по индексу
+(user, -pub_date, -post), а посты страницы загружаются по ключам.
+Посты авторов с очень большим числом подписчиков не раскладываются,
+а подмешиваются при чтении (fan-out-on-read). Когда
+подписчиков снова становится не больше порога, посты автора
+раскладываются по лентам всех его подписчиков.
+"""
+from django.db import connection
+from django.db.models import F
+
+from .models import Follow, Post, TimelineEntry, UserCounter
+from .paginators import MergedKeys, TimelinePaginator
+
+FANOUT_FOLLOWERS_LIMIT = 1000
+BATCH_SIZE = 500
+
+
+def _bulk_insert(entries):
+    TimelineEntry.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+    )
+
+
+def fan_out(post):
+    """Добавить пост в ленты подписчиков автора."""
+    counters = UserCounter.for_user(post.author_id)
+    if counters.followers > FANOUT_FOLLOWERS_LIMIT:
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        'user_id', flat=True
+    )
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+        for user_id in followers
+    )
+
+
+def backfill(user_id, author_id):
+    """Заполнить ленту подписчика постами нового автора."""
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in posts.iterator()
+    )
+
+
+def prune(user_id, author_id):
+    """Убрать из ленты подписчика посты автора, от которого он отписался."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def _insert_select(where, params):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {TimelineEntry._meta.db_table} '
+            f'(user_id, post_id, pub_date) '
+            f'SELECT follow.user_id, post.id, post.pub_date '
+            f'FROM {Follow._meta.db_table} follow '
+            f'JOIN {Post._meta.db_table} post '
+            f'ON post.author_id = follow.author_id '
+            f'LEFT JOIN {UserCounter._meta.db_table} counters '
+            f'ON counters.user_id = follow.author_id '
+            f'WHERE {where} '
+            f'ON CONFLICT (user_id, post_id) DO NOTHING',
+            params
+        )
+        return cursor.rowcount
+
+
+def unfollowed(user_id, author_id):
+    """Обновить ленты после отписки.
+
+    Пока автор был популярным, его посты не раскладывались: если
+    подписчиков стало ровно по порогу, они раскладываются сейчас.
+    """
+    prune(user_id, author_id)
+    if UserCounter.for_user(author_id).followers == FANOUT_FOLLOWERS_LIMIT:
+        _insert_select('follow.author_id = %s', [author_id])
+
+
+def _in(column, ids):
+    return f'{column} IN ({", ".join(["%s"] * len(ids))})'
+
+
+def fan_out_posts(post_ids):
+    """Разложить по лентам посты post_ids, например после импорта."""
+    post_ids = list(post_ids)
+    if not post_ids:
+        return 0
+    return _insert_select(
+        _in('post.id', post_ids)
+        + ' AND COALESCE(counters.followers, 0) <= %s',
+        post_ids + [FANOUT_FOLLOWERS_LIMIT]
+    )
+
+
+def fan_out_authors(author_ids):
+    """Разложить посты авторов author_ids по лентам их подписчиков."""
+    author_ids = list(author_ids)
+    if not author_ids:
+        return 0
+    return _insert_select(
+        _in('follow.author_id', author_ids)
+        + ' AND COALESCE(counters.followers, 0) <= %s',
+        author_ids + [FANOUT_FOLLOWERS_LIMIT]
+    )
+
+
+def rebuild():
+    """Разложить по лентам все посты подписок одним INSERT ... SELECT."""
+    return _insert_select(
+        'COALESCE(counters.followers, 0) <= %s', [FANOUT_FOLLOWERS_LIMIT]
+    )
+
+
+def popular_authors(user):
+    """Авторы из подписок, чьи посты не раскладываются по лентам."""
+    from .follow_graph import popular_followees
+
+    return popular_followees(user.pk)
+
+
+def feed_keys(user):
+    """Ключи (pub_date, post_id) постов ленты подписок пользователя.
+
+    Посты популярных авторов читаются по индексу (author, -pub_date)
+    и сливаются с записями ленты.
+    """
+    entries = TimelineEntry.objects.filter(user=user).values(
+        'pub_date', 'post_id'
+    )
+    popular = popular_authors(user)
+    if not popular:
+        return entries
+    return MergedKeys([
+        entries,
+        Post.objects.filter(author__in=popular).values(
+            'pub_date', post_id=F('pk')
+        ),
+    ])
+
+
+def feed_page(user, query, per_page):
+    """Страница ленты подписок по параметрам запроса after/before/page."""
+    paginator = TimelinePaginator(
+        feed_keys(user), Post.objects.for_feed(), per_page
+    )
+    return paginator.get_page_from_query(query)
@@ -0,0 +1,128 @@
+"""Потоковая загрузка картинок постов.
+
+``StreamingImageUploadHandler`` пишет картинку сразу во временный файл в
+``MEDIA_ROOT/posts/``: при сохранении поста хранилище лишь переименует
+его. Формат и размеры проверяются по заголовку файла, до декодирования
+пикселей, поэтому «бомбы» отбрасываются в самом начале загрузки.
+Проверяется любой файл поля ``image``: Content-Type задаёт клиент.
+``downscale`` уменьшает слишком большие оригиналы с помощью
+``draft``/``reduce`` Pillow, не распаковывая картинку целиком.
+"""
+import os
+import tempfile
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import (
+    SimpleUploadedFile, TemporaryUploadedFile, UploadedFile
+)
+from django.core.files.uploadhandler import FileUploadHandler
+from PIL import Image
+
+HEADER_BYTES = 64 * 1024
+UPLOAD_DIR = 'posts'
+FIELD_NAME = 'image'
+
+
+class StreamedImageFile(TemporaryUploadedFile):
+    """Загружаемая картинка во временном файле рядом с итоговым местом."""
+
+    def __init__(self, name, content_type, size, charset,
+                 content_type_extra=None):
+        directory = os.path.join(settings.MEDIA_ROOT, UPLOAD_DIR)
+        os.makedirs(directory, exist_ok=True)
+        file = tempfile.NamedTemporaryFile(suffix='.upload', dir=directory)
+        UploadedFile.__init__(
+            self, file, name, content_type, size, charset, content_type_extra
+        )
+
+
+class StreamingImageUploadHandler(FileUploadHandler):
+    """Обработчик загрузки картинок с проверкой заголовка и размера."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.active = self.field_name == FIELD_NAME
+        if not self.active:
+            return
+        self.error = None
+        self.header = b''
+        self.checked = False
+        self.file = StreamedImageFile(
+            self.file_name, self.content_type, 0, self.charset,
+            self.content_type_extra
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.active:
+            return raw_data
+        if self.error:
+            return None
+        if start + len(raw_data) > settings.POST_IMAGE_MAX_BYTES:
+            self.error = 'Размер файла превышает {} МБ.'.format(
+                settings.POST_IMAGE_MAX_BYTES // (1024 * 1024)
+            )
+            return None
+        if not self.checked:
+            self.header += raw_data
+            if len(self.header) >= HEADER_BYTES:
+                self.check_header()
+        self.file.write(raw_data)
+        return None
+
+    def check_header(self):
+        self.checked = True
+        try:
+            with Image.open(BytesIO(self.header)) as image:
+                image_format = image.format
+                width, height = image.size
+        except Image.DecompressionBombError:
+            self.error = 'Слишком большое изображение.'
+            return
+        except (OSError, SyntaxError, ValueError):
+            self.error = 'Файл не является изображением.'
+            return
+        if image_format not in settings.POST_IMAGE_FORMATS:
+            self.error = f'Формат {image_format} не поддерживается.'
+        elif width * height > settings.POST_IMAGE_MAX_PIXELS:
+            self.error = 'Слишком большое изображение: {}x{}.'.format(
+                width, height
+            )
+        self.header = b''
+
+    def file_complete(self, file_size):
+        if not self.active:
+            return None
+        if not self.checked and not self.error:
+            self.check_header()
+        if self.error:
+            self.file.close()
+            rejected = SimpleUploadedFile(
+                self.file_name, b'', self.content_type
+            )
+            rejected.upload_error = self.error
+            return rejected
+        self.file.seek(0)
+        self.file.size = file_size
+        return self.file
+
+
+def downscale(image_file):
+    """Уменьшить картинку до POST_IMAGE_MAX_SIDE по большей стороне."""
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    image_file.seek(0)
+    with Image.open(image_file) as image:
+        if max(image.size) <= max_side:
+            image_file.seek(0)
+            return False
+        image_format = image.format
+        image.draft('RGB', (max_side, max_side))
+        image.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=3)
+        buffer = BytesIO()
+        image.save(buffer, image_format)
+    image_file.seek(0)
+    image_file.truncate()
+    image_file.write(buffer.getvalue())
+    image_file.size = buffer.tell()
+    image_file.seek(0)
+    return True
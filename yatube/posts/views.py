@@ -1,33 +1,55 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import redirect, render, get_object_or_404
-from django.views.decorators.cache import cache_page
-from .models import Follow, Post, Group, User
+from django.template.loader import render_to_string
+from django.utils.functional import SimpleLazyObject
+from core.asgi import async_variant
+from core.db.routers import replica_reads
+from core.idempotency import respond_once
+from core.reverse import reverse
+from . import async_views, comment_queue, follow_graph
+from .api import serialize_comment
+from .models import Comment, Follow, Post, Group, User, UserCounter
+from .feed_cache import cached_feed
 from .forms import PostForm, CommentForm
+from .paginators import COMMENTS_PER_PAGE, CommentPaginator, CursorPaginator
+from .search import search_page
+from .thumbnails import schedule as schedule_thumbnails
+from .timeline import feed_page
 User = get_user_model()
 
 
-@cache_page(20)
+@replica_reads
+@async_variant(async_views.index)
 def index(request):
     """Главная страница."""
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Страница читается из базы, только если ленты нет в кеше.
     context = {
-        'page_obj': page_obj,
+        'index': True,
+        'page_obj': SimpleLazyObject(
+            lambda: CursorPaginator(
+                Post.objects.for_feed(), 10
+            ).get_page_from_query(request.GET)
+        ),
     }
+
+    def render_feed():
+        return render_to_string('includes/feed.html', context, request)
+
+    context['feed'] = cached_feed(request, 'index', render_feed)
     return render(request, 'posts/index.html', context)
 
 
+@replica_reads
+@async_variant(async_views.group_posts)
 def group_posts(request, slug):
     """Страница группы."""
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = group.posts.for_feed()
+    paginator = CursorPaginator(post_list, 10)
+    page_obj = paginator.get_page_from_query(request.GET)
     context = {
         'group': group,
         'page_obj': page_obj,
@@ -35,38 +57,87 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@replica_reads
+@async_variant(async_views.profile)
 def profile(request, username):
     """Страница пользователя."""
     author = get_object_or_404(User, username=username)
-    profile_post = author.posts.all()
-    paginator = Paginator(profile_post, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    following = False
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user.id, author=author).exists()
+    profile_post = author.posts.for_feed()
+    paginator = CursorPaginator(profile_post, 10)
+    page_obj = paginator.get_page_from_query(request.GET)
+    following = follow_graph.is_following(request.user.pk, author.pk)
+    counters = UserCounter.for_user(author.pk)
     context = {
         'author': author,
+        'counters': counters,
+        'followers': follow_graph.follower_count(
+            author.pk, counters.followers
+        ),
         'page_obj': page_obj,
         'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@replica_reads
+@async_variant(async_views.post_detail)
 def post_detail(request, post_id):
     """Страница поста."""
-    post = get_object_or_404(Post, pk=post_id)
-    comment = post.comments.all()
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
+    paginator = CommentPaginator(
+        Comment.objects.for_post(post.pk), COMMENTS_PER_PAGE
+    )
     form = CommentForm()
+    comments = comment_queue.with_pending(
+        post.pk, request.user,
+        lambda: paginator.get_page_from_query(request.GET)
+    )
     context = {
         'post': post,
-        'comments': comment,
+        'author_counters': UserCounter.for_user(post.author_id),
+        'comments': comments,
         'form': form,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@replica_reads
+def post_comments(request, post_id):
+    """Следующая страница комментариев: фрагмент HTML или JSON."""
+    paginator = CommentPaginator(
+        Comment.objects.for_post(post_id), COMMENTS_PER_PAGE
+    )
+    page = comment_queue.with_pending(
+        post_id, request.user,
+        lambda: paginator.get_page_from_query(request.GET)
+    )
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'results': [serialize_comment(comment) for comment in page],
+            'next': page.next_cursor,
+        }, json_dumps_params={'ensure_ascii': False})
+    context = {
+        'post_id': post_id,
+        'comments': page,
+    }
+    return render(request, 'includes/comments.html', context)
+
+
+def search(request):
+    """Поиск по постам."""
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+    if query:
+        page_obj = search_page(
+            Post.objects.for_feed(), query, request.GET.get('after'), 10
+        )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_edit(request, post_id):
     """Редактирование поста."""
@@ -79,8 +150,14 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        post = form.save()
-        post.save()
+        post = form.save(commit=False)
+        fields = list(PostForm.Meta.fields)
+        if 'image' in form.changed_data:
+            post.thumbnails = ''
+            fields.append('thumbnails')
+        post.save(update_fields=fields)
+        if 'image' in form.changed_data:
+            schedule_thumbnails(post)
         return redirect('posts:post_detail', post.pk)
     context = {
         'post': post,
@@ -98,10 +175,15 @@ def post_create(request):
         files=request.FILES or None
     )
     if form.is_valid():
-        post = form.save(commit=False)
-        post.author = request.user
-        post.save()
-        return redirect('posts:profile', post.author)
+        def create():
+            post = form.save(commit=False)
+            post.author = request.user
+            with transaction.atomic():
+                post.save()
+                schedule_thumbnails(post)
+            return reverse('posts:profile', (post.author.username,))
+
+        return respond_once(request, form.idempotency_key, create)
     context = {
         'form': form,
     }
@@ -114,22 +196,29 @@ def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
-        comment = form.save(commit=False)
-        comment.author = request.user
-        comment.post = post
-        comment.save()
+        def create():
+            comment = form.save(commit=False)
+            comment.author = request.user
+            comment.post = post
+            if comment_queue.enabled():
+                comment_queue.put(comment)
+            else:
+                with transaction.atomic():
+                    comment.save()
+            return reverse('posts:post_detail', (post_id,))
+
+        return respond_once(request, form.idempotency_key, create)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
+@replica_reads
+@async_variant(async_views.follow_index)
 def follow_index(request):
     """Страница постов на которые подписан."""
-    post_list = Post.objects.filter(author__following__user=request.user)
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
     context = {
-        'page_obj': page_obj,
+        'page_obj': feed_page(request.user, request.GET, 10),
+        'follow': True,
     }
     return render(request, 'posts/follow.html', context)
 
@@ -138,9 +227,9 @@ def follow_index(request):
 def profile_follow(request, username):
     """Подписка на автора."""
     author = get_object_or_404(User, username=username)
-    if request.user != author and not Follow.objects.filter(
-            user=request.user, author=author).exists():
-        Follow.objects.create(user=request.user, author=author)
+    if request.user != author:
+        with transaction.atomic():
+            Follow.objects.follow(request.user.pk, author.pk)
     return redirect('posts:profile', username=username)
 
 
@@ -148,7 +237,6 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     """Отписка от автора."""
     author = get_object_or_404(User, username=username)
-    unfollow = Follow.objects.filter(user=request.user, author=author)
-    if unfollow.exists():
-        unfollow.delete()
+    with transaction.atomic():
+        Follow.objects.unfollow(request.user.pk, author.pk)
     return redirect('posts:profile', username=username)
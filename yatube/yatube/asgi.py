@@ -0,0 +1,19 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named
+``application``. Django 2.2 has no ASGI support of its own, so the
+callable is ``core.asgi.ASGIHandler``; run it with any ASGI server, e.g.
+``uvicorn yatube.asgi:application``.
+"""
+
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+django.setup(set_prefix=False)
+
+from core.asgi import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
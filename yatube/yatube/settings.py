@@ -36,6 +36,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -46,13 +48,23 @@ MIDDLEWARE = [
 ]
 
 ROOT_URLCONF = 'yatube.urls'
+# Адреса этих пространств имён запоминаются в core.reverse.
+URL_CACHE_NAMESPACES = ('posts', 'about', 'users')
+URL_CACHE_SIZE = 4096
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
+# Шаблоны компилируются один раз при запуске, include подставляются сразу.
+# По умолчанию включено без DEBUG: изменения файлов видны после перезапуска.
+TEMPLATE_CACHE = bool(os.getenv('TEMPLATE_CACHE', '' if DEBUG else '1'))
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
+        'APP_DIRS': not TEMPLATE_CACHE,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -64,16 +76,68 @@ TEMPLATES = [
         },
     },
 ]
+if TEMPLATE_CACHE:
+    TEMPLATES[0]['OPTIONS']['loaders'] = [
+        ('core.template_loaders.InliningLoader', TEMPLATE_LOADERS),
+    ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Потолок одновременных запросов под ASGI: поток занят до конца ответа.
+ASGI_THREADS = 16
+ASGI_DB_THREADS = 8
+
+DATABASE_PATH = os.path.join(BASE_DIR, 'db.sqlite3')
+DATABASE_CONN_MAX_AGE = int(os.getenv('DATABASE_CONN_MAX_AGE', 60))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'ENGINE': 'core.db',
+        'NAME': DATABASE_PATH,
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+    },
+    'readonly': {
+        'ENGINE': 'core.db',
+        'NAME': DATABASE_PATH,
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'OPTIONS': {
+            'read_only': True,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
+# Реплики: пути к файлам через запятую, их синхронизирует `replicate`.
+DATABASE_REPLICA_PATHS = [
+    path for path in os.getenv('DATABASE_REPLICA_PATHS', '').split(',') if path
+]
+DATABASE_REPLICAS = []
+for number, path in enumerate(DATABASE_REPLICA_PATHS, start=1):
+    DATABASES[f'replica{number}'] = {
+        'ENGINE': 'core.db',
+        'NAME': path,
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'OPTIONS': {
+            'read_only': True,
+        },
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_REPLICA_APPS = ['posts', 'auth']
+DATABASE_REPLICA_STICKY_SECONDS = 5
+DATABASE_REPLICA_COOKIE = 'pin_primary'
+
+DATABASE_READ_ONLY_ALIAS = 'readonly'
+DATABASE_ROUTERS = []
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS.append('core.db.routers.ReplicaRouter')
+if os.getenv('DATABASE_READ_ONLY_ROUTING'):
+    DATABASE_ROUTERS.append('core.db.routers.ReadOnlyRouter')
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -107,8 +171,76 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
+FILE_UPLOAD_HANDLERS = [
+    'posts.uploads.StreamingImageUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 2560
+POST_IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+POST_THUMBNAIL_SIZES = {
+    'card': (960, 339),
+}
+POST_THUMBNAIL_FORMATS = ('JPEG', 'WEBP')
+POST_THUMBNAIL_WORKERS = 2
+
+# Граф подписок: массивы в общем кеше и LRU в процессе, см. follow_graph.
+# Срок FOLLOW_GRAPH_TIMEOUT задан ниже, после выбора бэкенда кеша.
+FOLLOW_GRAPH_LOCAL_BYTES = 64 * 1024 * 1024
+
+# Повтор формы с тем же ключом в течение TTL получает первый ответ.
+IDEMPOTENCY_TTL = 60 * 60
+IDEMPOTENCY_WAIT_SECONDS = 5
+
+# Комментарии пишутся в спул и уходят в базу пачками, см. comment_queue.
+COMMENT_WRITE_BEHIND = bool(os.getenv('COMMENT_WRITE_BEHIND'))
+COMMENT_FLUSH_MS = int(os.getenv('COMMENT_FLUSH_MS', 50))
+COMMENT_SPOOL_DIR = os.getenv(
+    'COMMENT_SPOOL_DIR', os.path.join(BASE_DIR, 'spool', 'comments')
+)
+
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'sqlite': {
+        'BACKEND': 'core.cache.backends.SQLiteCache',
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION', os.path.join(BASE_DIR, 'cache.sqlite3')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'COMPRESS_MIN_LENGTH': 1024,
+        },
+    },
+    'redis': {
+        'BACKEND': 'core.cache.backends.RedisCache',
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://127.0.0.1:6379/0'),
+        'OPTIONS': {
+            'COMPRESS_MIN_LENGTH': 1024,
+        },
+    },
 }
+
+CACHES = {
+    'default': CACHE_BACKENDS[os.getenv('CACHE_BACKEND', 'locmem')],
+}
+
+# locmem у каждого процесса свой: сброс ключа в одном процессе не виден
+# другим, поэтому без общего кеша производные данные живут несколько
+# секунд, и изменение из другого процесса видно не позже чем через TTL.
+SHARED_CACHE = CACHES['default'] is not CACHE_BACKENDS['locmem']
+
+FOLLOW_GRAPH_TIMEOUT = 24 * 60 * 60 if SHARED_CACHE else 5
+POST_CARD_TIMEOUT = 60 * 60 if SHARED_CACHE else 5
+FEED_GENERATION_TIMEOUT = None if SHARED_CACHE else 5
+
+METRICS_WINDOW = 1000
+METRICS_DUMP_PATH = os.getenv('METRICS_DUMP_PATH')
+METRICS_DUMP_INTERVAL = 60
+# Без токена /metrics/ открыт только сотрудникам.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
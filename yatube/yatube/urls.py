@@ -3,6 +3,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import metrics
+
 
 app_name = 'posts'
 
@@ -16,6 +18,7 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('auth/', include('django.contrib.auth.urls')),
     path('about/', include('about.urls', namespace='about')),
+    path('metrics/', metrics, name='metrics'),
 ]
 if settings.DEBUG:
     urlpatterns += static(